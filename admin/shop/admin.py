@@ -4,8 +4,11 @@ from django.http import HttpResponse
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from datetime import datetime
-from .models import Category, Product, Order, OrderItem, User, CartItem, FAQ, Mailing
+from .models import Category, Product, Order, OrderItem, StockReservation, User, CartItem, FAQ, Mailing, MailingMedia, MailingDelivery, Segment, Outbox
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .images import schedule_variants
 
 
 @admin.register(Category)
@@ -80,13 +83,55 @@ class CategoryListFilter(admin.SimpleListFilter):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'available', 'created_at', 'updated_at']
+    list_display = ['thumbnail', 'name', 'category', 'price', 'available', 'stock', 'reserved', 'created_at', 'updated_at']
+    list_display_links = ['name']
     list_filter = [CategoryListFilter, 'available', 'created_at', 'updated_at']
-    list_editable = ['price', 'available']
+    list_editable = ['price', 'available', 'stock']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['reserved', 'thumbnail', 'image_width', 'image_height', 'image_hash', 'file_id', 'created_at', 'updated_at']
+    actions = ['rebuild_images']
+
+    def save_model(self, request, obj, form, change):
+        """
+        Сохранить товар, не затирая поля, которые бот мог изменить, пока форма
+        была открыта: резерв и file_id не записываются, а остаток меняется
+        на разницу между значением в форме и загруженным значением
+        """
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+
+        update_fields = [
+            field.name for field in obj._meta.concrete_fields
+            if not field.primary_key and field.name not in Product.EXTERNAL_FIELDS
+        ]
+        if 'stock' in form.changed_data:
+            initial_stock = form.initial.get('stock')
+            if initial_stock is None or obj.stock is None:
+                # Переход между учетом остатка и «без ограничения»
+                update_fields.append('stock')
+            else:
+                Product.objects.filter(pk=obj.pk).update(
+                    stock=Greatest(F('stock') + (obj.stock - initial_stock), 0)
+                )
+        obj.save(update_fields=update_fields)
+        obj.refresh_from_db(fields=['stock', 'reserved'])
+
+    def thumbnail(self, obj):
+        if not obj.image_thumbnail:
+            return "—"
+        return format_html('<img src="{}" style="max-height: 48px;">', obj.image_thumbnail.url)
+    thumbnail.short_description = 'Фото'
+
+    def rebuild_images(self, request, queryset):
+        """Заново подготовить фото для Telegram (например, после смены настроек сжатия)"""
+        product_ids = list(queryset.exclude(image='').exclude(image__isnull=True).values_list('id', flat=True))
+        for product_id in product_ids:
+            schedule_variants(product_id)
+        self.message_user(request, f"Поставлено в обработку изображений: {len(product_ids)}")
+    rebuild_images.short_description = "Заново подготовить фото для Telegram"
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "category":
@@ -116,13 +161,24 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
 
 
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    fields = ['product', 'quantity', 'expires_at']
+    readonly_fields = ['product', 'quantity', 'expires_at']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user_id', 'username', 'full_name', 'status', 'payment_status', 'total_price', 'created_at']
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['user_id', 'username', 'full_name', 'phone']
     date_hierarchy = 'created_at'
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, StockReservationInline]
     readonly_fields = ['created_at', 'updated_at']
     actions = ['export_to_excel']
     fieldsets = (
@@ -268,14 +324,14 @@ class OrderItemAdmin(admin.ModelAdmin):
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ['user_id', 'username', 'full_name', 'phone', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['user_id', 'username', 'full_name', 'phone', 'is_active', 'created_at']
+    list_filter = ['is_active', 'created_at']
     search_fields = ['user_id', 'username', 'full_name', 'phone']
     date_hierarchy = 'created_at'
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('Основная информация', {
-            'fields': ('user_id', 'username', 'full_name')
+            'fields': ('user_id', 'username', 'full_name', 'is_active')
         }),
         ('Контактная информация', {
             'fields': ('phone', 'address')
@@ -289,16 +345,17 @@ class UserAdmin(admin.ModelAdmin):
 class CartItemInline(admin.TabularInline):
     model = CartItem
     raw_id_fields = ['product']
+    readonly_fields = ['reminded_at']
     extra = 0
 
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ['user', 'product', 'quantity', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['user', 'product', 'quantity', 'created_at', 'updated_at', 'reminded_at']
+    list_filter = ['created_at', 'updated_at']
     search_fields = ['user__user_id', 'user__username', 'product__name']
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'reminded_at']
 
 
 @admin.register(FAQ)
@@ -317,10 +374,80 @@ class FAQAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'has_ordered', 'active_within_days', 'category', 'snapshot_size', 'snapshot_at']
+    list_filter = ['has_ordered', 'category']
+    search_fields = ['name']
+    readonly_fields = ['snapshot_size', 'snapshot_at', 'created_at', 'updated_at']
+    fieldsets = (
+        (None, {
+            'fields': ('name',)
+        }),
+        ('Условия', {
+            'fields': ('has_ordered', 'active_within_days', 'category', 'registered_from', 'registered_to')
+        }),
+        ('Снимок аудитории', {
+            'fields': ('snapshot_size', 'snapshot_at', 'created_at', 'updated_at')
+        }),
+    )
+
+
+class MailingMediaInline(admin.TabularInline):
+    model = MailingMedia
+    fields = ['image', 'position', 'file_id']
+    readonly_fields = ['file_id']
+    extra = 0
+    max_num = 10  # Ограничение Telegram на альбом
+
+
 @admin.register(Mailing)
 class MailingAdmin(admin.ModelAdmin):
-    list_display = ['scheduled_at', 'is_sent', 'created_at']
-    list_filter = ['is_sent', 'scheduled_at', 'created_at']
-    readonly_fields = ['is_sent', 'created_at', 'updated_at']
+    inlines = [MailingMediaInline]
+    list_display = ['scheduled_at', 'segment', 'is_sent', 'delivered_count', 'failed_count', 'created_at']
+    list_filter = ['is_sent', 'segment', 'scheduled_at', 'created_at']
+    readonly_fields = ['is_sent', 'sending_until', 'delivery_summary', 'created_at', 'updated_at']
     search_fields = ['text']
     date_hierarchy = 'scheduled_at'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            delivered=models.Count('deliveries', filter=models.Q(deliveries__status='sent')),
+            failed=models.Count('deliveries', filter=~models.Q(deliveries__status='sent')),
+        )
+
+    def delivered_count(self, obj):
+        return obj.delivered
+
+    delivered_count.short_description = 'Доставлено'
+    delivered_count.admin_order_field = 'delivered'
+
+    def failed_count(self, obj):
+        return obj.failed
+
+    failed_count.short_description = 'Не доставлено'
+    failed_count.admin_order_field = 'failed'
+
+    def delivery_summary(self, obj):
+        """Сводка результатов доставки по статусам"""
+        statuses = dict(MailingDelivery.STATUS_CHOICES)
+        rows = obj.deliveries.values('status').annotate(count=models.Count('id')).order_by('status')
+        if not rows:
+            return '—'
+        return format_html(
+            '<br>'.join('{}: {}' for _ in rows),
+            *[value for row in rows for value in (statuses.get(row['status'], row['status']), row['count'])]
+        )
+
+    delivery_summary.short_description = 'Результаты доставки'
+
+
+@admin.register(Outbox)
+class OutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'attempts', 'available_at', 'created_at', 'processed_at']
+    list_filter = ['kind', 'processed_at']
+    search_fields = ['idempotency_key', 'error']
+    readonly_fields = ['kind', 'payload', 'idempotency_key', 'attempts', 'available_at', 'error', 'created_at', 'processed_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,146 @@
+"""
+Подготовка изображений товаров для Telegram.
+
+Загруженный в админке оригинал часто весит несколько мегабайт, а Telegram
+все равно ужимает фото до 1280 px по большей стороне. После сохранения товара
+оригинал в фоновом потоке уменьшается и пережимается в JPEG, рядом
+записывается миниатюра WebP для админки, а в товаре сохраняются размеры фото
+и хеш оригинала. Бот отправляет подготовленный вариант, пока его нет — оригинал.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .models import Product
+
+logger = logging.getLogger('shop')
+
+# Обработка занимает сотни миллисекунд, поэтому не задерживает ответ админки
+_executor = ThreadPoolExecutor(max_workers=settings.PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-image')
+
+
+@dataclass
+class ImageVariants:
+    """Результат обработки оригинала"""
+    photo: bytes
+    thumbnail: bytes
+    width: int
+    height: int
+    hash: str
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """Привести изображение к RGB, положив прозрачные области на белый фон"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def resize(image: Image.Image, max_side: int) -> Image.Image:
+    """Уменьшить изображение до max_side по большей стороне (без увеличения)"""
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return image
+
+
+def process_image(data: bytes) -> ImageVariants:
+    """Построить фото для Telegram и миниатюру из байтов оригинала"""
+    with Image.open(BytesIO(data)) as original:
+        # Поворот по EXIF: Telegram и браузеры учитывают его по-разному
+        image = flatten(ImageOps.exif_transpose(original))
+
+    photo = resize(image, settings.PRODUCT_PHOTO_MAX_SIDE)
+    photo_buffer = BytesIO()
+    photo.save(photo_buffer, 'JPEG', quality=settings.PRODUCT_PHOTO_QUALITY, optimize=True, progressive=True)
+
+    thumbnail_buffer = BytesIO()
+    resize(photo, settings.PRODUCT_THUMBNAIL_SIDE).save(thumbnail_buffer, 'WEBP', quality=settings.PRODUCT_PHOTO_QUALITY)
+
+    return ImageVariants(
+        photo=photo_buffer.getvalue(),
+        thumbnail=thumbnail_buffer.getvalue(),
+        width=photo.width,
+        height=photo.height,
+        hash=hashlib.sha256(data).hexdigest(),
+    )
+
+
+def build_variants(product_id: int) -> bool:
+    """
+    Подготовить варианты изображения товара и сохранить их.
+    Возвращает False, если обрабатывать нечего или изображение
+    успели заменить во время обработки.
+    """
+    product = Product.objects.filter(pk=product_id).first()
+    if not product or not product.image:
+        return False
+
+    image_name = product.image.name
+    with product.image.open('rb') as file:
+        data = file.read()
+
+    variants = process_image(data)
+    stem = PurePosixPath(image_name).stem
+    storage = product.image.storage
+    old_names = [f.name for f in (product.image_telegram, product.image_thumbnail) if f]
+
+    product.image_telegram.save(f"{stem}.jpg", ContentFile(variants.photo), save=False)
+    product.image_thumbnail.save(f"{stem}.webp", ContentFile(variants.thumbnail), save=False)
+
+    # update() вместо save(): сигналы сохранения снова запустили бы обработку.
+    # Условие по image отбрасывает результат, если оригинал уже заменили
+    updated = Product.objects.filter(pk=product_id, image=image_name).update(
+        image_telegram=product.image_telegram.name,
+        image_thumbnail=product.image_thumbnail.name,
+        image_width=variants.width,
+        image_height=variants.height,
+        image_hash=variants.hash,
+        # Ранее загруженный в Telegram оригинал заменяется подготовленным фото
+        file_id=None,
+    )
+
+    if not updated:
+        product.image_telegram.delete(save=False)
+        product.image_thumbnail.delete(save=False)
+        return False
+
+    for name in old_names:
+        storage.delete(name)
+
+    logger.info(
+        f"Изображение товара #{product_id} подготовлено: {variants.width}x{variants.height}, "
+        f"{len(data) // 1024} КБ → {len(variants.photo) // 1024} КБ"
+    )
+    return True
+
+
+def _run(product_id: int) -> None:
+    from .signals import notify_change
+
+    close_old_connections()
+    try:
+        if build_variants(product_id):
+            # Бот перечитает товар и начнет отправлять подготовленное фото
+            notify_change(Product(pk=product_id), "save")
+    except Exception as e:
+        logger.exception(f"Ошибка обработки изображения товара #{product_id}: {e}")
+    finally:
+        # Потоки пула не проходят через обработку запроса, соединения закрываем сами
+        close_old_connections()
+
+
+def schedule_variants(product_id: int) -> None:
+    """Поставить обработку изображения товара в фоновый пул"""
+    _executor.submit(_run, product_id)
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_mailing_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('has_ordered', models.BooleanField(blank=True, help_text='Пусто — не важно', null=True, verbose_name='Делал оплаченные заказы')),
+                ('active_within_days', models.PositiveIntegerField(blank=True, help_text='Корзина, заказы или обновление профиля', null=True, verbose_name='Активность за последние N дней')),
+                ('registered_from', models.DateTimeField(blank=True, null=True, verbose_name='Зарегистрирован с')),
+                ('registered_to', models.DateTimeField(blank=True, null=True, verbose_name='Зарегистрирован по')),
+                ('snapshot_size', models.PositiveIntegerField(blank=True, null=True, verbose_name='Размер снимка')),
+                ('snapshot_at', models.DateTimeField(blank=True, null=True, verbose_name='Снимок рассчитан')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('category', models.ForeignKey(blank=True, help_text='Товары категории или ее подкатегорий в корзине или заказах', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='segments', to='shop.category', verbose_name='Интерес к категории')),
+            ],
+            options={
+                'verbose_name': 'Сегмент аудитории',
+                'verbose_name_plural': 'Сегменты аудитории',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SegmentMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='shop.segment', verbose_name='Сегмент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_memberships', to='shop.user', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Участник сегмента',
+                'verbose_name_plural': 'Участники сегмента',
+                'unique_together': {('segment', 'user')},
+            },
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='segment',
+            field=models.ForeignKey(blank=True, help_text='Пусто — все пользователи', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mailings', to='shop.segment', verbose_name='Сегмент аудитории'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_segment_mailing_segment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailingMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='mailings/%Y/%m/', verbose_name='Изображение')),
+                ('position', models.PositiveSmallIntegerField(default=0, verbose_name='Порядок')),
+                ('file_id', models.CharField(blank=True, help_text='Заполняется ботом после первой загрузки', max_length=255, null=True, verbose_name='Telegram file_id')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media', to='shop.mailing', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Изображение рассылки',
+                'verbose_name_plural': 'Изображения рассылки',
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_mailingmedia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Снимается автоматически, если пользователь заблокировал бота', verbose_name='Активен'),
+        ),
+        migrations.CreateModel(
+            name='MailingDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('sent', 'Доставлено'), ('blocked', 'Бот заблокирован'), ('not_found', 'Чат не найден'), ('retry_after', 'Превышен лимит'), ('failed', 'Ошибка')], max_length=20, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата отправки')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='shop.mailing', verbose_name='Рассылка')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mailing_deliveries', to='shop.user', verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Доставка рассылки',
+                'verbose_name_plural': 'Доставки рассылки',
+                'indexes': [models.Index(fields=['mailing', 'status'], name='shop_mailin_mailing_b172ac_idx')],
+                'unique_together': {('mailing', 'user')},
+            },
+        ),
+    ]
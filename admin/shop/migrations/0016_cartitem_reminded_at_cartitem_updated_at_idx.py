@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_user_is_active_mailingdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='reminded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Напоминание отправлено'),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['updated_at'], name='shop_cartit_updated_f8c2dd_idx'),
+        ),
+    ]
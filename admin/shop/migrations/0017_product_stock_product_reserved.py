@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_cartitem_reminded_at_cartitem_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто — без ограничения', null=True, verbose_name='Остаток'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, help_text='Товары в неоплаченных заказах', verbose_name='Зарезервировано'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_stock_product_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.order', verbose_name='Заказ')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Резерв товара',
+                'verbose_name_plural': 'Резервы товаров',
+                'indexes': [models.Index(fields=['expires_at'], name='shop_stockr_expires_ab6cc8_idx')],
+                'unique_together': {('order', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', '-id'], name='shop_order_user_id_49cd5c_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_order_user_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('order_status', 'Статус заказа')], max_length=50, verbose_name='Тип')),
+                ('payload', models.JSONField(verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата обработки')),
+            ],
+            options={
+                'verbose_name': 'Исходящее уведомление',
+                'verbose_name_plural': 'Исходящие уведомления',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='shop_outbox_pending_idx')],
+            },
+        ),
+    ]
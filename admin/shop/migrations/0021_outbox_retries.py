@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='outbox',
+            options={'ordering': ['-created_at'], 'verbose_name': 'Исходящее действие', 'verbose_name_plural': 'Исходящие действия'},
+        ),
+        migrations.RemoveIndex(
+            model_name='outbox',
+            name='shop_outbox_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Повторная запись с тем же ключом игнорируется', max_length=200, null=True, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить не раньше'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='error',
+            field=models.TextField(blank=True, null=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AlterField(
+            model_name='outbox',
+            name='kind',
+            field=models.CharField(choices=[('order_status', 'Статус заказа'), ('payment_result', 'Результат оплаты')], max_length=50, verbose_name='Тип'),
+        ),
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['available_at', 'id'], name='shop_outbox_pending_idx'),
+        ),
+    ]
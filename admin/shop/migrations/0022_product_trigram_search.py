@@ -0,0 +1,54 @@
+# Поиск товаров по триграммам (pg_trgm) для SEARCH_BACKEND=pg_trgm в боте.
+# Расширение ставится, только если у пользователя базы есть на это права;
+# иначе миграция ничего не делает, и бот ищет по индексу в памяти.
+
+import logging
+
+from django.db import migrations, transaction
+from django.db.utils import DatabaseError
+
+logger = logging.getLogger('shop')
+
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS shop_product_name_trgm_idx ON shop_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shop_product_description_trgm_idx ON shop_product USING gin (description gin_trgm_ops)",
+]
+
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS shop_product_name_trgm_idx",
+    "DROP INDEX IF EXISTS shop_product_description_trgm_idx",
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError as e:
+        logger.warning(f"Расширение pg_trgm недоступно, триграммные индексы не созданы: {e}")
+        return
+
+    for sql in CREATE_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for sql in DROP_INDEXES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_outbox_retries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_product_trigram_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='file_id',
+            field=models.CharField(blank=True, help_text='Заполняется ботом после первой загрузки изображения', max_length=255, null=True, verbose_name='Telegram file_id'),
+        ),
+    ]
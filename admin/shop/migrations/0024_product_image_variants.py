@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_product_file_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_telegram',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='products/telegram/%Y/%m/', verbose_name='Фото для Telegram'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='products/thumbnails/%Y/%m/', verbose_name='Миниатюра'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина фото'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота фото'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='SHA-256 оригинала'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(condition=models.Q(('processed_at__isnull', False)), fields=['processed_at'], name='shop_outbox_processed_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_outbox_processed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailing',
+            name='sending_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Незавершенная отправка продолжится после этого времени', null=True, verbose_name='Отправляется до'),
+        ),
+    ]
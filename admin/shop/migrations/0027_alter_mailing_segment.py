@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_mailing_sending_until'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='segment',
+            field=models.ForeignKey(blank=True, help_text='Пусто — все пользователи', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mailings', to='shop.segment', verbose_name='Сегмент аудитории'),
+        ),
+    ]
@@ -24,6 +24,9 @@ class Category(models.Model):
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
+# Подготовленные для Telegram варианты изображения товара
+IMAGE_VARIANT_FIELDS = ('image_telegram', 'image_thumbnail', 'image_width', 'image_height', 'image_hash')
+
 class Product(models.Model):
     """Модель товара"""
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products", verbose_name="Категория")
@@ -32,7 +35,18 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     image = models.ImageField(upload_to="products/%Y/%m/", blank=True, null=True, verbose_name="Изображение")
+    image_telegram = models.ImageField(upload_to="products/telegram/%Y/%m/", blank=True, null=True, editable=False,
+                                       verbose_name="Фото для Telegram")
+    image_thumbnail = models.ImageField(upload_to="products/thumbnails/%Y/%m/", blank=True, null=True, editable=False,
+                                        verbose_name="Миниатюра")
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина фото")
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота фото")
+    image_hash = models.CharField(max_length=64, blank=True, null=True, editable=False, verbose_name="SHA-256 оригинала")
+    file_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="Telegram file_id",
+                               help_text="Заполняется ботом после первой загрузки изображения")
     available = models.BooleanField(default=True, verbose_name="Доступен")
+    stock = models.PositiveIntegerField(null=True, blank=True, verbose_name="Остаток", help_text="Пусто — без ограничения")
+    reserved = models.PositiveIntegerField(default=0, verbose_name="Зарезервировано", help_text="Товары в неоплаченных заказах")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
@@ -49,17 +63,39 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    # Поля, которые меняют бот (резерв, продажи, file_id) и фоновая обработка
+    # изображений. Форма админки загружает их заранее, поэтому при сохранении
+    # из админки они не записываются (остаток меняется на введенную разницу)
+    EXTERNAL_FIELDS = ('stock', 'reserved', 'file_id') + IMAGE_VARIANT_FIELDS
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        # При замене файла ранее загруженный в Telegram file_id и подготовленные
+        # варианты больше не подходят; новые варианты строятся после сохранения
+        if self.pk:
+            old_image = Product.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+            if old_image != self.image.name:
+                self.file_id = None
+                self.clear_image_variants()
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'file_id', *IMAGE_VARIANT_FIELDS}
         super().save(*args, **kwargs)
 
+    def clear_image_variants(self):
+        """Удалить подготовленные для Telegram варианты изображения"""
+        self.image_telegram.delete(save=False)
+        self.image_thumbnail.delete(save=False)
+        self.image_width = self.image_height = self.image_hash = None
+
 class User(models.Model):
     user_id = models.BigIntegerField(unique=True, verbose_name="ID пользователя Telegram")
     username = models.CharField(max_length=100, blank=True, null=True, verbose_name="Имя пользователя Telegram")
     full_name = models.CharField(max_length=255, blank=True, null=True, verbose_name="Полное имя")
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Телефон")
     address = models.TextField(blank=True, null=True, verbose_name="Адрес доставки")
+    is_active = models.BooleanField(default=True, verbose_name="Активен",
+                                    help_text="Снимается автоматически, если пользователь заблокировал бота")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
@@ -77,11 +113,14 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1, verbose_name="Количество")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    reminded_at = models.DateTimeField(null=True, blank=True, verbose_name="Напоминание отправлено")
     
     class Meta:
         verbose_name = "Элемент корзины"
         verbose_name_plural = "Элементы корзины"
         unique_together = ('user', 'product')
+        # Поиск брошенных корзин для напоминаний и очистки
+        indexes = [models.Index(fields=['updated_at'])]
     
     def __str__(self):
         return f"{self.user} - {self.product.name} ({self.quantity})"
@@ -119,6 +158,8 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-created_at"]
+        # Постраничная история заказов пользователя в боте
+        indexes = [models.Index(fields=['user_id', '-id'])]
     
     def __str__(self):
         return f"Заказ {self.id} от {self.full_name}"
@@ -145,6 +186,24 @@ class OrderItem(models.Model):
     def get_cost(self):
         return self.price * self.quantity 
 
+
+class StockReservation(models.Model):
+    """Резерв товара под неоплаченный заказ"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations", verbose_name="Заказ")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations", verbose_name="Товар")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        unique_together = ('order', 'product')
+        indexes = [models.Index(fields=['expires_at'])]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} (заказ {self.order_id})"
+
 class FAQ(models.Model):
     question = models.CharField(max_length=255, unique=True, verbose_name="Вопрос")
     answer = models.TextField(verbose_name="Ответ")
@@ -160,11 +219,59 @@ class FAQ(models.Model):
     def __str__(self):
         return self.question[:50] + ('...' if len(self.question) > 50 else '') 
  
+class Segment(models.Model):
+    """Сегмент аудитории для рассылок"""
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+    has_ordered = models.BooleanField(blank=True, null=True, verbose_name="Делал оплаченные заказы",
+                                      help_text="Пусто — не важно")
+    active_within_days = models.PositiveIntegerField(blank=True, null=True, verbose_name="Активность за последние N дней",
+                                                     help_text="Корзина, заказы или обновление профиля")
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, blank=True, null=True, related_name='segments',
+                                 verbose_name="Интерес к категории",
+                                 help_text="Товары категории или ее подкатегорий в корзине или заказах")
+    registered_from = models.DateTimeField(blank=True, null=True, verbose_name="Зарегистрирован с")
+    registered_to = models.DateTimeField(blank=True, null=True, verbose_name="Зарегистрирован по")
+    snapshot_size = models.PositiveIntegerField(blank=True, null=True, verbose_name="Размер снимка")
+    snapshot_at = models.DateTimeField(blank=True, null=True, verbose_name="Снимок рассчитан")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Сегмент аудитории"
+        verbose_name_plural = "Сегменты аудитории"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        # Условия могли измениться, снимок аудитории пересчитает бот
+        self.snapshot_at = None
+        super().save(*args, **kwargs)
+
+class SegmentMember(models.Model):
+    """Снимок состава сегмента, рассчитывается ботом"""
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name='members', verbose_name="Сегмент")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='segment_memberships', verbose_name="Пользователь")
+
+    class Meta:
+        verbose_name = "Участник сегмента"
+        verbose_name_plural = "Участники сегмента"
+        unique_together = ('segment', 'user')
+
+    def __str__(self):
+        return f"{self.segment} - {self.user}"
+
 class Mailing(models.Model):
     """Модель рассылки"""
     text = models.TextField(verbose_name="Текст рассылки")
+    # Удаление сегмента не должно превращать рассылки по нему в рассылки всем
+    segment = models.ForeignKey(Segment, on_delete=models.PROTECT, blank=True, null=True, related_name='mailings',
+                                verbose_name="Сегмент аудитории", help_text="Пусто — все пользователи")
     scheduled_at = models.DateTimeField(verbose_name="Запланировано на")
     is_sent = models.BooleanField(default=False, verbose_name="Отправлено")
+    sending_until = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Отправляется до",
+                                         help_text="Незавершенная отправка продолжится после этого времени")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -174,4 +281,94 @@ class Mailing(models.Model):
         ordering = ['-scheduled_at']
 
     def __str__(self):
-        return f"Рассылка на {self.scheduled_at}" 
\ No newline at end of file
+        return f"Рассылка на {self.scheduled_at}"
+
+class MailingMedia(models.Model):
+    """Изображение рассылки"""
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, related_name='media', verbose_name="Рассылка")
+    image = models.ImageField(upload_to="mailings/%Y/%m/", verbose_name="Изображение")
+    position = models.PositiveSmallIntegerField(default=0, verbose_name="Порядок")
+    file_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="Telegram file_id",
+                               help_text="Заполняется ботом после первой загрузки")
+
+    class Meta:
+        verbose_name = "Изображение рассылки"
+        verbose_name_plural = "Изображения рассылки"
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return f"Изображение {self.position} для {self.mailing}"
+
+    def save(self, *args, **kwargs):
+        # При замене файла ранее загруженный в Telegram file_id больше не подходит
+        if self.pk:
+            old_image = MailingMedia.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+            if old_image != self.image.name:
+                self.file_id = None
+        super().save(*args, **kwargs)
+
+class MailingDelivery(models.Model):
+    """Результат доставки рассылки одному получателю"""
+    STATUS_CHOICES = (
+        ('sent', 'Доставлено'),
+        ('blocked', 'Бот заблокирован'),
+        ('not_found', 'Чат не найден'),
+        ('retry_after', 'Превышен лимит'),
+        ('failed', 'Ошибка'),
+    )
+
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, related_name='deliveries', verbose_name="Рассылка")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mailing_deliveries', verbose_name="Пользователь")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name="Статус")
+    error = models.TextField(blank=True, null=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Доставка рассылки"
+        verbose_name_plural = "Доставки рассылки"
+        unique_together = ('mailing', 'user')
+        indexes = [
+            models.Index(fields=['mailing', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.mailing} → {self.user}: {self.get_status_display()}"
+
+
+class Outbox(models.Model):
+    """
+    Исходящее действие бота (уведомление, редактирование сообщения).
+    Записывается в той же транзакции, что и изменение данных,
+    и выполняется ботом из очереди с повторами при ошибках.
+    """
+    KIND_ORDER_STATUS = 'order_status'
+    KIND_PAYMENT_RESULT = 'payment_result'
+
+    KIND_CHOICES = (
+        (KIND_ORDER_STATUS, 'Статус заказа'),
+        (KIND_PAYMENT_RESULT, 'Результат оплаты'),
+    )
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES, verbose_name="Тип")
+    payload = models.JSONField(verbose_name="Данные")
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True, verbose_name="Ключ идемпотентности",
+                                       help_text="Повторная запись с тем же ключом игнорируется")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Выполнить не раньше")
+    error = models.TextField(blank=True, null=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата обработки")
+
+    class Meta:
+        verbose_name = "Исходящее действие"
+        verbose_name_plural = "Исходящие действия"
+        ordering = ['-created_at']
+        indexes = [
+            # Бот выбирает только необработанные записи, срок которых наступил
+            models.Index(fields=['available_at', 'id'], condition=models.Q(processed_at__isnull=True), name='shop_outbox_pending_idx'),
+            # Бот удаляет выполненные действия старше срока хранения
+            models.Index(fields=['processed_at'], condition=models.Q(processed_at__isnull=False), name='shop_outbox_processed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id}"
@@ -0,0 +1,96 @@
+"""
+Публикация изменений моделей магазина через Postgres LISTEN/NOTIFY.
+
+Бот слушает канал CHANGE_FEED_CHANNEL и по этим уведомлениям сбрасывает
+свои кеши и перепланирует задачи вместо периодического опроса таблиц.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .images import schedule_variants
+from .models import Category, Product, CartItem, FAQ, Mailing, Order, StockReservation, Outbox
+
+logger = logging.getLogger('shop')
+
+# Модели, об изменениях которых нужно сообщать боту
+TRACKED_MODELS = (Category, Product, CartItem, FAQ, Mailing, Order, Outbox)
+
+
+def notify_change(instance, op):
+    """Отправить уведомление об изменении объекта в канал изменений"""
+    data = {
+        "table": instance._meta.db_table,
+        "op": op,
+        "id": instance.pk,
+    }
+    # Бот кеширует заказы по пользователю Telegram
+    if isinstance(instance, Order):
+        data["user_id"] = instance.user_id
+    payload = json.dumps(data)
+    # pg_notify транзакционен: уведомление уйдет только после коммита
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [settings.CHANGE_FEED_CHANNEL, payload])
+    except Exception as e:
+        logger.error(f"Ошибка отправки уведомления об изменении {payload}: {e}")
+
+
+@receiver(post_save)
+def on_model_saved(sender, instance, **kwargs):
+    if sender in TRACKED_MODELS:
+        notify_change(instance, "save")
+
+
+@receiver(post_delete)
+def on_model_deleted(sender, instance, **kwargs):
+    if sender in TRACKED_MODELS:
+        notify_change(instance, "delete")
+
+
+@receiver(post_save, sender=Product)
+def prepare_product_image(sender, instance, **kwargs):
+    """Подготовить фото для Telegram, если изображение новое (после коммита, в фоновом потоке)"""
+    if instance.image and not instance.image_telegram:
+        transaction.on_commit(lambda: schedule_variants(instance.pk))
+
+
+@receiver(post_delete, sender=StockReservation)
+def on_reservation_deleted(sender, instance, **kwargs):
+    """Вернуть товар в свободный остаток, если резерв удален из админки (например, вместе с заказом)"""
+    Product.objects.filter(pk=instance.product_id).update(
+        reserved=Greatest(F('reserved') - instance.quantity, 0)
+    )
+    notify_change(instance.product, "save")
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """Запомнить статус заказа до сохранения"""
+    instance._previous_status = (
+        sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def enqueue_order_status(sender, instance, created, **kwargs):
+    """Поставить в очередь уведомление покупателю о смене статуса заказа"""
+    if created or instance._previous_status == instance.status:
+        return
+
+    Outbox.objects.create(
+        kind=Outbox.KIND_ORDER_STATUS,
+        payload={
+            "order_id": instance.pk,
+            "user_id": instance.user_id,
+            "status": instance.status,
+        },
+    )
@@ -0,0 +1,167 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db.models import ProtectedError
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .models import Category, Product, Segment, Mailing
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductImageTests(TestCase):
+    """Подготовка вариантов изображения товара при загрузке и замене"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Cases")
+        with mock.patch('shop.signals.schedule_variants'), self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                category=self.category,
+                name="Case",
+                price=100,
+                image=SimpleUploadedFile("first.png", b"first"),
+            )
+        self.mark_processed()
+
+    def mark_processed(self):
+        """Записать результат обработки, как это делает shop.images.build_variants"""
+        telegram = default_storage.save("products/telegram/first.jpg", ContentFile(b"jpeg"))
+        thumbnail = default_storage.save("products/thumbnails/first.webp", ContentFile(b"webp"))
+        Product.objects.filter(pk=self.product.pk).update(
+            image_telegram=telegram,
+            image_thumbnail=thumbnail,
+            image_width=1280,
+            image_height=960,
+            image_hash="0" * 64,
+            file_id="old-file-id",
+        )
+        self.product.refresh_from_db()
+        self.variant_names = [telegram, thumbnail]
+
+    def save_product(self):
+        with mock.patch('shop.signals.schedule_variants') as schedule, self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.product.refresh_from_db()
+        return schedule
+
+    def test_replaced_image_is_processed_again(self):
+        self.product.image = SimpleUploadedFile("second.png", b"second")
+        schedule = self.save_product()
+
+        schedule.assert_called_once_with(self.product.pk)
+        self.assertIsNone(self.product.file_id)
+        self.assertFalse(self.product.image_telegram)
+        self.assertFalse(self.product.image_thumbnail)
+        self.assertIsNone(self.product.image_hash)
+        for name in self.variant_names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_unchanged_image_keeps_variants(self):
+        self.product.price = 200
+        schedule = self.save_product()
+
+        schedule.assert_not_called()
+        self.assertEqual(self.product.file_id, "old-file-id")
+        self.assertEqual(self.product.image_telegram.name, self.variant_names[0])
+        self.assertEqual(self.product.image_width, 1280)
+
+    def test_category_save_does_not_touch_products(self):
+        self.category.description = "Phone cases"
+        self.category.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.file_id, "old-file-id")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProductAdminSaveTests(TestCase):
+    """Сохранение товара из админки не затирает изменения, сделанные ботом"""
+
+    def setUp(self):
+        self.model_admin = admin.site._registry[Product]
+        self.request = RequestFactory().post('/')
+        self.request.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "password")
+        category = Category.objects.create(name="Cases")
+        self.product = Product.objects.create(category=category, name="Case", price=100, stock=10)
+
+    def load_form(self):
+        """Форма товара, открытая до изменений бота"""
+        return self.model_admin.get_form(self.request, self.product)(instance=Product.objects.get(pk=self.product.pk))
+
+    def submit(self, form, files=None, **changes):
+        data = {name: form.initial.get(name) for name in form.fields if form.initial.get(name) is not None}
+        data.update(changes)
+        bound = self.model_admin.get_form(self.request, self.product)(
+            data, files, instance=Product.objects.get(pk=self.product.pk), initial=form.initial
+        )
+        self.assertTrue(bound.is_valid(), bound.errors)
+        with mock.patch('shop.signals.schedule_variants'), self.captureOnCommitCallbacks(execute=True):
+            self.model_admin.save_model(self.request, bound.save(commit=False), bound, change=True)
+        self.product.refresh_from_db()
+
+    def bot_sells(self):
+        """Бот зарезервировал и продал товар и сохранил file_id, пока форма была открыта"""
+        Product.objects.filter(pk=self.product.pk).update(stock=7, reserved=2, file_id="bot-file-id")
+
+    def test_bot_counters_survive_admin_save(self):
+        form = self.load_form()
+        self.bot_sells()
+        self.submit(form, price="150")
+
+        self.assertEqual(self.product.price, 150)
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(self.product.reserved, 2)
+        self.assertEqual(self.product.file_id, "bot-file-id")
+
+    def test_stock_edit_is_applied_as_delta(self):
+        form = self.load_form()
+        self.bot_sells()
+        # Администратор списал 2 штуки из 10, которые видел в форме
+        self.submit(form, stock="8")
+
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(self.product.reserved, 2)
+
+    def test_unlimited_stock_is_written_directly(self):
+        form = self.load_form()
+        self.bot_sells()
+        self.submit(form, stock="")
+
+        self.assertIsNone(self.product.stock)
+        self.assertEqual(self.product.reserved, 2)
+
+    def test_replaced_image_resets_file_id(self):
+        form = self.load_form()
+        self.bot_sells()
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        self.submit(form, files={"image": SimpleUploadedFile("new.png", image.getvalue())})
+
+        self.assertIsNone(self.product.file_id)
+        self.assertEqual(self.product.stock, 7)
+
+
+class SegmentDeleteTests(TestCase):
+    def test_segment_of_mailing_is_not_deleted(self):
+        segment = Segment.objects.create(name="Покупатели", has_ordered=True)
+        Mailing.objects.create(text="Новинки", scheduled_at=timezone.now(), segment=segment)
+
+        # Иначе рассылка по сегменту ушла бы всем пользователям
+        with self.assertRaises(ProtectedError):
+            segment.delete()
+        self.assertEqual(Mailing.objects.get().segment, segment)
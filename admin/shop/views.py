@@ -2,6 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView, DetailView
 from django.contrib import messages
+from django.db import transaction
 from .models import Category, Product, Order, OrderItem
 
 def index(request):
@@ -63,7 +64,9 @@ def order_update_status(request, order_id):
         status = request.POST.get('status')
         if status in dict(Order.STATUS_CHOICES):
             order.status = status
-            order.save()
+            # Заказ и уведомление о смене статуса сохраняются вместе
+            with transaction.atomic():
+                order.save()
             messages.success(request, f'Статус заказа #{order.id} обновлен на "{order.get_status_display()}"')
         else:
             messages.error(request, 'Некорректный статус заказа')
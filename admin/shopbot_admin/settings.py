@@ -153,4 +153,14 @@ LOGGING = {
             'propagate': True,
         },
     },
-} 
\ No newline at end of file
+} 
+
+# Канал Postgres NOTIFY, через который бот узнает об изменениях в админке
+CHANGE_FEED_CHANNEL = os.environ.get('CHANGE_FEED_CHANNEL', 'shop_changes')
+
+# Подготовка изображений товаров для Telegram: наибольшая сторона фото и миниатюры (px),
+# качество сжатия и число потоков обработки
+PRODUCT_PHOTO_MAX_SIDE = int(os.environ.get('PRODUCT_PHOTO_MAX_SIDE', '1280'))
+PRODUCT_THUMBNAIL_SIDE = int(os.environ.get('PRODUCT_THUMBNAIL_SIDE', '320'))
+PRODUCT_PHOTO_QUALITY = int(os.environ.get('PRODUCT_PHOTO_QUALITY', '85'))
+PRODUCT_IMAGE_WORKERS = int(os.environ.get('PRODUCT_IMAGE_WORKERS', '2'))
@@ -0,0 +1,113 @@
+"""
+Сборка бота: сессия с middleware, диспетчер с роутерами, фоновые службы
+и подписки на ленту изменений. Используется и при запуске одним процессом
+(polling), и процессами-обработчиками шардированного режима.
+"""
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import BotCommand
+
+from config import BOT_TOKEN
+from handlers import main_router
+from middlewares import (
+    SubscriptionMiddleware, NoopCallbackMiddleware, ApiRequestMiddleware,
+    UpdateApiCallsMiddleware, RateLimitMiddleware
+)
+from utils.logger import logger
+from scheduler import setup_scheduler, MailingScheduler
+from outbox import OutboxWorker
+from services.change_feed import change_feed
+from services.faq_service import invalidate_faq_cache
+from services.cart_service import invalidate_cart_cache
+from services.product_service import invalidate_catalog_cache
+from services.search_service import on_product_changed, reset_product_index
+from services.order_service import on_order_changed, clear_orders_cache
+
+# Типы обновлений, которые получает бот
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+
+def create_bot() -> Bot:
+    """Бот с middleware сессии"""
+    bot = Bot(token=BOT_TOKEN)
+    # Пустые редактирования не отправляются, ответы на кнопки уходят в фоне
+    bot.session.middleware(ApiRequestMiddleware())
+    # Общий лимит сообщений: пропущенные редактирования его не расходуют
+    bot.session.middleware(RateLimitMiddleware())
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с middleware и роутерами"""
+    dp = Dispatcher()
+
+    dp.update.outer_middleware(UpdateApiCallsMiddleware())
+    # Информационные кнопки получают ответ до проверки подписки и роутеров
+    dp.callback_query.outer_middleware(NoopCallbackMiddleware())
+    dp.message.middleware(SubscriptionMiddleware())
+    dp.callback_query.middleware(SubscriptionMiddleware())
+
+    dp.include_router(main_router)
+    return dp
+
+
+class BackgroundServices:
+    """Планировщики рассылок и задач и очередь исходящих действий"""
+
+    def __init__(self, bot: Bot):
+        self.mailing_scheduler = MailingScheduler(bot)
+        self.scheduler = setup_scheduler(self.mailing_scheduler)
+        self.outbox_worker = OutboxWorker(bot)
+
+    async def start(self):
+        await self.mailing_scheduler.resync()
+        self.mailing_scheduler.start()
+        self.scheduler.start()
+        self.outbox_worker.start()
+
+    async def stop(self):
+        await self.outbox_worker.stop()
+        await self.mailing_scheduler.stop()
+        self.scheduler.shutdown()
+
+
+def setup_change_feed(background: BackgroundServices | None = None):
+    """
+    Регистрация обработчиков ленты изменений из админки.
+    Кеши сбрасываются в каждом процессе, а фоновые службы уведомляются
+    только там, где они запущены.
+    """
+    change_feed.subscribe("shop_faq", invalidate_faq_cache)
+    # Цены и названия товаров в снимках корзин, а также правки корзин в админке
+    change_feed.subscribe("shop_product", invalidate_cart_cache)
+    change_feed.subscribe("shop_cartitem", invalidate_cart_cache)
+    # Каталог: правки из админки и остатки, измененные при оформлении заказов
+    change_feed.subscribe("shop_product", invalidate_catalog_cache)
+    change_feed.subscribe("shop_category", invalidate_catalog_cache)
+    # Индекс поиска товаров обновляется по одному измененному товару
+    change_feed.subscribe("shop_product", on_product_changed)
+    change_feed.subscribe("shop_order", on_order_changed)
+
+    change_feed.on_reconnect(invalidate_faq_cache)
+    change_feed.on_reconnect(invalidate_cart_cache)
+    change_feed.on_reconnect(invalidate_catalog_cache)
+    change_feed.on_reconnect(reset_product_index)
+    change_feed.on_reconnect(clear_orders_cache)
+
+    if background:
+        change_feed.subscribe("shop_mailing", background.mailing_scheduler.on_mailing_changed)
+        change_feed.subscribe("shop_outbox", background.outbox_worker.wakeup)
+        change_feed.on_reconnect(background.mailing_scheduler.resync)
+        change_feed.on_reconnect(background.outbox_worker.wakeup)
+
+
+async def set_bot_commands(bot: Bot):
+    """Установка команд бота"""
+    commands = [
+        BotCommand(command="start", description="Запустить бота"),
+        BotCommand(command="search", description="Поиск товаров"),
+        BotCommand(command="help", description="Помощь и FAQ")
+    ]
+
+    await bot.set_my_commands(commands)
+    logger.info("✅ Команды бота установлены")
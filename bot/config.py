@@ -21,10 +21,105 @@ DB_PORT = os.getenv("DB_PORT")
 # Формирование строки подключения к базе данных
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Строка подключения для прямого соединения asyncpg (LISTEN/NOTIFY)
+DATABASE_DSN = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Канал уведомлений об изменениях, которые публикует админка
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "shop_changes")
+
 # Настройки платежного шлюза ЮKassa
 YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
 YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
 
+# Клиент ЮKassa: таймаут запроса (сек.), число повторов, размер пула соединений,
+# число ошибок подряд до размыкания предохранителя и пауза перед пробным запросом (сек.)
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT", "10"))
+YOOKASSA_MAX_RETRIES = int(os.getenv("YOOKASSA_MAX_RETRIES", "3"))
+YOOKASSA_POOL_SIZE = int(os.getenv("YOOKASSA_POOL_SIZE", "20"))
+YOOKASSA_BREAKER_THRESHOLD = int(os.getenv("YOOKASSA_BREAKER_THRESHOLD", "5"))
+YOOKASSA_BREAKER_RESET = float(os.getenv("YOOKASSA_BREAKER_RESET", "30"))
+
+# Каталог с медиафайлами админки (товары, изображения рассылок)
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "/media")
+
+# Служебный чат, куда один раз загружаются вложения рассылок для получения file_id
+SERVICE_CHAT_ID = os.getenv("SERVICE_CHAT_ID")
+
+# Рассылки: размер порции получателей, время жизни снимка сегмента и аренда
+# отправки (сек.), которая продлевается после каждой порции. Если процесс упал,
+# рассылка продолжится с неполученных получателей после истечения аренды
+MAILING_CHUNK_SIZE = int(os.getenv("MAILING_CHUNK_SIZE", "500"))
+SEGMENT_SNAPSHOT_TTL_MINUTES = int(os.getenv("SEGMENT_SNAPSHOT_TTL_MINUTES", "60"))
+MAILING_LEASE_SECONDS = int(os.getenv("MAILING_LEASE_SECONDS", "300"))
+
+# Максимальное число корзин, хранимых в кеше
+CART_CACHE_SIZE = int(os.getenv("CART_CACHE_SIZE", "10000"))
+
+# Окно (в секундах), в котором нажатия ➕/➖ объединяются в одну запись и одно редактирование
+CART_COALESCE_DELAY = float(os.getenv("CART_COALESCE_DELAY", "0.7"))
+
+# Брошенные корзины: срок хранения, напоминание (0 — не напоминать) и размер пачки удаления
+CART_TTL_DAYS = int(os.getenv("CART_TTL_DAYS", "30"))
+CART_REMINDER_HOURS = int(os.getenv("CART_REMINDER_HOURS", "24"))
+CART_COMPACTION_BATCH = int(os.getenv("CART_COMPACTION_BATCH", "1000"))
+
+# Время жизни резерва товаров под неоплаченный заказ (больше срока ожидания оплаты)
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "20"))
+
+# История заказов: размер страницы и число пользователей в кеше первой страницы
+ORDERS_PER_PAGE = int(os.getenv("ORDERS_PER_PAGE", "10"))
+ORDERS_CACHE_SIZE = int(os.getenv("ORDERS_CACHE_SIZE", "10000"))
+
+# Очередь исходящих действий: размер пачки, страховочный интервал опроса (сек.),
+# время аренды (сек.), число попыток и сколько дней хранить выполненные действия.
+# Темп отправки задает общий лимитер сообщений (API_*)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = int(os.getenv("OUTBOX_POLL_INTERVAL", "60"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "14"))
+
+# Поиск товаров: memory — индекс триграмм в памяти бота, pg_trgm — индексы GIN в базе
+# (нужна миграция 0022 с расширением pg_trgm); число результатов на страницу
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", "10"))
+
+# Inline-выдача товаров: результатов на страницу (не больше 50), число страниц в кеше
+# и пределы cache_time (сек.), который растет, пока каталог не меняется
+INLINE_RESULTS_PER_PAGE = int(os.getenv("INLINE_RESULTS_PER_PAGE", "20"))
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", "1000"))
+INLINE_CACHE_TIME_MIN = int(os.getenv("INLINE_CACHE_TIME_MIN", "10"))
+INLINE_CACHE_TIME_MAX = int(os.getenv("INLINE_CACHE_TIME_MAX", "300"))
+
+# Сколько изображений товаров загружать в служебный чат за один проход планировщика
+PRODUCT_PHOTO_UPLOAD_BATCH = int(os.getenv("PRODUCT_PHOTO_UPLOAD_BATCH", "20"))
+
+# Сколько последних состояний сообщений помнить, чтобы не отправлять пустые редактирования
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "10000"))
+
+# Лимиты исходящих сообщений Bot API: общий темп (в секунду), резерв общего лимита
+# для ответов пользователям, темп и запас на всплески для личного чата, темп для группы.
+# В режиме sharded ответы ограничены только лимитами чатов, а фоновым отправкам остается
+# общий темп за вычетом резерва
+API_GLOBAL_RATE = float(os.getenv("API_GLOBAL_RATE", "30"))
+API_INTERACTIVE_RESERVE = float(os.getenv("API_INTERACTIVE_RESERVE", "10"))
+API_CHAT_RATE = float(os.getenv("API_CHAT_RATE", "1"))
+API_CHAT_BURST = float(os.getenv("API_CHAT_BURST", "3"))
+API_GROUP_RATE = float(os.getenv("API_GROUP_RATE", "0.33"))
+
+# Режим запуска: polling — один процесс; sharded — прием вебхуков и SHARD_COUNT процессов-
+# обработчиков, между которыми обновления распределяются по ID пользователя
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", str(os.cpu_count() or 1)))
+SHARD_SOCKET_DIR = os.getenv("SHARD_SOCKET_DIR", "/tmp/shopbot")
+
+# Вебхук шардированного режима: публичный URL, секрет заголовка и адрес приема
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
 # Режим отладки
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
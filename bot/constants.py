@@ -1,5 +1,6 @@
 ORDER_STATUS_TRANSLATIONS = {
     "new": "Новый",
+    "processing": "В обработке",
     "pending": "Ожидает оплаты",
     "paid": "Оплачен",
     "shipped": "Отправлен",
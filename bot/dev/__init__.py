@@ -0,0 +1,3 @@
+"""
+Инструменты для локальной разработки и нагрузочных тестов
+"""
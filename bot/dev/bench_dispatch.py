@@ -0,0 +1,167 @@
+"""
+Сравнение накладных расходов маршрутизации одного обновления.
+
+«До» — прежняя схема: роутеры модулей с цепочками фильтров
+F.data == ... / F.data.startswith(...) и Command(...), проверяемыми
+по очереди. «После» — таблицы команд и кнопок с поиском по словарю.
+Обработчики пустые, поэтому измеряется только маршрутизация aiogram.
+
+    python dev/bench_dispatch.py --iterations 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.filters import Command
+from aiogram.types import Update
+
+# Добавляем корневую директорию бота в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.callback_data import Action, CallbackTable, pack
+from utils.command_table import CommandTable
+
+# Прежние фильтры в порядке подключения роутеров: (точное значение или префикс, это префикс)
+LEGACY_ROUTERS = [
+    [("start", False), ("check_subscription", False)],
+    [("catalog", False), ("main_categories_", True), ("main_category_", True), ("subcategories_", True),
+     ("category_", True), ("product_", True), ("change_quantity_", True), ("confirm_add_to_cart_", True),
+     ("add_to_cart_", True), ("back_to_main_categories", False), ("back_to_categories", False),
+     ("back_to_category_", True), ("empty", False), ("back_to_parent_category_", True)],
+    [("cart", False), ("cart_item_", True), ("cart_increase_", True), ("cart_decrease_", True),
+     ("cart_remove_", True), ("cart_clear", False)],
+    [("checkout", False), ("checkout_edit", False), ("checkout_cancel", False)],
+    [("my_orders", False), ("my_orders_", True), ("order_details_", True)],
+    [("checkout_payment", False), ("cancel_payment", True)],
+    [("help", False), ("faq_list", False), ("faq:", True), ("faq_search", False)],
+]
+
+LEGACY_COMMANDS = {0: "start", 6: "help"}
+
+EXACT = [data for routers in LEGACY_ROUTERS for data, is_prefix in routers if not is_prefix]
+
+# Типичные нажатия: (прежние данные, новые данные)
+SAMPLE = [
+    ("catalog", "catalog"),
+    ("cart", "cart"),
+    ("empty", "empty"),
+    ("help", "help"),
+    ("product_123", pack(Action.PRODUCT, 123)),
+    ("category_12_2", pack(Action.CATEGORY, 12, 2)),
+    ("change_quantity_123_3", pack(Action.CHANGE_QUANTITY, 123, 3)),
+    ("cart_increase_456", pack(Action.CART_INCREASE, 456)),
+    ("order_details_789", pack(Action.ORDER_DETAILS, 789)),
+    ("faq:7", pack(Action.FAQ, 7)),
+]
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def build_legacy() -> Dispatcher:
+    dp = Dispatcher()
+    for number, filters in enumerate(LEGACY_ROUTERS):
+        router = Router()
+        if number in LEGACY_COMMANDS:
+            router.message.register(noop, Command(LEGACY_COMMANDS[number]))
+        for data, is_prefix in filters:
+            router.callback_query.register(noop, F.data.startswith(data) if is_prefix else F.data == data)
+        dp.include_router(router)
+    return dp
+
+
+def build_tables() -> Dispatcher:
+    dp = Dispatcher()
+    commands = CommandTable()
+    callbacks = CallbackTable()
+    for name in LEGACY_COMMANDS.values():
+        commands.command(name)(noop)
+    for data in EXACT:
+        callbacks.exact(data)(noop)
+    for action in Action:
+        callbacks.handler(action)(noop)
+    dp.include_router(commands.router)
+    dp.include_router(callbacks.router)
+    # Роутеры с обработчиками по состояниям и тексту остаются как есть
+    dp.include_router(Router())
+    dp.include_router(Router())
+    return dp
+
+
+def make_callback_update(update_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "text": "bench"
+            }
+        }
+    })
+
+
+def make_command_update(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+            "text": text
+        }
+    })
+
+
+async def measure(dp: Dispatcher, bot: Bot, updates: list[Update], iterations: int) -> float:
+    """Среднее время обработки одного обновления, мкс"""
+    for update in updates:
+        await dp.feed_update(bot, update)
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        await dp.feed_update(bot, updates[i % len(updates)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def run(args) -> None:
+    bot = Bot(token="123456:BENCH")
+    commands = [make_command_update(0, "/start"), make_command_update(1, "/help")]
+    legacy_updates = [make_callback_update(i, old) for i, (old, _) in enumerate(SAMPLE)]
+    table_updates = [make_callback_update(i, new) for i, (_, new) in enumerate(SAMPLE)]
+
+    results = {
+        "до": (
+            await measure(build_legacy(), bot, legacy_updates, args.iterations),
+            await measure(build_legacy(), bot, commands, args.iterations)
+        ),
+        "после": (
+            await measure(build_tables(), bot, table_updates, args.iterations),
+            await measure(build_tables(), bot, commands, args.iterations)
+        ),
+    }
+    await bot.session.close()
+
+    for name, (callbacks, messages) in results.items():
+        print(f"{name}: кнопки {callbacks:.1f} мкс/обновление, команды {messages:.1f} мкс/обновление")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Накладные расходы маршрутизации обновлений")
+    parser.add_argument("--iterations", type=int, default=20000)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,100 @@
+"""
+Нагрузочный тест клиента ЮKassa на локальной заглушке.
+
+Каждое «оформление заказа» создает платеж и опрашивает его статус,
+как это делает check_payment_status_task, пока платеж не завершится.
+
+    python dev/bench_payments.py --checkouts 5000 --concurrency 1000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+# Добавляем корневую директорию бота в sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dev.yookassa_stub import YooKassaStub
+from services.yookassa_client import YooKassaClient, YooKassaError
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def checkout(client: YooKassaClient, number: int, poll_interval: float, results: dict) -> None:
+    started = time.monotonic()
+    try:
+        payment = await client.create_payment(
+            {"amount": {"value": "100.00", "currency": "RUB"}, "description": f"Заказ №{number}"},
+            idempotence_key=f"order-{number}"
+        )
+        results["create"].append(time.monotonic() - started)
+
+        while payment["status"] == "pending":
+            await asyncio.sleep(poll_interval)
+            payment = await client.get_payment(payment["id"])
+            results["polls"] += 1
+
+        results["settle"].append(time.monotonic() - started)
+        results["outcomes"][payment["status"]] += 1
+    except YooKassaError as e:
+        results["outcomes"][type(e).__name__] += 1
+
+
+async def run(args) -> None:
+    stub = YooKassaStub(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        pay_after=args.pay_after,
+        success_rate=args.success_rate
+    )
+    async with stub:
+        client = YooKassaClient("bench", "bench", api_url=stub.url, pool_size=args.pool_size)
+        results = {"create": [], "settle": [], "polls": 0, "outcomes": Counter()}
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(number: int) -> None:
+            async with semaphore:
+                await checkout(client, number, args.poll_interval, results)
+
+        started = time.monotonic()
+        await asyncio.gather(*(limited(number) for number in range(args.checkouts)))
+        elapsed = time.monotonic() - started
+        await client.close()
+
+    print(f"Оформлений: {args.checkouts} (одновременно до {args.concurrency}) за {elapsed:.2f} с")
+    print(f"Пропускная способность: {args.checkouts / elapsed:.1f} оформлений/с, "
+          f"{stub.stats['requests'] / elapsed:.1f} запросов/с")
+    for name in ("create", "settle"):
+        values = results[name]
+        print(f"{name}: p50={percentile(values, 0.5) * 1000:.1f} мс, "
+              f"p95={percentile(values, 0.95) * 1000:.1f} мс, p99={percentile(values, 0.99) * 1000:.1f} мс")
+    print(f"Опросов статуса: {results['polls']}")
+    print(f"Исходы: {dict(results['outcomes'])}")
+    print(f"Заглушка: {dict(stub.stats)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест платежей на заглушке ЮKassa")
+    parser.add_argument("--checkouts", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=100, help="размер пула соединений клиента")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="интервал опроса статуса, сек.")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--pay-after", type=float, default=1.0)
+    parser.add_argument("--success-rate", type=float, default=0.95)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
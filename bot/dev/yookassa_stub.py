@@ -0,0 +1,251 @@
+"""
+Локальная замена API ЮKassa для интеграционных и нагрузочных тестов.
+
+Поддерживает создание платежа (с учетом Idempotence-Key) и получение
+платежа по ID. Задержка ответа, доля ошибок 5xx, время и исход оплаты
+настраиваются, а ошибки 5xx можно задать и точным числом (fail_next); при смене статуса платежа отправляется уведомление
+(webhook), если задан его адрес.
+
+Внутри тестов:
+
+    async with YooKassaStub(pay_after=0.5) as stub:
+        client = YooKassaClient("shop", "secret", api_url=stub.url)
+
+Отдельным процессом:
+
+    python dev/yookassa_stub.py --port 8081 --latency 0.05 --error-rate 0.01
+    YOOKASSA_API_URL=http://127.0.0.1:8081/v3 python main.py
+"""
+
+import argparse
+import asyncio
+import random
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiohttp import web, ClientSession, ClientError
+
+
+class YooKassaStub:
+    """HTTP-сервер, совместимый с используемой частью API ЮKassa"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        pay_after: float | None = 1.0,
+        success_rate: float = 1.0,
+        webhook_url: str | None = None
+    ):
+        """
+        Args:
+            host, port: Адрес сервера (порт 0 — любой свободный)
+            latency: Задержка каждого ответа (сек.)
+            jitter: Случайная добавка к задержке от 0 до jitter (сек.)
+            error_rate: Доля запросов, на которые отвечает 500
+            pay_after: Через сколько секунд платеж завершается (None — никогда сам)
+            success_rate: Доля платежей, завершающихся успешно (остальные отменяются)
+            webhook_url: Адрес для уведомлений о смене статуса
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.pay_after = pay_after
+        self.success_rate = success_rate
+        self.webhook_url = webhook_url
+
+        self.payments: dict[str, dict] = {}
+        self.stats = Counter()
+        # Сколько следующих запросов к API получат 500 независимо от error_rate
+        self.failures_left = 0
+        self._by_idempotence_key: dict[str, str] = {}
+        self._timers: list[asyncio.TimerHandle] = []
+        self._webhook_tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner | None = None
+        self._http: ClientSession | None = None
+
+        self.app = web.Application(middlewares=[self._simulate_network])
+        self.app.router.add_post("/v3/payments", self.create_payment)
+        self.app.router.add_get("/v3/payments/{payment_id}", self.get_payment)
+        # Управление исходом платежа из тестов
+        self.app.router.add_post("/stub/payments/{payment_id}/{status}", self.force_status)
+
+    @property
+    def url(self) -> str:
+        """Базовый адрес API для YOOKASSA_API_URL"""
+        return f"http://{self.host}:{self.port}/v3"
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При порте 0 узнаем, какой порт выдала система
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        for timer in self._timers:
+            timer.cancel()
+        for task in list(self._webhook_tasks):
+            task.cancel()
+        if self._http:
+            await self._http.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @web.middleware
+    async def _simulate_network(self, request: web.Request, handler):
+        self.stats["requests"] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if request.path.startswith("/v3/"):
+            if not request.headers.get("Authorization", "").startswith("Basic "):
+                self.stats["unauthorized"] += 1
+                return web.json_response(
+                    {"type": "error", "code": "invalid_credentials", "description": "Authentication required"},
+                    status=401
+                )
+            if self.failures_left > 0 or random.random() < self.error_rate:
+                self.failures_left = max(self.failures_left - 1, 0)
+                self.stats["errors"] += 1
+                return web.json_response({"type": "error", "code": "internal_server_error"}, status=500)
+
+        return await handler(request)
+
+    async def create_payment(self, request: web.Request) -> web.Response:
+        key = request.headers.get("Idempotence-Key")
+        if not key:
+            return web.json_response(
+                {"type": "error", "code": "invalid_request", "description": "Idempotence-Key header is required"},
+                status=400
+            )
+
+        # Повтор с тем же ключом возвращает уже созданный платеж
+        if key in self._by_idempotence_key:
+            self.stats["idempotent_replays"] += 1
+            return web.json_response(self.payments[self._by_idempotence_key[key]])
+
+        data = await request.json()
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": data.get("amount"),
+            "description": data.get("description"),
+            "metadata": data.get("metadata", {}),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"http://{self.host}:{self.port}/checkout/{payment_id}"
+            },
+            "test": True
+        }
+        self.payments[payment_id] = payment
+        self._by_idempotence_key[key] = payment_id
+        self.stats["created"] += 1
+
+        if self.pay_after is not None:
+            status = "succeeded" if random.random() < self.success_rate else "canceled"
+            loop = asyncio.get_running_loop()
+            self._timers.append(loop.call_later(self.pay_after, self.set_status, payment_id, status))
+
+        return web.json_response(payment)
+
+    async def get_payment(self, request: web.Request) -> web.Response:
+        payment = self.payments.get(request.match_info["payment_id"])
+        if not payment:
+            return web.json_response({"type": "error", "code": "not_found"}, status=404)
+        return web.json_response(payment)
+
+    async def force_status(self, request: web.Request) -> web.Response:
+        payment_id = request.match_info["payment_id"]
+        if payment_id not in self.payments:
+            return web.json_response({"type": "error", "code": "not_found"}, status=404)
+        self.set_status(payment_id, request.match_info["status"])
+        return web.json_response(self.payments[payment_id])
+
+    def fail_next(self, count: int) -> None:
+        """Ответить 500 на следующие count запросов к API"""
+        self.failures_left = count
+
+    def set_status(self, payment_id: str, status: str) -> None:
+        """Перевести платеж в новый статус и отправить уведомление"""
+        payment = self.payments[payment_id]
+        if payment["status"] == status:
+            return
+
+        payment["status"] = status
+        payment["paid"] = status == "succeeded"
+        self.stats[status] += 1
+
+        if self.webhook_url:
+            task = asyncio.create_task(self._send_webhook(payment))
+            self._webhook_tasks.add(task)
+            task.add_done_callback(self._webhook_tasks.discard)
+
+    async def _send_webhook(self, payment: dict) -> None:
+        if self._http is None:
+            self._http = ClientSession()
+        event = {"type": "notification", "event": f"payment.{payment['status']}", "object": payment}
+        try:
+            async with self._http.post(self.webhook_url, json=event) as response:
+                self.stats["webhooks_sent"] += 1
+                if response.status >= 400:
+                    self.stats["webhooks_rejected"] += 1
+        except ClientError:
+            self.stats["webhooks_failed"] += 1
+
+
+async def serve(args) -> None:
+    stub = YooKassaStub(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        pay_after=None if args.pay_after < 0 else args.pay_after,
+        success_rate=args.success_rate,
+        webhook_url=args.webhook_url
+    )
+    async with stub:
+        print(f"✅ Заглушка ЮKassa запущена: {stub.url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            print(f"Статистика: {dict(stub.stats)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная заглушка API ЮKassa")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--pay-after", type=float, default=1.0, help="время до оплаты, сек. (-1 — никогда)")
+    parser.add_argument("--success-rate", type=float, default=1.0, help="доля успешных оплат")
+    parser.add_argument("--webhook-url", default=None, help="адрес для уведомлений о платежах")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -1,22 +1,23 @@
 from aiogram import Router
-from .start import start_router
-from .catalog import catalog_router
-from .cart import cart_router
+from . import start, catalog, cart, payment, orders, search
 from .delivery import delivery_router
-from .payment import payment_router
-from .orders import orders_router
 from .faq import faq_router
+from .search import search_router
+from utils.callback_data import callback_table
+from utils.command_table import command_table
 
 # Создаем главный роутер для объединения всех роутеров
 main_router = Router()
 
-# Подключаем все роутеры к главному
-main_router.include_router(start_router)
-main_router.include_router(catalog_router)
-main_router.include_router(cart_router)
+# Команды и кнопки находят обработчик одним обращением к словарю,
+# до перебора фильтров остальных роутеров
+main_router.include_router(command_table.router)
+main_router.include_router(callback_table.router)
+
+# Подключаем роутеры с обработчиками по состояниям и тексту сообщений
 main_router.include_router(delivery_router)
-main_router.include_router(orders_router)
-main_router.include_router(payment_router)
 main_router.include_router(faq_router)
+# Inline-поиск товаров: все inline-запросы, кроме вопросов FAQ с «?»
+main_router.include_router(search_router)
 
 __all__ = ["main_router"]
@@ -1,18 +1,24 @@
-from aiogram import Router, F
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select
 
+from config import CART_COALESCE_DELAY
 from database import get_session
-from services.cart_service import get_cart_items, update_cart_item, remove_from_cart, clear_cart
+from services.cart_service import (
+    CartLine, get_cart_snapshot, get_cart_line, stage_cart_item_quantity,
+    flush_cart_updates, has_pending_quantity, remove_from_cart, clear_cart
+)
+from utils.callback_data import Action, CallbackData, callback_table
 from utils.logger import logger
 from utils.formatters import format_price, format_total_price
+from utils.messages import show_text_screen
 from keyboards import (
     get_cart_keyboard, get_cart_item_keyboard,
     get_cart_empty_keyboard
 )
 from .start import callback_start
-from models.user import User
 
 
 # Определение состояний для FSM
@@ -23,230 +29,221 @@ class OrderDelivery(StatesGroup):
     confirm_info = State()
 
 
-cart_router = Router()
+# Отложенные обновления карточек товаров: (chat_id, message_id) → задача
+item_refresh_tasks: dict[tuple[int, int], asyncio.Task] = {}
 
 
-@cart_router.callback_query(F.data == "cart")
+@callback_table.exact("cart")
 async def show_cart(callback: CallbackQuery):
     """Показать содержимое корзины"""
     user_id = callback.from_user.id
     logger.info(f"Пользователь {user_id} открыл корзину")
     
     async for session in get_session():
-        cart_items = await get_cart_items(session, user_id)
+        await leave_item_screen(callback, session)
+        cart = await get_cart_snapshot(session, user_id)
         
-        if not cart_items:
-            await callback.message.edit_text(
+        # В корзину переходят и из карточки товара с фото
+        if cart.is_empty:
+            await show_text_screen(
+                callback.message,
                 "🛒 Ваша корзина пуста. Добавьте товары из каталога.",
-                reply_markup=get_cart_empty_keyboard()
+                get_cart_empty_keyboard()
             )
             await callback.answer()
             return
         
-        total_price = 0
         cart_text = "🛒 Ваша корзина:\n\n"
         
-        for i, (cart_item, product) in enumerate(cart_items, 1):
-            # Форматируем цену и общую стоимость позиции
-            price_str = format_price(product.price)
-            
-            item_total = product.price * cart_item.quantity
-            total_price += item_total
-            
-            # Форматируем общую стоимость позиции
-            item_total_str = format_price(item_total)
-            
+        for i, line in enumerate(cart.lines, 1):
             cart_text += (
-                f"{i}. {product.name}\n"
-                f"   Цена: {price_str} × {cart_item.quantity} шт. = {item_total_str}\n\n"
+                f"{i}. {line.name}\n"
+                f"   Цена: {format_price(line.price)} × {line.quantity} шт. = {format_price(line.total)}\n\n"
             )
         
-        # Форматируем общую стоимость корзины
-        total_price_str = format_price(total_price)
-        
-        cart_text += f"Общая стоимость: {total_price_str}"
+        cart_text += f"Общая стоимость: {format_price(cart.total)}"
 
-        await callback.message.edit_text(
+        await show_text_screen(
+            callback.message,
             cart_text,
-            reply_markup=get_cart_keyboard(cart_items, total_price)
+            get_cart_keyboard(cart)
         )
     
     await callback.answer()
 
 
-@cart_router.callback_query(F.data.startswith("cart_item_"))
-async def show_cart_item(callback: CallbackQuery):
+def get_cart_item_text(line: CartLine) -> str:
+    """Текст карточки товара в корзине"""
+    price_str, total_str = format_total_price(line.price, line.quantity)
+
+    return (
+        f"🛍️ {line.name}\n\n"
+        f"💰 Цена за единицу: {price_str}\n"
+        f"🔢 Количество: {line.quantity} шт.\n"
+        f"💵 Общая стоимость: {total_str}"
+    )
+
+
+async def return_to_cart(callback: CallbackQuery, session):
+    """Вернуться к корзине или в главное меню, если корзина опустела"""
+    await leave_item_screen(callback, session)
+    cart = await get_cart_snapshot(session, callback.from_user.id)
+    
+    if not cart.is_empty:
+        # Если в корзине остались товары, возвращаемся к корзине
+        await show_cart(callback)
+    else:
+        # Если корзина пуста, возвращаемся в главное меню
+        await callback.answer("🛒 Корзина пуста!", show_alert=True)
+        await callback_start(callback)
+
+
+def schedule_item_refresh(callback: CallbackQuery, cart_item_id: int) -> None:
+    """
+    Отложить запись количества и обновление карточки товара.
+    Все нажатия ➕/➖ в пределах окна дают один UPDATE и одно редактирование
+    сообщения с итоговым количеством.
+    """
+    key = (callback.message.chat.id, callback.message.message_id)
+    if key in item_refresh_tasks:
+        return
+
+    item_refresh_tasks[key] = asyncio.create_task(
+        refresh_item_screen(callback, cart_item_id, key)
+    )
+
+
+async def refresh_item_screen(callback: CallbackQuery, cart_item_id: int, key: tuple[int, int]):
+    """
+    Записать накопленные изменения и показать итоговое состояние карточки.
+    Нажатия во время записи или редактирования не создают новую задачу,
+    поэтому после редактирования задача повторяет цикл, пока не останется
+    незаписанных изменений позиции.
+    """
+    user_id = callback.from_user.id
+    try:
+        while True:
+            await asyncio.sleep(CART_COALESCE_DELAY)
+
+            async for session in get_session():
+                await flush_cart_updates(session, user_id)
+                line = await get_cart_line(session, user_id, cart_item_id)
+
+            if line:
+                try:
+                    await callback.message.edit_text(
+                        get_cart_item_text(line),
+                        reply_markup=get_cart_item_keyboard(line)
+                    )
+                except TelegramBadRequest as e:
+                    # Нажатия ➕ и ➖ могли взаимно погаситься
+                    if "message is not modified" not in e.message:
+                        raise
+            if not has_pending_quantity(user_id, cart_item_id):
+                break
+    except Exception as e:
+        logger.error(f"Ошибка обновления карточки товара {cart_item_id}: {e}")
+    finally:
+        if item_refresh_tasks.get(key) is asyncio.current_task():
+            del item_refresh_tasks[key]
+
+
+async def leave_item_screen(callback: CallbackQuery, session):
+    """Отменить отложенное обновление карточки и сразу записать изменения"""
+    task = item_refresh_tasks.pop((callback.message.chat.id, callback.message.message_id), None)
+    if task:
+        task.cancel()
+    await flush_cart_updates(session, callback.from_user.id)
+
+
+@callback_table.handler(Action.CART_ITEM)
+async def show_cart_item(callback: CallbackQuery, callback_data: CallbackData):
     """Показать отдельный товар в корзине"""
-    cart_item_id = int(callback.data.split("_")[2])
+    cart_item_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} открыл товар {cart_item_id} в корзине")
     
     async for session in get_session():
-        cart_items = await get_cart_items(session, user_id)
-        
-        # Находим нужный товар
-        cart_item_data = next(
-            ((cart_item, product) for cart_item, product in cart_items if cart_item.id == cart_item_id),
-            None
-        )
+        line = await get_cart_line(session, user_id, cart_item_id)
         
-        if not cart_item_data:
+        if not line:
             await callback.answer("Товар не найден в корзине", show_alert=True)
             return
         
-        cart_item, product = cart_item_data
-        
-        # Форматируем цену и общую стоимость
-        price_str, total_str = format_total_price(product.price, cart_item.quantity)
-
-        text = (
-            f"🛍️ {product.name}\n\n"
-            f"💰 Цена за единицу: {price_str}\n"
-            f"🔢 Количество: {cart_item.quantity} шт.\n"
-            f"💵 Общая стоимость: {total_str}"
-        )
-        
         await callback.message.edit_text(
-            text,
-            reply_markup=get_cart_item_keyboard(cart_item)
+            get_cart_item_text(line),
+            reply_markup=get_cart_item_keyboard(line)
         )
     
     await callback.answer()
 
 
-@cart_router.callback_query(F.data.startswith("cart_increase_"))
-async def increase_quantity(callback: CallbackQuery):
+@callback_table.handler(Action.CART_INCREASE)
+async def increase_quantity(callback: CallbackQuery, callback_data: CallbackData):
     """Увеличить количество товара в корзине"""
-    cart_item_id = int(callback.data.split("_")[2])
+    cart_item_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} увеличивает количество товара {cart_item_id} в корзине")
     
     async for session in get_session():
-        cart_items = await get_cart_items(session, user_id)
+        line = await get_cart_line(session, user_id, cart_item_id)
         
-        # Находим нужный товар
-        cart_item_data = next(
-            ((cart_item, product) for cart_item, product in cart_items if cart_item.id == cart_item_id),
-            None
-        )
-        
-        if not cart_item_data:
+        if not line:
             await callback.answer("Товар не найден в корзине", show_alert=True)
             return
         
-        cart_item, product = cart_item_data
-        
-        new_quantity = cart_item.quantity + 1
-        await update_cart_item(session, cart_item.id, new_quantity)
-        
-        # Форматируем цену и общую стоимость
-        price_str, total_str = format_total_price(product.price, new_quantity)
-        
-        # Обновляем сообщение
-        text = (
-            f"🛍️ {product.name}\n\n"
-            f"💰 Цена за единицу: {price_str}\n"
-            f"🔢 Количество: {new_quantity} шт.\n"
-            f"💵 Общая стоимость: {total_str}"
-        )
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=get_cart_item_keyboard(cart_item, new_quantity)
-        )
+        stage_cart_item_quantity(user_id, line, line.quantity + 1)
+        schedule_item_refresh(callback, line.id)
     
     await callback.answer()
 
 
-@cart_router.callback_query(F.data.startswith("cart_decrease_"))
-async def decrease_quantity(callback: CallbackQuery):
+@callback_table.handler(Action.CART_DECREASE)
+async def decrease_quantity(callback: CallbackQuery, callback_data: CallbackData):
     """Уменьшить количество товара в корзине"""
-    cart_item_id = int(callback.data.split("_")[2])
+    cart_item_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} уменьшает количество товара {cart_item_id} в корзине")
     
     async for session in get_session():
-        cart_items = await get_cart_items(session, user_id)
-        
-        # Находим нужный товар
-        cart_item_data = next(
-            ((cart_item, product) for cart_item, product in cart_items if cart_item.id == cart_item_id),
-            None
-        )
+        line = await get_cart_line(session, user_id, cart_item_id)
         
-        if not cart_item_data:
+        if not line:
             await callback.answer("Товар не найден в корзине", show_alert=True)
             return
         
-        cart_item, product = cart_item_data
-        
         # Если количество равно 1, удаляем товар из корзины
-        if cart_item.quantity == 1:
-            await remove_from_cart(session, cart_item.id)
-            
-            # Проверяем, остались ли товары в корзине
-            cart_items = await get_cart_items(session, user_id)
-            
-            if cart_items:
-                # Если в корзине остались товары, возвращаемся к корзине
-                await show_cart(callback)
-            else:
-                await callback.answer("🛒 Корзина пуста!", show_alert=True)
-                await callback_start(callback)
+        if line.quantity == 1:
+            await remove_from_cart(session, user_id, line.id)
+            await return_to_cart(callback, session)
             return
         
-        # Уменьшаем количество
-        new_quantity = cart_item.quantity - 1
-        await update_cart_item(session, cart_item.id, new_quantity)
-        
-        # Форматируем цену и общую стоимость
-        price_str, total_str = format_total_price(product.price, new_quantity)
-        
-        # Обновляем сообщение
-        text = (
-            f"🛍️ {product.name}\n\n"
-            f"💰 Цена за единицу: {price_str}\n"
-            f"🔢 Количество: {new_quantity} шт.\n"
-            f"💵 Общая стоимость: {total_str}"
-        )
-        
-        await callback.message.edit_text(
-            text,
-            reply_markup=get_cart_item_keyboard(cart_item, new_quantity)
-        )
+        stage_cart_item_quantity(user_id, line, line.quantity - 1)
+        schedule_item_refresh(callback, line.id)
     
     await callback.answer()
 
 
-@cart_router.callback_query(F.data.startswith("cart_remove_"))
-async def remove_item(callback: CallbackQuery):
+@callback_table.handler(Action.CART_REMOVE)
+async def remove_item(callback: CallbackQuery, callback_data: CallbackData):
     """Удалить товар из корзины"""
-    cart_item_id = int(callback.data.split("_")[2])
+    cart_item_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} удаляет товар {cart_item_id} из корзины")
     
     async for session in get_session():
         # Удаляем товар
-        await remove_from_cart(session, cart_item_id)
+        await remove_from_cart(session, user_id, cart_item_id)
         await callback.answer("Товар удален из корзины", show_alert=True)
         
-        # Проверяем, остались ли товары в корзине
-        cart_items = await get_cart_items(session, user_id)
-        
-        if cart_items:
-            # Если в корзине остались товары, возвращаемся к корзине
-            await show_cart(callback)
-        else:
-            # Если корзина пуста, возвращаемся в главное меню
-            await callback.answer("🛒 Корзина пуста!", show_alert=True)
-            await callback_start(callback)
+        await return_to_cart(callback, session)
 
 
-@cart_router.callback_query(F.data == "cart_clear")
+@callback_table.exact("cart_clear")
 async def clear_user_cart(callback: CallbackQuery):
     """Очистить корзину"""
     user_id = callback.from_user.id
@@ -254,16 +251,7 @@ async def clear_user_cart(callback: CallbackQuery):
     logger.info(f"Пользователь {user_id} очищает корзину")
     
     async for session in get_session():
-        # Получаем пользователя по Telegram ID
-        user_result = await session.execute(
-            select(User).where(User.user_id == user_id)
-        )
-        user = user_result.scalars().first()
-        
-        if user:
-            await clear_cart(session, user.id)
-            await callback.answer("✅ Корзина очищена", show_alert=True)
-        else:
-            await callback.answer("❌ Пользователь не найден", show_alert=True)
+        await clear_cart(session, user_id)
+        await callback.answer("✅ Корзина очищена", show_alert=True)
             
         await callback_start(callback)
@@ -1,27 +1,118 @@
-from aiogram import Router, F
-from aiogram.types import CallbackQuery, FSInputFile
+import asyncio
+
+from aiogram.types import CallbackQuery, FSInputFile, InputMediaPhoto, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.fsm.context import FSMContext
 from pathlib import Path
 
+from config import MEDIA_ROOT
 from database import get_session
 from services.product_service import (
     get_main_categories, get_subcategories, get_category_by_id, 
     get_products_by_category, get_product_by_id, count_products_in_category,
-    count_main_categories, count_subcategories
+    count_main_categories, count_subcategories, save_product_file_id
 )
 from services.cart_service import add_to_cart
+from utils.callback_data import Action, CallbackData, callback_table, pack
 from utils.logger import logger
-from utils.formatters import format_price, format_total_price
+from utils.formatters import format_total_price
+from utils.messages import CAPTION_LIMIT, edit_screen, show_text_screen
 from keyboards import get_categories_keyboard, get_products_keyboard, get_product_keyboard, get_product_added_keyboard
 
-catalog_router = Router()
 
 # Количество товаров на одной странице
 ITEMS_PER_PAGE = 10
 
 
-@catalog_router.callback_query(F.data == "catalog")
+def get_stock_text(product) -> str:
+    """Строка об остатке для карточки товара"""
+    if not product.in_stock:
+        return "❌ Нет в наличии"
+    if product.free_stock is not None:
+        return f"📦 В наличии: {product.free_stock} шт."
+    return ""
+
+
+def get_product_text(product, quantity: int = 1) -> str:
+    """Текст карточки товара (описание сокращается, чтобы текст поместился в подпись к фото)"""
+    price_str, total_price_str = format_total_price(product.price, quantity)
+
+    header = f"🛍️ {product.name}\n\n"
+    footer = f"💰 Цена: {price_str}"
+
+    stock_text = get_stock_text(product)
+    if stock_text:
+        footer += f"\n{stock_text}"
+
+    # Добавляем информацию об общей стоимости, если количество больше 1
+    if quantity > 1:
+        footer += f"\n💵 Общая стоимость: {total_price_str}"
+
+    description = product.description or ""
+    room = CAPTION_LIMIT - len(header) - len(footer) - 2
+    if len(description) > room:
+        description = description[:room - 1].rstrip() + "…"
+
+    return f"{header}{description}\n\n{footer}" if description else f"{header}{footer}"
+
+
+def get_product_photo(product) -> str | FSInputFile | None:
+    """Фото товара: file_id уже загруженного или файл с диска для первой загрузки"""
+    if product.file_id:
+        return product.file_id
+    if product.photo:
+        image_path = Path(MEDIA_ROOT) / product.photo
+        if image_path.exists():
+            return FSInputFile(image_path)
+    return None
+
+
+async def remember_file_id(product, photo, message: Message) -> None:
+    """Сохранить file_id после первой загрузки фото, чтобы дальше отправлять его без загрузки"""
+    if isinstance(photo, FSInputFile) and isinstance(message, Message) and message.photo:
+        async for session in get_session():
+            await save_product_file_id(session, product, message.photo[-1].file_id)
+
+
+async def send_product(message: Message, product) -> None:
+    """Отправить карточку товара новым сообщением: фото с подписью и клавиатурой"""
+    photo = get_product_photo(product)
+    if photo is None:
+        await message.answer(text=get_product_text(product), reply_markup=get_product_keyboard(product))
+        return
+
+    sent = await message.answer_photo(
+        photo=photo,
+        caption=get_product_text(product),
+        reply_markup=get_product_keyboard(product)
+    )
+    await remember_file_id(product, photo, sent)
+
+
+async def show_product_card(message: Message, product) -> None:
+    """
+    Показать карточку товара на месте сообщения.
+    Фото-сообщение меняется одним вызовом edit_media, текст — edit_text;
+    только при смене типа (из списка товаров к фото) сообщение пересоздается.
+    """
+    photo = get_product_photo(product)
+
+    if photo is None:
+        await show_text_screen(message, get_product_text(product), get_product_keyboard(product))
+    elif message.photo:
+        edited = await message.edit_media(
+            media=InputMediaPhoto(media=photo, caption=get_product_text(product)),
+            reply_markup=get_product_keyboard(product)
+        )
+        await remember_file_id(product, photo, edited)
+    else:
+        # Удаление списка и отправка карточки независимы и идут параллельно
+        await asyncio.gather(
+            message.delete(),
+            send_product(message, product)
+        )
+
+
+@callback_table.exact("catalog")
 async def show_catalog(callback: CallbackQuery):
     """Показать каталог основных категорий"""
     user_id = callback.from_user.id
@@ -56,17 +147,17 @@ async def show_main_categories_page(callback: CallbackQuery, page: int):
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data.startswith("main_categories_"))
-async def show_main_categories(callback: CallbackQuery):
+@callback_table.handler(Action.MAIN_CATEGORIES)
+async def show_main_categories(callback: CallbackQuery, callback_data: CallbackData):
     """Показать основные категории с пагинацией"""
-    page = int(callback.data.split("_")[2])
+    page, = callback_data.args
     await show_main_categories_page(callback, page)
 
 
-@catalog_router.callback_query(F.data.startswith("main_category_"))
-async def show_subcategories(callback: CallbackQuery):
+@callback_table.handler(Action.MAIN_CATEGORY)
+async def show_subcategories(callback: CallbackQuery, callback_data: CallbackData):
     """Показать подкатегории выбранной основной категории"""
-    category_id = int(callback.data.split("_")[2])
+    category_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} открыл основную категорию {category_id}")
@@ -104,35 +195,26 @@ async def show_subcategories_page_with_params(callback: CallbackQuery, parent_id
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data.startswith("subcategories_"))
-async def show_subcategories_page(callback: CallbackQuery):
+@callback_table.handler(Action.SUBCATEGORIES)
+async def show_subcategories_page(callback: CallbackQuery, callback_data: CallbackData):
     """Показать подкатегории с пагинацией"""
-    parts = callback.data.split("_")
-    parent_id = int(parts[1])
-    page = int(parts[2])
+    parent_id, page = callback_data.args
     
     await show_subcategories_page_with_params(callback, parent_id, page)
 
 
-@catalog_router.callback_query(F.data.startswith("category_"))
-async def show_products(callback: CallbackQuery, state: FSMContext):
+@callback_table.handler(Action.CATEGORY)
+async def show_products(callback: CallbackQuery, callback_data: CallbackData):
     """Показать товары выбранной категории"""
-    data = await state.get_data()
-    message_photo = data.get('message_photo')
-    if message_photo:
-        await message_photo.delete()
-        await state.clear()
-    parts = callback.data.split("_")
-    category_id = int(parts[1])
-    page = int(parts[2]) if len(parts) > 2 else 1
+    category_id, page = callback_data.args
     
     await show_products_with_params(callback, category_id, page)
 
 
-@catalog_router.callback_query(F.data.startswith("product_"))
-async def show_product(callback: CallbackQuery, state: FSMContext):
+@callback_table.handler(Action.PRODUCT)
+async def show_product(callback: CallbackQuery, callback_data: CallbackData):
     """Показать детали товара"""
-    product_id = int(callback.data.split("_")[1])
+    product_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} открыл товар {product_id}")
@@ -144,51 +226,15 @@ async def show_product(callback: CallbackQuery, state: FSMContext):
             await callback.answer("Товар не найден", show_alert=True)
             return
         
-        # Форматируем цену для лучшего отображения
-        price_str = format_price(product.price)
-        
-        message_text = (
-            f"🛍️ {product.name}\n\n"
-            f"{product.description}\n\n"
-            f"💰 Цена: {price_str}"
-        )
-
-        # Если у товара есть изображение
-        if product.image:
-            image_path = Path("/media") / str(product.image)
-
-            await callback.message.delete()
-            
-            if image_path.exists():
-                message_photo = await callback.message.answer_photo(
-                    photo=FSInputFile(image_path),
-                )
-                await state.update_data(message_photo=message_photo)
-
-                await callback.message.answer(
-                    text=message_text,
-                    reply_markup=get_product_keyboard(product)
-                )
-            else:
-                await callback.message.edit_text(
-                text=message_text,
-                reply_markup=get_product_keyboard(product)
-            )
-        else:
-            await callback.message.edit_text(
-                text=message_text,
-                reply_markup=get_product_keyboard(product)
-            )
+        await show_product_card(callback.message, product)
     
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data.startswith("change_quantity_"))
-async def change_product_quantity(callback: CallbackQuery):
+@callback_table.handler(Action.CHANGE_QUANTITY)
+async def change_product_quantity(callback: CallbackQuery, callback_data: CallbackData):
     """Изменить количество товара"""
-    parts = callback.data.split("_")
-    product_id = int(parts[2])
-    quantity = int(parts[3])
+    product_id, quantity = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} изменил количество товара {product_id} на {quantity}")
@@ -200,39 +246,25 @@ async def change_product_quantity(callback: CallbackQuery):
             await callback.answer("Товар не найден", show_alert=True)
             return
         
-        # Форматируем цену и общую стоимость
-        price_str, total_price_str = format_total_price(product.price, quantity)
-        
-        message_text = (
-            f"🛍️ {product.name}\n\n"
-            f"{product.description}\n\n"
-            f"💰 Цена: {price_str}\n"
-        )
-        
-        # Добавляем информацию об общей стоимости, если количество больше 1
-        if quantity > 1:
-            message_text += f"💵 Общая стоимость: {total_price_str}\n"
+        # Нельзя выбрать больше свободного остатка
+        if product.free_stock is not None and quantity > product.free_stock:
+            await callback.answer(f"В наличии только {product.free_stock} шт.", show_alert=True)
+            return
         
-        # Обновляем сообщение с новым количеством
-        await callback.message.edit_text(
-            text=message_text,
-            reply_markup=get_product_keyboard(product, quantity)
+        # Обновляем подпись карточки с новым количеством, фото остается прежним
+        await edit_screen(
+            callback.message,
+            get_product_text(product, quantity),
+            get_product_keyboard(product, quantity)
         )
     
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data.startswith("confirm_add_to_cart_"))
-async def confirm_add_to_cart(callback: CallbackQuery, state: FSMContext):
+@callback_table.handler(Action.CONFIRM_ADD_TO_CART)
+async def confirm_add_to_cart(callback: CallbackQuery, callback_data: CallbackData):
     """Подтверждение добавления товара в корзину"""
-    data = await state.get_data()
-    message_photo = data.get('message_photo')
-    if message_photo:
-        await message_photo.delete()
-        await state.clear()
-    parts = callback.data.split("_")
-    product_id = int(parts[4])
-    quantity = int(parts[5]) if len(parts) > 5 else 1
+    product_id, quantity = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} подтверждает добавление товара {product_id} в корзину в количестве {quantity}")
@@ -258,28 +290,23 @@ async def confirm_add_to_cart(callback: CallbackQuery, state: FSMContext):
         builder = InlineKeyboardBuilder()
         builder.button(
             text="✅ Добавить",
-            callback_data=f"add_to_cart_{product.id}_{quantity}"
+            callback_data=pack(Action.ADD_TO_CART, product.id, quantity)
         )
         builder.button(
             text="❌ Отмена",
-            callback_data=f"product_{product.id}"
+            callback_data=pack(Action.PRODUCT, product.id)
         )
         builder.adjust(1)
         
-        await callback.message.edit_text(
-            text=message_text,
-            reply_markup=builder.as_markup()
-        )
+        await edit_screen(callback.message, message_text, builder.as_markup())
     
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data.startswith("add_to_cart_"))
-async def add_product_to_cart(callback: CallbackQuery):
+@callback_table.handler(Action.ADD_TO_CART)
+async def add_product_to_cart(callback: CallbackQuery, callback_data: CallbackData):
     """Добавить товар в корзину"""
-    parts = callback.data.split("_")
-    product_id = int(parts[3])
-    quantity = int(parts[4]) if len(parts) > 4 else 1
+    product_id, quantity = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} добавляет товар {product_id} в корзину в количестве {quantity}")
@@ -291,6 +318,10 @@ async def add_product_to_cart(callback: CallbackQuery):
             await callback.answer("Товар не найден", show_alert=True)
             return
         
+        if not product.in_stock:
+            await callback.answer("😔 Товара нет в наличии", show_alert=True)
+            return
+        
         # Добавляем товар в корзину с указанным количеством
         await add_to_cart(session, user_id, product_id, quantity)
         
@@ -307,13 +338,10 @@ async def add_product_to_cart(callback: CallbackQuery):
             f"Общая стоимость: {price_str.replace(' руб.', '')} × {quantity} = {total_price_str}"
         )
         
-        await callback.message.edit_text(
-            text=message_text,
-            reply_markup=get_product_added_keyboard(product)
-        )
+        await edit_screen(callback.message, message_text, get_product_added_keyboard(product))
 
 
-@catalog_router.callback_query(F.data == "back_to_main_categories")
+@callback_table.exact("back_to_main_categories")
 async def back_to_main_categories(callback: CallbackQuery):
     """Вернуться к списку основных категорий"""
     user_id = callback.from_user.id
@@ -323,7 +351,7 @@ async def back_to_main_categories(callback: CallbackQuery):
     await show_main_categories_page(callback, page=1)
 
 
-@catalog_router.callback_query(F.data == "back_to_categories")
+@callback_table.exact("back_to_categories")
 async def back_to_categories(callback: CallbackQuery):
     """Вернуться к списку подкатегорий"""
     user_id = callback.from_user.id
@@ -333,10 +361,10 @@ async def back_to_categories(callback: CallbackQuery):
     await show_main_categories_page(callback, page=1)
 
 
-@catalog_router.callback_query(F.data.startswith("back_to_category_"))
-async def back_to_category(callback: CallbackQuery):
+@callback_table.handler(Action.BACK_TO_CATEGORY)
+async def back_to_category(callback: CallbackQuery, callback_data: CallbackData):
     """Вернуться к списку товаров в категории"""
-    category_id = int(callback.data.split("_")[3])
+    category_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} возвращается к категории {category_id}")
@@ -364,25 +392,21 @@ async def show_products_with_params(callback: CallbackQuery, category_id: int, p
             await callback.answer("В этой категории пока нет товаров", show_alert=True)
             return
         
-        await callback.message.edit_text(
+        # Из карточки товара (фото) список показывается новым текстовым сообщением
+        await show_text_screen(
+            callback.message,
             f"📂 Категория: {category.name}\n\n"
             f"Выберите товар:",
-            reply_markup=get_products_keyboard(products, category_id, page, total_pages)
+            get_products_keyboard(products, category_id, page, total_pages)
         )
     
     await callback.answer()
 
 
-@catalog_router.callback_query(F.data == "empty")
-async def handle_empty_button(callback: CallbackQuery):
-    """Обработка нажатия на пустую кнопку"""
-    await callback.answer("Это информационная кнопка")
-
-
-@catalog_router.callback_query(F.data.startswith("back_to_parent_category_"))
-async def back_to_parent_category(callback: CallbackQuery):
+@callback_table.handler(Action.BACK_TO_PARENT_CATEGORY)
+async def back_to_parent_category(callback: CallbackQuery, callback_data: CallbackData):
     """Вернуться к родительской категории"""
-    category_id = int(callback.data.split("_")[4])
+    category_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} возвращается из категории {category_id} к родительской категории")
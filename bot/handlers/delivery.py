@@ -1,11 +1,12 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from database import get_session
-from services.cart_service import get_cart_items
+from services.cart_service import get_cart_snapshot
 from services.user_service import has_delivery_info, update_user_delivery_info, get_user_delivery_info
+from utils.callback_data import callback_table
 from utils.logger import logger
 from utils.formatters import format_price, format_phone_number
 from keyboards import get_checkout_keyboard, get_cart_keyboard
@@ -21,15 +22,7 @@ class DeliveryInfo(StatesGroup):
 delivery_router = Router()
 
 
-def calculate_total_price(cart_items):
-    total_price = 0
-    for cart_item, product in cart_items:
-        item_total = product.price * cart_item.quantity
-        total_price += item_total
-    return total_price
-
-
-@delivery_router.callback_query(F.data == "checkout")
+@callback_table.exact("checkout")
 async def process_checkout(callback: CallbackQuery, state: FSMContext):
     """Обработка нажатия на кнопку 'Оформить заказ'"""
     user_id = callback.from_user.id
@@ -38,8 +31,8 @@ async def process_checkout(callback: CallbackQuery, state: FSMContext):
     
     async for session in get_session():
         # Проверяем, есть ли товары в корзине
-        cart_items = await get_cart_items(session, user_id)
-        if not cart_items:
+        cart = await get_cart_snapshot(session, user_id)
+        if cart.is_empty:
             await callback.answer("Корзина пуста, невозможно оформить заказ", show_alert=True)
             return
         
@@ -50,8 +43,7 @@ async def process_checkout(callback: CallbackQuery, state: FSMContext):
             # Если данные уже есть, показываем их и предлагаем подтвердить или изменить
             delivery_info = await get_user_delivery_info(session, user_id)
 
-            total_price = calculate_total_price(cart_items)
-            total_price_str = format_price(total_price)
+            total_price_str = format_price(cart.total)
             
             await callback.message.edit_text(
                 f"📦 Данные доставки:\n\n"
@@ -74,7 +66,7 @@ async def process_checkout(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@delivery_router.callback_query(F.data == "checkout_edit")
+@callback_table.exact("checkout_edit")
 async def edit_delivery_info(callback: CallbackQuery, state: FSMContext):
     """Обработка нажатия на кнопку 'Изменить данные'"""
     user_id = callback.from_user.id
@@ -173,10 +165,8 @@ async def process_address(message: Message, state: FSMContext):
         )
         
         # Получаем товары из корзины для отображения общей стоимости
-        cart_items = await get_cart_items(session, user_id)
-
-        total_price = calculate_total_price(cart_items)
-        total_price_str = format_price(total_price)
+        cart = await get_cart_snapshot(session, user_id)
+        total_price_str = format_price(cart.total)
         
         # Показываем подтверждение данных
         await message.answer(
@@ -189,7 +179,7 @@ async def process_address(message: Message, state: FSMContext):
         )
 
 
-@delivery_router.callback_query(F.data == "checkout_cancel")
+@callback_table.exact("checkout_cancel")
 async def cancel_checkout(callback: CallbackQuery, state: FSMContext):
     """Отмена оформления заказа"""
     user_id = callback.from_user.id
@@ -201,16 +191,14 @@ async def cancel_checkout(callback: CallbackQuery, state: FSMContext):
     
     async for session in get_session():
         # Возвращаемся в корзину
-        cart_items = await get_cart_items(session, user_id)
-
-        total_price = calculate_total_price(cart_items)
-        total_price_str = format_price(total_price)
+        cart = await get_cart_snapshot(session, user_id)
+        total_price_str = format_price(cart.total)
         
         await callback.message.edit_text(
             f"🛒 Корзина:\n\n"
-            f"Товары в корзине: {len(cart_items)}\n"
+            f"Товары в корзине: {len(cart.lines)}\n"
             f"Общая стоимость: {total_price_str}",
-            reply_markup=get_cart_keyboard(cart_items, total_price_str)
+            reply_markup=get_cart_keyboard(cart)
         )
     
     await callback.answer()
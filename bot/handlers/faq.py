@@ -1,8 +1,9 @@
-from aiogram import Router, F
+from aiogram import F, Router
 from aiogram.types import Message, CallbackQuery, InlineQuery, InlineQueryResultArticle, InputTextMessageContent
-from aiogram.filters import Command
 from database import get_session
 from services.faq_service import get_all_faqs, get_faq_by_id, search_faqs
+from utils.callback_data import Action, CallbackData, callback_table
+from utils.command_table import command_table
 from utils.logger import logger
 from keyboards.faq import get_faq_keyboard, get_faq_detail_keyboard, get_faq_search_results_keyboard
 import hashlib
@@ -11,7 +12,7 @@ import re
 faq_router = Router()
 
 
-@faq_router.message(Command("help"))
+@command_table.command("help")
 async def cmd_help(message: Message):
     """Обработчик команды /help"""
     user_id = message.from_user.id
@@ -34,7 +35,7 @@ async def cmd_help(message: Message):
     )
 
 
-@faq_router.callback_query(F.data == "help")
+@callback_table.exact("help")
 async def show_faq_list(callback: CallbackQuery):
     """Показать список FAQ"""
     user_id = callback.from_user.id
@@ -57,17 +58,17 @@ async def show_faq_list(callback: CallbackQuery):
         )
 
 
-@faq_router.callback_query(F.data == "faq_list")
+@callback_table.exact("faq_list")
 async def callback_faq_list(callback: CallbackQuery):
     """Обработчик возврата к списку FAQ"""
     await show_faq_list(callback)
 
 
-@faq_router.callback_query(F.data.startswith("faq:"))
-async def show_faq_detail(callback: CallbackQuery):
+@callback_table.handler(Action.FAQ)
+async def show_faq_detail(callback: CallbackQuery, callback_data: CallbackData):
     """Показать детальную информацию о FAQ"""
     user_id = callback.from_user.id
-    faq_id = int(callback.data.split(":")[1])
+    faq_id, = callback_data.args
     
     logger.info(f"Пользователь {user_id} открыл FAQ с ID {faq_id}")
     
@@ -86,7 +87,7 @@ async def show_faq_detail(callback: CallbackQuery):
     )
 
 
-@faq_router.callback_query(F.data == "faq_search")
+@callback_table.exact("faq_search")
 async def faq_search_prompt(callback: CallbackQuery):
     """Запрос на поиск по FAQ"""
     await callback.message.edit_text(
@@ -163,10 +164,10 @@ async def process_faq_search(message: Message):
     )
 
 
-@faq_router.inline_query()
+@faq_router.inline_query(F.query.startswith("?"))
 async def inline_faq_search(query: InlineQuery):
-    """Обработка inline запросов для поиска по FAQ"""
-    search_query = query.query.strip()
+    """Обработка inline запросов для поиска по FAQ (запрос начинается с «?»)"""
+    search_query = query.query[1:].strip()
     
     if not search_query:
         # Если запрос пустой, возвращаем несколько популярных вопросов
@@ -1,27 +1,37 @@
-from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 
 from database import get_session
-from services.order_service import get_user_orders, get_order_by_id, get_order_items
+from services.order_service import get_user_orders, get_user_order_with_items
+from utils.callback_data import Action, CallbackData, callback_table
 from utils.logger import logger
 from utils.formatters import format_price
 from keyboards.orders import get_orders_keyboard, get_order_details_keyboard
 from constants import get_order_status_text
 
-orders_router = Router()
 
-
-@orders_router.callback_query(F.data == "my_orders")
+@callback_table.exact("my_orders")
 async def show_orders(callback: CallbackQuery):
-    """Показать список заказов пользователя"""
+    """Показать последние заказы пользователя"""
+    await show_orders_page(callback, before_id=None)
+
+
+@callback_table.handler(Action.MY_ORDERS)
+async def show_older_orders(callback: CallbackQuery, callback_data: CallbackData):
+    """Показать заказы старше указанного"""
+    before_id, = callback_data.args
+    await show_orders_page(callback, before_id=before_id)
+
+
+async def show_orders_page(callback: CallbackQuery, before_id: int | None):
+    """Вспомогательная функция для показа страницы заказов"""
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} просматривает свои заказы")
     
     async for session in get_session():
-        # Получаем заказы пользователя
-        orders = await get_user_orders(session, user_id)
+        # Получаем страницу заказов пользователя
+        orders, has_more = await get_user_orders(session, user_id, before_id=before_id)
         
         if not orders:
             await callback.message.edit_text(
@@ -35,29 +45,33 @@ async def show_orders(callback: CallbackQuery):
         orders_text = "📋 Ваши заказы:\n\n"
         await callback.message.edit_text(
             orders_text,
-            reply_markup=get_orders_keyboard(orders=orders)
+            reply_markup=get_orders_keyboard(
+                orders=orders,
+                has_more=has_more,
+                is_first_page=before_id is None
+            )
         )
     
     await callback.answer()
 
 
-@orders_router.callback_query(F.data.startswith("order_details_"))
-async def show_order_details(callback: CallbackQuery):
+@callback_table.handler(Action.ORDER_DETAILS)
+async def show_order_details(callback: CallbackQuery, callback_data: CallbackData):
     """Показать детали заказа"""
-    order_id = int(callback.data.split("_")[2])
+    order_id, = callback_data.args
     user_id = callback.from_user.id
     
     logger.info(f"Пользователь {user_id} просматривает детали заказа {order_id}")
     
     async for session in get_session():
-        # Получаем заказ по ID
-        order = await get_order_by_id(session, order_id)
+        # Получаем заказ пользователя вместе с товарами
+        order = await get_user_order_with_items(session, user_id, order_id)
         
-        if not order or order.user_id != user_id:
+        if not order:
             await callback.answer("Заказ не найден", show_alert=True)
             return
 
-        order_items = await get_order_items(session, order_id)
+        order_items = order.items
         
         if not order_items:
             await callback.answer("В заказе нет товаров", show_alert=True)
@@ -82,8 +96,8 @@ async def show_order_details(callback: CallbackQuery):
         details_text += "📋 Товары в заказе:\n\n"
 
         total_price = 0
-        for i, item_data in enumerate(order_items, 1):
-            order_item, product = item_data
+        for i, order_item in enumerate(order_items, 1):
+            product = order_item.product
             
             # Получаем цену из OrderItem
             price = order_item.price
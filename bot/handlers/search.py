@@ -0,0 +1,112 @@
+from aiogram import Router
+from aiogram.filters import CommandObject
+from aiogram.types import (
+    Message, InlineQuery, InlineQueryResultArticle, InlineQueryResultCachedPhoto,
+    InputTextMessageContent, InlineKeyboardMarkup, InlineKeyboardButton
+)
+from aiogram.utils.deep_linking import create_start_link
+
+from config import INLINE_RESULTS_PER_PAGE, INLINE_CACHE_TIME_MIN, INLINE_CACHE_TIME_MAX
+from database import get_session
+from services.product_service import ProductCard, get_catalog_age
+from services.search_service import search_products, search_page
+from utils.command_table import command_table
+from utils.formatters import format_price
+from utils.logger import logger
+from keyboards import get_search_results_keyboard
+
+search_router = Router()
+
+# Префикс deep-link на карточку товара: t.me/<бот>?start=p_<ID товара>
+PRODUCT_LINK_PREFIX = "p_"
+
+
+def get_inline_cache_time() -> int:
+    """
+    Сколько секунд Telegram может кешировать ответ на inline-запрос.
+    Сброс кеша на стороне Telegram невозможен, поэтому срок растет вместе
+    со временем, в течение которого каталог не менялся.
+    """
+    return int(min(max(get_catalog_age() / 2, INLINE_CACHE_TIME_MIN), INLINE_CACHE_TIME_MAX))
+
+
+async def get_inline_result(query: InlineQuery, product: ProductCard):
+    """Результат inline-выдачи: фото по file_id или текстовая карточка, если фото еще не загружено"""
+    link = await create_start_link(query.bot, f"{PRODUCT_LINK_PREFIX}{product.id}")
+    price_str = format_price(product.price)
+    text = f"🛍️ {product.name}\n\n💰 Цена: {price_str}"
+
+    # Кнопки с callback_data не работают в сообщениях, отправленных через inline,
+    # поэтому карточка товара открывается по ссылке в чате с ботом
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🛍 Открыть товар", url=link)
+    ]])
+
+    if product.file_id:
+        return InlineQueryResultCachedPhoto(
+            id=f"product_{product.id}",
+            photo_file_id=product.file_id,
+            title=product.name,
+            description=price_str,
+            caption=text,
+            reply_markup=keyboard
+        )
+
+    return InlineQueryResultArticle(
+        id=f"product_{product.id}",
+        title=product.name,
+        description=price_str,
+        input_message_content=InputTextMessageContent(
+            message_text=text,
+            parse_mode=None
+        ),
+        reply_markup=keyboard
+    )
+
+
+@command_table.command("search")
+async def cmd_search(message: Message, command: CommandObject):
+    """Обработчик команды /search <запрос>"""
+    user_id = message.from_user.id
+
+    if not command.args:
+        await message.answer(
+            "🔍 Отправьте /search и название товара, например: /search чехол\n\n"
+            "Или нажмите кнопку ниже и вводите запрос прямо в строке сообщения.",
+            reply_markup=get_search_results_keyboard([])
+        )
+        return
+
+    logger.info(f"Пользователь {user_id} ищет товары: {command.args}")
+
+    async for session in get_session():
+        products = await search_products(session, command.args)
+
+    if not products:
+        await message.answer(
+            f"По запросу «{command.args}» ничего не найдено.",
+            reply_markup=get_search_results_keyboard([])
+        )
+        return
+
+    await message.answer(
+        f"🔍 Найдено по запросу «{command.args}»:",
+        reply_markup=get_search_results_keyboard(products)
+    )
+
+
+@search_router.inline_query()
+async def inline_product_search(query: InlineQuery):
+    """Обработка inline запросов для поиска товаров (пустой запрос — весь каталог)"""
+    offset = int(query.offset) if query.offset.isdigit() else 0
+
+    async for session in get_session():
+        products, next_offset = await search_page(session, query.query.strip(), offset, INLINE_RESULTS_PER_PAGE)
+
+    results = [await get_inline_result(query, product) for product in products]
+
+    await query.answer(
+        results=results,
+        cache_time=get_inline_cache_time(),
+        next_offset=str(next_offset) if next_offset is not None else ""
+    )
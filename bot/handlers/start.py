@@ -1,18 +1,20 @@
-from aiogram import Router, F
+from aiogram.filters import CommandObject
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
 from database import get_session
 from services.user_service import get_or_create_user
+from services.product_service import get_product_by_id
+from handlers.catalog import send_product
+from handlers.search import PRODUCT_LINK_PREFIX
+from utils.callback_data import callback_table
+from utils.command_table import command_table
 from utils.logger import logger
 from keyboards import get_main_keyboard
 from config import CHANNEL_ID
 
-start_router = Router()
 
-
-@start_router.message(Command("start"))
-async def cmd_start(message: Message):
-    """Обработчик команды /start"""
+@command_table.command("start")
+async def cmd_start(message: Message, command: CommandObject):
+    """Обработчик команды /start (в том числе по ссылке на товар)"""
     user_id = message.from_user.id
     username = message.from_user.username
     full_name = message.from_user.full_name
@@ -21,6 +23,14 @@ async def cmd_start(message: Message):
 
     async for session in get_session():
         await get_or_create_user(session, user_id, username)
+
+        # Ссылка из inline-поиска ведет сразу в карточку товара
+        if command.args and command.args.startswith(PRODUCT_LINK_PREFIX):
+            product_id = command.args[len(PRODUCT_LINK_PREFIX):]
+            product = await get_product_by_id(session, int(product_id)) if product_id.isdigit() else None
+            if product:
+                await send_product(message, product)
+                return
     
     await message.answer(
         f"👋 Привет, {full_name}!\n\n"
@@ -29,7 +39,7 @@ async def cmd_start(message: Message):
     )
 
 
-@start_router.callback_query(F.data == "start")
+@callback_table.exact("start")
 async def callback_start(callback: CallbackQuery):
     """Обработчик callback-запроса start"""
     user_id = callback.from_user.id
@@ -45,7 +55,7 @@ async def callback_start(callback: CallbackQuery):
     )
 
 
-@start_router.callback_query(F.data == "check_subscription")
+@callback_table.exact("check_subscription")
 async def check_subscription(callback: CallbackQuery):
     """Обработчик проверки подписки на канал"""
     user_id = callback.from_user.id
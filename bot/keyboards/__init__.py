@@ -1,9 +1,9 @@
 from .subscription import get_subscription_keyboard
 from .main import get_main_keyboard
-from .catalog import get_categories_keyboard, get_products_keyboard, get_product_keyboard, get_product_added_keyboard
-from .cart import get_cart_keyboard, get_cart_item_keyboard, get_cart_empty_keyboard, get_checkout_keyboard
+from .catalog import get_categories_keyboard, get_products_keyboard, get_product_keyboard, get_product_added_keyboard, get_search_results_keyboard
+from .cart import get_cart_keyboard, get_cart_item_keyboard, get_cart_empty_keyboard, get_cart_reminder_keyboard, get_checkout_keyboard
 from .payment import get_order_payment_keyboard, get_back_to_cart_keyboard
-from .orders import get_orders_list_keyboard, get_order_details_keyboard
+from .orders import get_orders_list_keyboard, get_order_details_keyboard, get_order_status_keyboard
 from .faq import get_faq_keyboard, get_faq_detail_keyboard, get_faq_search_results_keyboard
 
 __all__ = [
@@ -13,14 +13,17 @@ __all__ = [
     "get_products_keyboard",
     "get_product_keyboard",
     "get_product_added_keyboard",
+    "get_search_results_keyboard",
     "get_cart_keyboard",
     "get_cart_item_keyboard",
     "get_cart_empty_keyboard",
+    "get_cart_reminder_keyboard",
     "get_checkout_keyboard",
     "get_order_payment_keyboard",
     "get_back_to_cart_keyboard",
     "get_orders_list_keyboard",
     "get_order_details_keyboard",
+    "get_order_status_keyboard",
     "get_faq_keyboard",
     "get_faq_detail_keyboard",
     "get_faq_search_results_keyboard"
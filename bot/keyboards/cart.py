@@ -1,17 +1,18 @@
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from utils.formatters import format_price
+from utils.callback_data import Action, pack
 
 
-def get_cart_keyboard(cart_items, total_price):
+def get_cart_keyboard(cart):
     """Клавиатура для корзины"""
     keyboard = InlineKeyboardBuilder()
 
     # Добавляем кнопки для каждого товара в корзине
-    for cart_item, product in cart_items:
+    for line in cart.lines:
         keyboard.button(
-            text=f"{product.name} ({cart_item.quantity} шт.)",
-            callback_data=f"cart_item_{cart_item.id}"
+            text=f"{line.name} ({line.quantity} шт.)",
+            callback_data=pack(Action.CART_ITEM, line.id)
         )
 
     # Добавляем кнопки для оформления заказа и очистки корзины
@@ -21,7 +22,7 @@ def get_cart_keyboard(cart_items, total_price):
     )
 
     keyboard.button(
-        text=f"💳 Оформить заказ ({format_price(total_price)})",
+        text=f"💳 Оформить заказ ({format_price(cart.total)})",
         callback_data="checkout"
     )
 
@@ -46,14 +47,14 @@ def get_cart_item_keyboard(cart_item, quantity=None):
     
     # Кнопки изменения количества
     builder.row(
-        InlineKeyboardButton(text="➖", callback_data=f"cart_decrease_{cart_item.id}"),
+        InlineKeyboardButton(text="➖", callback_data=pack(Action.CART_DECREASE, cart_item.id)),
         InlineKeyboardButton(text=f"{qty} шт.", callback_data="cart_quantity"),
-        InlineKeyboardButton(text="➕", callback_data=f"cart_increase_{cart_item.id}")
+        InlineKeyboardButton(text="➕", callback_data=pack(Action.CART_INCREASE, cart_item.id))
     )
 
     builder.button(
         text="🗑️ Удалить",
-        callback_data=f"cart_remove_{cart_item.id}"
+        callback_data=pack(Action.CART_REMOVE, cart_item.id)
     )
 
     builder.button(
@@ -85,6 +86,18 @@ def get_cart_empty_keyboard():
     return builder.as_markup()
 
 
+def get_cart_reminder_keyboard():
+    """Клавиатура напоминания о брошенной корзине"""
+    builder = InlineKeyboardBuilder()
+
+    builder.button(
+        text="🛒 Перейти в корзину",
+        callback_data="cart"
+    )
+
+    return builder.as_markup()
+
+
 def get_checkout_keyboard(edit_mode=False, has_delivery_info=False):
     """Клавиатура для оформления заказа"""
     builder = InlineKeyboardBuilder()
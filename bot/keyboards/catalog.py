@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from utils.formatters import format_price
+from utils.callback_data import Action, pack
 from typing import List, Optional, Any
 
 
@@ -32,13 +33,13 @@ def get_categories_keyboard(
             # Для основных категорий показываем подкатегории
             builder.button(
                 text=category.name,
-                callback_data=f"main_category_{category.id}"
+                callback_data=pack(Action.MAIN_CATEGORY, category.id)
             )
         else:
             # Для подкатегорий показываем товары
             builder.button(
                 text=category.name,
-                callback_data=f"category_{category.id}"
+                callback_data=pack(Action.CATEGORY, category.id)
             )
     
     builder.adjust(1)
@@ -48,12 +49,12 @@ def get_categories_keyboard(
         # Кнопка "Назад" (если не на первой странице)
         if current_page > 1:
             if is_main:
-                navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"main_categories_{current_page - 1}"))
+                navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=pack(Action.MAIN_CATEGORIES, current_page - 1)))
             else:
-                navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"subcategories_{parent_id}_{current_page - 1}"))
+                navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=pack(Action.SUBCATEGORIES, parent_id, current_page - 1)))
         else:
             # Пустая кнопка, если на первой странице
-            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="empty"))
+            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
         
         # Номер текущей страницы
         navigation_buttons.append(InlineKeyboardButton(text=f"{current_page}/{total_pages}", callback_data="empty"))
@@ -61,12 +62,12 @@ def get_categories_keyboard(
         # Кнопка "Вперед" (если не на последней странице)
         if current_page < total_pages:
             if is_main:
-                navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"main_categories_{current_page + 1}"))
+                navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=pack(Action.MAIN_CATEGORIES, current_page + 1)))
             else:
-                navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"subcategories_{parent_id}_{current_page + 1}"))
+                navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=pack(Action.SUBCATEGORIES, parent_id, current_page + 1)))
         else:
             # Пустая кнопка, если на последней странице
-            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="empty"))
+            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
         
         builder.row(*navigation_buttons)
 
@@ -103,7 +104,7 @@ def get_products_keyboard(
     for product in products:
         builder.button(
             text=f"{product.name}",
-            callback_data=f"product_{product.id}"
+            callback_data=pack(Action.PRODUCT, product.id)
         )
     
     builder.adjust(1)
@@ -112,20 +113,20 @@ def get_products_keyboard(
         # Добавляем кнопки пагинации
         # Кнопка "Назад" (если не на первой странице)
         if current_page > 1:
-            navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"category_{category_id}_{current_page - 1}"))
+            navigation_buttons.append(InlineKeyboardButton(text="◀️", callback_data=pack(Action.CATEGORY, category_id, current_page - 1)))
         else:
             # Пустая кнопка, если на первой странице
-            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="empty"))
+            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
 
         # Номер текущей страницы
         navigation_buttons.append(InlineKeyboardButton(text=f"{current_page}/{total_pages}", callback_data="empty"))
 
         # Кнопка "Вперед" (если не на последней странице)
         if current_page < total_pages:
-            navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"category_{category_id}_{current_page + 1}"))
+            navigation_buttons.append(InlineKeyboardButton(text="▶️", callback_data=pack(Action.CATEGORY, category_id, current_page + 1)))
         else:
             # Пустая кнопка, если на последней странице
-            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="empty"))
+            navigation_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
 
         builder.row(*navigation_buttons)
     
@@ -133,7 +134,7 @@ def get_products_keyboard(
     builder.row(
         InlineKeyboardButton(
             text="🔙 Назад",
-            callback_data=f"back_to_parent_category_{category_id}"
+            callback_data=pack(Action.BACK_TO_PARENT_CATEGORY, category_id)
         )
     )
     
@@ -148,7 +149,7 @@ def get_product_keyboard(product: Any, quantity: int = 1) -> InlineKeyboardMarku
 
     builder.button(
         text="➖",
-        callback_data=f"change_quantity_{product.id}_{max(1, quantity - 1)}"
+        callback_data=pack(Action.CHANGE_QUANTITY, product.id, max(1, quantity - 1))
     )
     
     builder.button(
@@ -158,17 +159,17 @@ def get_product_keyboard(product: Any, quantity: int = 1) -> InlineKeyboardMarku
     
     builder.button(
         text="➕",
-        callback_data=f"change_quantity_{product.id}_{quantity + 1}"
+        callback_data=pack(Action.CHANGE_QUANTITY, product.id, quantity + 1)
     )
 
     builder.button(
         text="🛒 Добавить в корзину",
-        callback_data=f"confirm_add_to_cart_{product.id}_{quantity}"
+        callback_data=pack(Action.CONFIRM_ADD_TO_CART, product.id, quantity)
     )
 
     builder.button(
         text="🔙 Назад к товарам",
-        callback_data=f"category_{product.category_id}"
+        callback_data=pack(Action.CATEGORY, product.category_id)
     )
 
     builder.adjust(3, 1, 1)
@@ -189,9 +190,36 @@ def get_product_added_keyboard(product: Any) -> InlineKeyboardMarkup:
 
     builder.button(
         text="🔙 Назад к товарам",
-        callback_data=f"category_{product.category_id}"
+        callback_data=pack(Action.CATEGORY, product.category_id)
     )
 
     builder.adjust(1)
     
     return builder.as_markup()
+
+
+def get_search_results_keyboard(products: List[Any]) -> InlineKeyboardMarkup:
+    """
+    Создает клавиатуру с найденными товарами.
+    """
+    builder = InlineKeyboardBuilder()
+
+    for product in products:
+        builder.button(
+            text=f"{product.name} — {format_price(product.price)}",
+            callback_data=pack(Action.PRODUCT, product.id)
+        )
+
+    builder.button(
+        text="🔍 Искать в каталоге",
+        switch_inline_query_current_chat=""
+    )
+
+    builder.button(
+        text="🔙 В главное меню",
+        callback_data="start"
+    )
+
+    builder.adjust(1)
+
+    return builder.as_markup()
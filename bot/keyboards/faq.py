@@ -1,6 +1,7 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup
 from models import FAQ
+from utils.callback_data import Action, pack
 
 
 def get_faq_keyboard(faqs: list[FAQ]) -> InlineKeyboardMarkup:
@@ -12,7 +13,7 @@ def get_faq_keyboard(faqs: list[FAQ]) -> InlineKeyboardMarkup:
     for faq in faqs:
         builder.button(
             text=faq.question[:50] + ("..." if len(faq.question) > 50 else ""),
-            callback_data=f"faq:{faq.id}"
+            callback_data=pack(Action.FAQ, faq.id)
         )
 
     builder.button(text="🏠 Главное меню", callback_data="start")
@@ -46,7 +47,7 @@ def get_faq_search_results_keyboard(faqs: list[FAQ]) -> InlineKeyboardMarkup:
         for faq in faqs:
             builder.button(
                 text=faq.question[:50] + ("..." if len(faq.question) > 50 else ""),
-                callback_data=f"faq:{faq.id}"
+                callback_data=pack(Action.FAQ, faq.id)
             )
     else:
         builder.button(text="❌ Ничего не найдено", callback_data="faq_list")
@@ -9,10 +9,11 @@ def get_main_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
     builder.button(text="🛍 Каталог товаров", callback_data="catalog")
+    builder.button(text="🔍 Поиск товаров", switch_inline_query_current_chat="")
     builder.button(text="🛒 Корзина", callback_data="cart")
     builder.button(text="📦 Мои заказы", callback_data="my_orders")
     builder.button(text="❓ FAQ", callback_data="help")
 
-    builder.adjust(1, 2, 1)
+    builder.adjust(2, 2, 1)
 
     return builder.as_markup()
@@ -4,6 +4,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from models.order import Order
 from constants import get_order_status_text
+from utils.callback_data import Action, pack
 
 
 def get_orders_list_keyboard(orders: Optional[List[Order]] = None, has_orders: bool = True) -> InlineKeyboardMarkup:
@@ -18,7 +19,7 @@ def get_orders_list_keyboard(orders: Optional[List[Order]] = None, has_orders: b
             status_text = get_order_status_text(order.status)
             builder.button(
                 text=f"Заказ #{order.id} - {status_text}",
-                callback_data=f"order_details_{order.id}"
+                callback_data=pack(Action.ORDER_DETAILS, order.id)
             )
 
     builder.button(
@@ -52,9 +53,14 @@ def get_order_details_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_orders_keyboard(orders: Optional[List[Order]] = None, has_orders: bool = True) -> InlineKeyboardMarkup:
+def get_orders_keyboard(
+    orders: Optional[List[Any]] = None,
+    has_orders: bool = True,
+    has_more: bool = False,
+    is_first_page: bool = True
+) -> InlineKeyboardMarkup:
     """
-    Создает клавиатуру для списка заказов пользователя.
+    Создает клавиатуру для страницы списка заказов пользователя.
     """
     builder = InlineKeyboardBuilder()
 
@@ -63,9 +69,22 @@ def get_orders_keyboard(orders: Optional[List[Order]] = None, has_orders: bool =
             status_text = get_order_status_text(order.status)
             builder.button(
                 text=f"Заказ #{order.id} - {status_text}",
-                callback_data=f"order_details_{order.id}"
+                callback_data=pack(Action.ORDER_DETAILS, order.id)
             )
     
+    # Навигация: к более старым заказам и обратно к последним
+    if not is_first_page:
+        builder.button(
+            text="⏮ К последним заказам",
+            callback_data="my_orders"
+        )
+
+    if has_more:
+        builder.button(
+            text="Более ранние ▶️",
+            callback_data=pack(Action.MY_ORDERS, orders[-1].id)
+        )
+    
     builder.button(
         text="📦 Каталог",
         callback_data="catalog"
@@ -80,3 +99,19 @@ def get_orders_keyboard(orders: Optional[List[Order]] = None, has_orders: bool =
 
     return builder.as_markup()
     
+
+
+def get_order_status_keyboard(order_id: int) -> InlineKeyboardMarkup:
+    """
+    Создает клавиатуру для уведомления о смене статуса заказа.
+    """
+    builder = InlineKeyboardBuilder()
+
+    builder.button(
+        text="📦 Подробнее о заказе",
+        callback_data=pack(Action.ORDER_DETAILS, order_id)
+    )
+
+    builder.adjust(1)
+
+    return builder.as_markup()
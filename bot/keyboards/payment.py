@@ -1,6 +1,8 @@
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from utils.callback_data import Action, pack
+
 
 def get_successful_payment_keyboard() -> InlineKeyboardMarkup:
     """
@@ -23,7 +25,7 @@ def get_order_payment_keyboard(payment_url: str, payment_id: str) -> InlineKeybo
     builder = InlineKeyboardBuilder()
     
     builder.button(text="💳 Перейти к оплате", url=payment_url)
-    builder.button(text="❌ Отменить платеж", callback_data=f"cancel_payment_{payment_id}")
+    builder.button(text="❌ Отменить платеж", callback_data=pack(Action.CANCEL_PAYMENT, payment_id))
     
     builder.adjust(1)
     
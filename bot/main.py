@@ -1,13 +1,16 @@
 import asyncio
 import sys
-from aiogram import Bot, Dispatcher
 
-from config import BOT_TOKEN
-from handlers import main_router
-from middlewares import SubscriptionMiddleware
+from config import BOT_TOKEN, BOT_MODE
 from utils.logger import logger
 from database import init_models
-from scheduler import setup_scheduler
+from app import (
+    ALLOWED_UPDATES, BackgroundServices, create_bot, create_dispatcher,
+    setup_change_feed, set_bot_commands
+)
+from sharding import run_sharded
+from services.change_feed import change_feed
+from services.yookassa_client import yookassa
 
 
 async def main():
@@ -15,55 +18,46 @@ async def main():
     if not BOT_TOKEN:
         logger.error("Ошибка: BOT_TOKEN не найден в переменных окружения")
         sys.exit(1)
-    
+
     # Инициализация моделей базы данных
     logger.info("Инициализация моделей базы данных...")
     await init_models()
     logger.info("✅ Модели базы данных инициализированы")
-    
+
+    # Прием вебхуков и несколько процессов-обработчиков
+    if BOT_MODE == "sharded":
+        await run_sharded()
+        return
+
     # Инициализация бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
-    
-    # Регистрация middleware
-    dp.message.middleware(SubscriptionMiddleware())
-    dp.callback_query.middleware(SubscriptionMiddleware())
-    
-    # Регистрация роутеров
-    dp.include_router(main_router)
-    
+    bot = create_bot()
+    dp = create_dispatcher()
+
     # Запуск бота
     logger.info("✅ Бот запущен")
-    
+
     # Устанавливаем команды бота
     await set_bot_commands(bot)
-    
-    # Инициализируем и запускаем планировщик
-    scheduler = setup_scheduler(bot)
-    scheduler.start()
-    
+    # Вебхук остается после запуска в шардированном режиме и мешает getUpdates
+    await bot.delete_webhook()
+
+    # Инициализируем и запускаем планировщики
+    background = BackgroundServices(bot)
+    await background.start()
+
+    # Подписываемся на изменения из админки
+    setup_change_feed(background)
+    change_feed.start()
+
     try:
-        await dp.start_polling(bot, skip_updates=True, allowed_updates=[
-            "message", "callback_query", "inline_query"
-        ])
+        await dp.start_polling(bot, skip_updates=True, allowed_updates=ALLOWED_UPDATES)
     finally:
-        scheduler.shutdown()
+        await change_feed.stop()
+        await background.stop()
+        await yookassa.close()
         await bot.session.close()
 
 
-async def set_bot_commands(bot: Bot):
-    """Установка команд бота"""
-    from aiogram.types import BotCommand
-    
-    commands = [
-        BotCommand(command="start", description="Запустить бота"),
-        BotCommand(command="help", description="Помощь и FAQ")
-    ]
-    
-    await bot.set_my_commands(commands)
-    logger.info("✅ Команды бота установлены")
-
-
 if __name__ == "__main__":
     try:
         asyncio.run(main())
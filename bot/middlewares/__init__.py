@@ -1,3 +1,10 @@
 from .subscription import SubscriptionMiddleware
+from .noop import NoopCallbackMiddleware, NOOP_CALLBACKS
+from .api_calls import ApiRequestMiddleware, UpdateApiCallsMiddleware, api_call_stats
+from .rate_limit import RateLimitMiddleware, api_rate_limiter
 
-__all__ = ["SubscriptionMiddleware"] 
\ No newline at end of file
+__all__ = [
+    "SubscriptionMiddleware", "NoopCallbackMiddleware", "NOOP_CALLBACKS",
+    "ApiRequestMiddleware", "UpdateApiCallsMiddleware", "api_call_stats",
+    "RateLimitMiddleware", "api_rate_limiter"
+] 
\ No newline at end of file
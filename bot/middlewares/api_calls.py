@@ -0,0 +1,197 @@
+"""
+Сокращение и учет вызовов Bot API
+
+ApiRequestMiddleware подключается к сессии бота и видит каждый вызов API,
+в том числе из планировщика и очереди исходящих действий:
+- запоминает последний показанный текст и клавиатуру каждого сообщения
+  и не отправляет редактирование, которое ничего не меняет (ответ Telegram
+  «message is not modified» тоже считается успехом, а не ошибкой).
+  Сообщение может изменить и другой процесс бота (очередь исходящих действий
+  в шардированном режиме), поэтому запомненное состояние сверяется с датой
+  последнего редактирования из нажатой кнопки, а фоновые редактирования
+  отправляются всегда;
+- отправляет ответ на нажатие кнопки в фоне, параллельно с редактированием
+  сообщения, так как результат answerCallbackQuery обработчикам не нужен;
+- считает вызовы по методам.
+
+UpdateApiCallsMiddleware открывает для каждого обновления свой счетчик
+и пишет в отладочный лог, сколько вызовов API потребовала его обработка.
+"""
+
+import asyncio
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    AnswerCallbackQuery, DeleteMessage, EditMessageCaption, EditMessageMedia,
+    EditMessageReplyMarkup, EditMessageText, SendMessage, SendPhoto, TelegramMethod
+)
+from aiogram.types import Message, Update
+
+from config import RENDER_CACHE_SIZE
+from utils.cache import LRUCache
+from utils.logger import logger
+
+# Вызовы API по методам с момента запуска
+api_call_stats = Counter()
+
+# Счетчик вызовов текущего обновления (None вне обработки обновлений)
+_update_calls: ContextVar[Counter | None] = ContextVar("update_api_calls", default=None)
+
+# Сообщение нажатой кнопки текущего обновления: (ключ сообщения, дата редактирования)
+_callback_message: ContextVar[tuple | None] = ContextVar("callback_message", default=None)
+
+# Признак того, что содержимое сообщения при редактировании не меняется
+KEEP = object()
+
+
+def in_update() -> bool:
+    """Вызов сделан при обработке обновления (а не из фоновой задачи)"""
+    return _update_calls.get() is not None
+
+
+def dump_markup(markup) -> str | None:
+    return markup.model_dump_json(exclude_none=True) if markup else None
+
+
+class ApiRequestMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: пропуск пустых редактирований, фоновые ответы на кнопки, учет вызовов"""
+
+    def __init__(self, cache_size: int = RENDER_CACHE_SIZE):
+        # Последнее известное состояние сообщения: ключ → (содержимое, клавиатура, дата редактирования)
+        self._renders = LRUCache(cache_size)
+        self._background: set[asyncio.Task] = set()
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        if isinstance(method, AnswerCallbackQuery):
+            self._count(method)
+            task = asyncio.create_task(self._answer_in_background(make_request, bot, method))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            return True
+
+        if isinstance(method, (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)):
+            return await self._edit(make_request, bot, method)
+
+        self._count(method)
+        result = await make_request(bot, method)
+
+        if isinstance(method, (DeleteMessage, EditMessageMedia)):
+            # Содержимое после замены фото не отслеживается, удаленное — не нужно
+            self._renders.pop(self._key(method))
+        elif isinstance(method, (SendMessage, SendPhoto)) and isinstance(result, Message):
+            self._renders.set(
+                (result.chat.id, result.message_id),
+                (self._content(method), dump_markup(method.reply_markup), None)
+            )
+        return result
+
+    async def _edit(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        key = self._key(method)
+        content, markup = self._content(method), dump_markup(method.reply_markup)
+
+        previous = self._known_render(key)
+        if previous is not None:
+            if content is KEEP:
+                content = previous[0]
+            if (content, markup) == previous[:2]:
+                api_call_stats["skipped_edits"] += 1
+                return True
+
+        self._count(method)
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in e.message.lower():
+                self._renders.pop(key)
+                raise
+            result = True
+
+        # После изменения одной клавиатуры текст сообщения неизвестен
+        if content is KEEP:
+            self._renders.pop(key)
+        else:
+            edit_date = result.edit_date if isinstance(result, Message) else None
+            self._renders.set(key, (content, markup, edit_date))
+        return result
+
+    def _known_render(self, key: tuple) -> tuple | None:
+        """Запомненное состояние сообщения, если ему можно доверять"""
+        # Вне обработки обновлений сообщение могли изменить другие процессы,
+        # а сверить состояние не с чем
+        if not in_update():
+            return None
+
+        render = self._renders.get(key)
+        callback = _callback_message.get()
+        if render is not None and callback is not None and callback[0] == key and callback[1] != render[2]:
+            # Сообщение редактировали в обход этого процесса
+            self._renders.pop(key)
+            return None
+        return render
+
+    async def _answer_in_background(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> None:
+        try:
+            await make_request(bot, method)
+        except Exception as e:
+            # Чаще всего запрос устарел: пользователь нажал кнопку слишком давно
+            logger.debug(f"Не удалось ответить на нажатие кнопки: {e}")
+
+    @staticmethod
+    def _key(method: TelegramMethod) -> tuple:
+        inline_message_id = getattr(method, "inline_message_id", None)
+        if inline_message_id:
+            return ("inline", inline_message_id)
+        return (method.chat_id, method.message_id)
+
+    @staticmethod
+    def _content(method: TelegramMethod):
+        if isinstance(method, (EditMessageText, SendMessage)):
+            return ("text", method.text, str(method.entities))
+        if isinstance(method, (EditMessageCaption, SendPhoto)):
+            return ("caption", method.caption, str(method.caption_entities))
+        return KEEP
+
+    @staticmethod
+    def _count(method: TelegramMethod) -> None:
+        name = type(method).__name__
+        api_call_stats[name] += 1
+        calls = _update_calls.get()
+        if calls is not None:
+            calls[name] += 1
+
+
+class UpdateApiCallsMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: считает вызовы API, сделанные при обработке каждого обновления"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        calls = Counter()
+        token = _update_calls.set(calls)
+        message_token = _callback_message.set(self._callback_message(event))
+        try:
+            return await handler(event, data)
+        finally:
+            _callback_message.reset(message_token)
+            _update_calls.reset(token)
+            if calls:
+                logger.debug(
+                    f"Обновление {event.update_id} ({event.event_type}): "
+                    f"{sum(calls.values())} вызовов API {dict(calls)}"
+                )
+
+    @staticmethod
+    def _callback_message(event: Update) -> tuple | None:
+        # Недоступное (слишком старое) сообщение приходит без даты редактирования
+        message = event.callback_query.message if event.callback_query else None
+        if not isinstance(message, Message):
+            return None
+        return (message.chat.id, message.message_id), message.edit_date
@@ -0,0 +1,34 @@
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+# Информационные кнопки: callback_data → текст всплывающей подсказки (None — ответить молча)
+NOOP_CALLBACKS: dict[str, str | None] = {
+    "empty": "Это информационная кнопка",
+    "noop": None,
+    "cart_quantity": None,
+}
+
+
+class NoopCallbackMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для кнопок, которые ничего не делают.
+    Отвечает на нажатие сразу, до проверки подписки и перебора роутеров,
+    поэтому такие нажатия не обращаются к базе и лишним методам API.
+    """
+
+    def __init__(self, answers: dict[str, str | None] = NOOP_CALLBACKS):
+        self.answers = answers
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        if event.data not in self.answers:
+            return await handler(event, data)
+
+        # Ответ нужен, чтобы у кнопки пропал индикатор загрузки
+        await event.answer(self.answers[event.data])
+        return None
@@ -0,0 +1,217 @@
+"""
+Общий лимит исходящих сообщений Bot API
+
+Все отправки и редактирования сообщений (ответы пользователям, рассылки,
+очередь исходящих действий, напоминания) проходят через одну сессию бота,
+поэтому лимиты Telegram соблюдаются в одном месте — в middleware сессии:
+- общий token bucket на все сообщения бота (около 30 в секунду);
+- bucket на каждый чат (в личном чате около 1 сообщения в секунду
+  с небольшим запасом на всплески, в группе — около 20 в минуту);
+- приоритеты: вызовы при обработке обновлений интерактивные, остальные
+  фоновые. Фоновым недоступен резерв общего bucket, поэтому рассылка
+  забирает только свободную емкость и не задерживает ответы пользователям;
+- TelegramRetryAfter приостанавливает чат (и фоновые отправки) на указанное
+  время и снижает общий темп, который затем постепенно восстанавливается;
+  запрос повторяется один раз;
+- в режиме sharded общий bucket ограничивает только фоновые отправки,
+  а ответы пользователям — bucket их чатов.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from config import (
+    API_GLOBAL_RATE, API_INTERACTIVE_RESERVE, API_CHAT_RATE, API_CHAT_BURST, API_GROUP_RATE
+)
+from utils.cache import LRUCache
+from utils.logger import logger
+from .api_calls import in_update
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Методы, на которые распространяются лимиты сообщений Telegram
+LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+# Во сколько раз снижается общий темп после RetryAfter и какая доля
+# настроенного темпа возвращается после каждой успешной отправки
+BACKOFF_FACTOR = 0.5
+RECOVERY_STEP = 0.01
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float, reserve: float = 0) -> float:
+        """Через сколько секунд можно взять токен, оставив в запасе reserve токенов"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        missing = 1 + reserve - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class ApiRateLimiter:
+    """Общий и поканальные лимиты исходящих сообщений с приоритетами"""
+
+    def __init__(
+        self,
+        global_rate: float = API_GLOBAL_RATE,
+        interactive_reserve: float = API_INTERACTIVE_RESERVE,
+        chat_rate: float = API_CHAT_RATE,
+        chat_burst: float = API_CHAT_BURST,
+        group_rate: float = API_GROUP_RATE,
+    ):
+        self.global_rate = global_rate
+        self.interactive_reserve = interactive_reserve
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        # Расходуют ли интерактивные вызовы общий bucket
+        self.limit_interactive = True
+
+        self.global_bucket = self._global_bucket()
+        # Вытесненный bucket давно не использовался и был бы полным
+        self._chats = LRUCache(10000)
+        # Пауза фоновых отправок после RetryAfter
+        self._background_blocked_until = 0.0
+        self.metrics = Counter()
+
+    def _global_bucket(self) -> TokenBucket:
+        # Запас должен вмещать резерв и хотя бы один токен для фоновых отправок
+        return TokenBucket(self.global_rate, max(self.global_rate, self.interactive_reserve + 1))
+
+    def set_sharded(self) -> None:
+        """
+        Режим процесса-обработчика, когда сообщения отправляют несколько процессов,
+        а лимит Telegram действует на весь бот. Ответы пользователю ограничивает
+        bucket его чата, а все обновления пользователя обрабатывает один процесс,
+        поэтому интерактивные вызовы общий bucket не расходуют. Фоновые отправки
+        (они идут только из обработчика #0) не видят ответов других процессов
+        и ограничены общим темпом за вычетом резерва для ответов
+        """
+        self.limit_interactive = False
+        self.global_rate = max(self.global_rate - self.interactive_reserve, 1.0)
+        self.interactive_reserve = 0
+        self.global_bucket = self._global_bucket()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket | None:
+        if chat_id is None:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # У групп и каналов отрицательные ID или @username
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            bucket = TokenBucket(self.chat_rate if is_private else self.group_rate, self.chat_burst)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def acquire(self, chat_id, priority: str) -> None:
+        """Дождаться разрешения на отправку в чат"""
+        started = time.monotonic()
+        reserve = 0 if priority == INTERACTIVE else self.interactive_reserve
+        global_bucket = self.global_bucket if priority == BACKGROUND or self.limit_interactive else None
+        chat = self._chat_bucket(chat_id)
+
+        while True:
+            now = time.monotonic()
+            wait = max(
+                global_bucket.delay(now, reserve) if global_bucket else 0.0,
+                chat.delay(now) if chat else 0.0,
+                self._background_blocked_until - now if priority == BACKGROUND else 0.0,
+            )
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+
+        if global_bucket:
+            global_bucket.take()
+        if chat:
+            chat.take()
+
+        waited = time.monotonic() - started
+        self.metrics[f"{priority}_requests"] += 1
+        if waited > 0.001:
+            self.metrics[f"{priority}_delayed"] += 1
+            self.metrics[f"{priority}_wait_seconds"] += waited
+
+    def on_success(self) -> None:
+        """Постепенно вернуть общий темп к настроенному после снижения"""
+        if self.global_bucket.rate < self.global_rate:
+            self.global_bucket.rate = min(self.global_rate, self.global_bucket.rate + self.global_rate * RECOVERY_STEP)
+
+    def on_retry_after(self, chat_id, priority: str, retry_after: float) -> None:
+        """Учесть ответ 429: приостановить чат и фоновые отправки, снизить общий темп"""
+        until = time.monotonic() + retry_after
+        chat = self._chat_bucket(chat_id)
+        if chat:
+            chat.block(until)
+        self._background_blocked_until = max(self._background_blocked_until, until)
+        self.global_bucket.rate = max(self.global_bucket.rate * BACKOFF_FACTOR, 1.0)
+
+        self.metrics["retry_after"] += 1
+        logger.warning(
+            f"Telegram ограничил отправку ({priority}, чат {chat_id}) на {retry_after} сек., "
+            f"общий темп снижен до {self.global_bucket.rate:.1f}/сек."
+        )
+
+    def snapshot(self) -> dict:
+        """Метрики лимитера для логов и мониторинга"""
+        return {
+            **self.metrics,
+            "global_rate": round(self.global_bucket.rate, 2),
+            "global_tokens": round(self.global_bucket.tokens, 2),
+            "tracked_chats": len(self._chats),
+        }
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота, пропускающий сообщения через общий лимитер"""
+
+    def __init__(self, limiter: ApiRateLimiter | None = None):
+        self.limiter = limiter or api_rate_limiter
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        if not type(method).__name__.startswith(LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = INTERACTIVE if in_update() else BACKGROUND
+
+        for attempt in range(2):
+            await self.limiter.acquire(chat_id, priority)
+            try:
+                result = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.limiter.on_retry_after(chat_id, priority, e.retry_after)
+                if attempt:
+                    raise
+                continue
+            self.limiter.on_success()
+            return result
+
+
+# Общий лимитер процесса бота
+api_rate_limiter = ApiRateLimiter()
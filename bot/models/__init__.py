@@ -2,9 +2,10 @@ from .base import Base
 from .user import User
 from .product import Product, Category
 from .cart import CartItem
-from .order import Order, OrderItem
+from .order import Order, OrderItem, StockReservation
 from .faq import FAQ
-from .mailing import Mailing
+from .mailing import Mailing, MailingMedia, MailingDelivery, Segment, SegmentMember
+from .outbox import Outbox
 
 # Экспортируем все модели
 __all__ = [
@@ -15,5 +16,12 @@ __all__ = [
     "CartItem",
     "Order",
     "OrderItem",
-    "FAQ"
+    "StockReservation",
+    "FAQ",
+    "Mailing",
+    "MailingMedia",
+    "MailingDelivery",
+    "Segment",
+    "SegmentMember",
+    "Outbox"
 ] 
\ No newline at end of file
@@ -15,6 +15,7 @@ class CartItem(Base):
     quantity = Column(Integer, default=1)
     created_at = Column(DateTime, server_default=text("NOW()"))
     updated_at = Column(DateTime, server_default=text("NOW()"), onupdate=text("NOW()"))
+    reminded_at = Column(DateTime, nullable=True)
 
     # Отношения
     user = relationship("User")
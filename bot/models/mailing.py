@@ -1,18 +1,82 @@
-from sqlalchemy import Column, Integer, Text, Boolean, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint, func
 
 from .base import Base
 
 
+class Segment(Base):
+    """Модель сегмента аудитории для рассылок"""
+    __tablename__ = "shop_segment"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    has_ordered = Column(Boolean, nullable=True)
+    active_within_days = Column(Integer, nullable=True)
+    category_id = Column(Integer, ForeignKey("shop_category.id"), nullable=True)
+    registered_from = Column(DateTime, nullable=True)
+    registered_to = Column(DateTime, nullable=True)
+    snapshot_size = Column(Integer, nullable=True)
+    snapshot_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Segment(id={self.id}, name={self.name})>"
+
+
+class SegmentMember(Base):
+    """Модель участника снимка сегмента"""
+    __tablename__ = "shop_segmentmember"
+    __table_args__ = (UniqueConstraint("segment_id", "user_id"),)
+
+    id = Column(Integer, primary_key=True)
+    segment_id = Column(Integer, ForeignKey("shop_segment.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("shop_user.id"), nullable=False)
+
+    def __repr__(self):
+        return f"<SegmentMember(segment_id={self.segment_id}, user_id={self.user_id})>"
+
+
 class Mailing(Base):
     """Модель рассылки"""
     __tablename__ = "shop_mailing"
     
     id = Column(Integer, primary_key=True)
     text = Column(Text, nullable=False)
+    segment_id = Column(Integer, ForeignKey("shop_segment.id"), nullable=True)
     scheduled_at = Column(DateTime, nullable=False)
     is_sent = Column(Boolean, default=False)
+    sending_until = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     def __repr__(self):
         return f"<Mailing(id={self.id}, scheduled_at={self.scheduled_at})>"
+
+
+class MailingMedia(Base):
+    """Модель изображения рассылки"""
+    __tablename__ = "shop_mailingmedia"
+
+    id = Column(Integer, primary_key=True)
+    mailing_id = Column(Integer, ForeignKey("shop_mailing.id"), nullable=False)
+    image = Column(String(100), nullable=False)
+    position = Column(Integer, default=0)
+    file_id = Column(String(255), nullable=True)
+
+    def __repr__(self):
+        return f"<MailingMedia(id={self.id}, mailing_id={self.mailing_id})>"
+
+
+class MailingDelivery(Base):
+    """Модель результата доставки рассылки получателю"""
+    __tablename__ = "shop_mailingdelivery"
+
+    id = Column(Integer, primary_key=True)
+    mailing_id = Column(Integer, ForeignKey("shop_mailing.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("shop_user.id"), nullable=False)
+    status = Column(String(20), nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<MailingDelivery(mailing_id={self.mailing_id}, user_id={self.user_id}, status={self.status})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Numeric, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, Numeric, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import text
 
@@ -10,7 +10,7 @@ class Order(Base):
     __tablename__ = "shop_order"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
     username = Column(String(100), nullable=True)
     full_name = Column(String(255), nullable=False)
     phone = Column(String(20), nullable=False)
@@ -44,4 +44,19 @@ class OrderItem(Base):
     product = relationship("Product")
 
     def __repr__(self):
-        return f"<OrderItem(id={self.id}, order_id={self.order_id}, product_id={self.product_id})>" 
\ No newline at end of file
+        return f"<OrderItem(id={self.id}, order_id={self.order_id}, product_id={self.product_id})>" 
+
+
+class StockReservation(Base):
+    """Модель резерва товара под неоплаченный заказ"""
+    __tablename__ = "shop_stockreservation"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("shop_order.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("shop_product.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=text("NOW()"))
+
+    def __repr__(self):
+        return f"<StockReservation(order_id={self.order_id}, product_id={self.product_id}, quantity={self.quantity})>"
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .base import Base
+
+
+class Outbox(Base):
+    """Модель исходящего действия бота (очередь побочных эффектов)"""
+    __tablename__ = "shop_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    idempotency_key = Column(String(200), unique=True, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Таблицу создают миграции админки: значений по умолчанию в базе нет
+    available_at = Column(DateTime, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Outbox(id={self.id}, kind={self.kind}, attempts={self.attempts})>"
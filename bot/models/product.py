@@ -36,7 +36,11 @@ class Product(Base):
     description = Column(Text, nullable=True)
     price = Column(Numeric(10, 2), nullable=False)
     image = Column(String(255), nullable=True)
+    image_telegram = Column(String(100), nullable=True)
+    file_id = Column(String(255), nullable=True)
     available = Column(Boolean, default=True)
+    stock = Column(Integer, nullable=True)
+    reserved = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, server_default=text("NOW()"))
     updated_at = Column(DateTime, server_default=text("NOW()"), onupdate=text("NOW()"))
     
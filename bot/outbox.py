@@ -0,0 +1,195 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest
+
+from config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS
+)
+from constants import get_order_status_text
+from database import get_session
+from keyboards import get_order_status_keyboard
+from keyboards.payment import get_successful_payment_keyboard, get_back_to_cart_keyboard
+from services.mailing_service import deliver, DELIVERY_SENT, INACTIVE_STATUSES
+from services.outbox_service import (
+    OUTBOX_ORDER_STATUS, OUTBOX_PAYMENT_RESULT,
+    claim_outbox_batch, complete_outbox, retry_outbox
+)
+from utils.formatters import format_price
+from utils.logger import logger
+
+# Максимальная пауза перед повтором неудачного действия (сек.)
+MAX_RETRY_DELAY = 600
+
+
+async def notify_order_status(bot, payload: dict) -> None:
+    """Сообщить покупателю о новом статусе заказа"""
+    await bot.send_message(
+        chat_id=payload["user_id"],
+        text=f"📦 Статус заказа #{payload['order_id']} изменен: {get_order_status_text(payload['status'])}",
+        reply_markup=get_order_status_keyboard(payload["order_id"])
+    )
+
+
+def get_payment_result_message(payload: dict) -> tuple[str, object]:
+    """Текст и клавиатура сообщения о результате оплаты"""
+    status = payload["status"]
+
+    if status == "succeeded":
+        return (
+            f"✅ Оплата прошла успешно!\n\n"
+            f"Номер заказа: {payload['order_id']}\n"
+            f"Сумма: {format_price(payload['amount'])}\n\n"
+            f"Спасибо за покупку! Мы свяжемся с вами в ближайшее время.",
+            get_successful_payment_keyboard()
+        )
+
+    if status == "expired":
+        return (
+            "⏱ Время ожидания оплаты истекло.\n\n"
+            "Заказ был отменен. Вы можете создать новый заказ в любое время.",
+            None
+        )
+
+    return (
+        f"❌ Платеж не был завершен.\n\n"
+        f"Статус: {status}\n\n"
+        f"Вы можете повторить попытку оплаты.",
+        get_back_to_cart_keyboard()
+    )
+
+
+async def notify_payment_result(bot, payload: dict) -> None:
+    """
+    Сообщить покупателю о результате оплаты.
+    Сообщение с кнопкой оплаты редактируется, а если его уже нельзя
+    изменить, результат приходит новым сообщением.
+    """
+    text, reply_markup = get_payment_result_message(payload)
+
+    if payload.get("message_id"):
+        try:
+            await bot.edit_message_text(
+                chat_id=payload["chat_id"],
+                message_id=payload["message_id"],
+                text=text,
+                reply_markup=reply_markup
+            )
+            return
+        except TelegramBadRequest as e:
+            # Повторная доставка: сообщение уже отредактировано
+            if "message is not modified" in e.message.lower():
+                return
+            if "chat not found" in e.message.lower():
+                raise
+
+    await bot.send_message(chat_id=payload["chat_id"], text=text, reply_markup=reply_markup)
+
+
+# Обработчики действий по типам
+OUTBOX_HANDLERS = {
+    OUTBOX_ORDER_STATUS: notify_order_status,
+    OUTBOX_PAYMENT_RESULT: notify_payment_result,
+}
+
+
+def get_retry_delay(attempts: int) -> float:
+    """Экспоненциальная пауза перед следующей попыткой"""
+    return min(2 ** attempts * 5, MAX_RETRY_DELAY)
+
+
+class OutboxWorker:
+    """
+    Фоновое выполнение действий из таблицы shop_outbox.
+    Действия записываются в той же транзакции, что и изменение данных,
+    поэтому не теряются при падении процесса. Доставка «хотя бы один раз»:
+    захваченная пачка арендуется на OUTBOX_LEASE_SECONDS, неудачные
+    действия повторяются с растущей паузой до OUTBOX_MAX_ATTEMPTS попыток.
+    Просыпается по ленте изменений и раз в OUTBOX_POLL_INTERVAL секунд.
+    """
+
+    def __init__(
+        self,
+        bot,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запустить обработку очереди"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить обработку очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wakeup(self, event: dict = None) -> None:
+        """Разбудить обработчик (подписывается на ленту изменений)"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.exception(f"Ошибка обработки очереди действий: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> int:
+        """Выполнить все действия, срок которых наступил, пачками"""
+        total = 0
+        async for session in get_session():
+            while True:
+                batch = await claim_outbox_batch(session, self.batch_size, OUTBOX_LEASE_SECONDS)
+                if not batch:
+                    break
+
+                done = []
+                for message in batch:
+                    if await self._process(session, message):
+                        done.append(message.id)
+
+                await complete_outbox(session, done)
+                total += len(done)
+
+        if total:
+            logger.info(f"Выполнено действий из очереди: {total}")
+        return total
+
+    async def _process(self, session, message) -> bool:
+        """Выполнить действие; False, если оно отложено для повтора"""
+        handler = OUTBOX_HANDLERS.get(message.kind)
+        if not handler:
+            logger.error(f"Неизвестный тип действия {message.kind} (#{message.id})")
+            await complete_outbox(session, [message.id], f"Неизвестный тип: {message.kind}")
+            return False
+
+        status, error = await deliver(lambda: handler(self.bot, message.payload))
+        if status == DELIVERY_SENT:
+            return True
+
+        if status in INACTIVE_STATUSES or message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            # Повторять бессмысленно: пользователь недоступен или попытки исчерпаны
+            logger.error(f"Действие #{message.id} не выполнено: {error}")
+            await complete_outbox(session, [message.id], error)
+            return False
+
+        delay = get_retry_delay(message.attempts)
+        logger.warning(f"Действие #{message.id} будет повторено через {delay} с: {error}")
+        await retry_outbox(session, message.id, error, delay)
+        return False
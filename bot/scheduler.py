@@ -1,16 +1,311 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from pathlib import Path
+
+from aiogram.types import FSInputFile
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from services.mailing_service import process_mailings
 
+from config import (
+    CART_TTL_DAYS, CART_REMINDER_HOURS, CART_COMPACTION_BATCH, OUTBOX_RETENTION_DAYS,
+    MEDIA_ROOT, SERVICE_CHAT_ID, PRODUCT_PHOTO_UPLOAD_BATCH
+)
+from database import get_session
+from keyboards import get_cart_reminder_keyboard
+from services.cart_service import get_carts_to_remind, mark_carts_reminded, expire_cart_items
+from services.payment_service import expire_reservations
+from services.outbox_service import purge_outbox
+from services.product_service import get_products_without_file_id, save_product_file_id
+from services.mailing_service import (
+    get_unsent_mailings, get_mailing, send_mailing,
+    deliver, deactivate_users, INACTIVE_STATUSES
+)
+from middlewares import api_call_stats, api_rate_limiter
+from utils.logger import logger
+
+CART_REMINDER_TEXT = (
+    "🛒 В вашей корзине остались товары.\n\n"
+    "Вернитесь, чтобы оформить заказ, пока они не удалены."
+)
+
+
+def to_timestamp(moment: datetime) -> float:
+    """Перевести дату в timestamp (наивные даты считаются локальными, как datetime.now())"""
+    return moment.timestamp()
+
+
+class MailingScheduler:
+    """
+    Планировщик рассылок на основе кучи по времени отправки.
+    Спит ровно до ближайшего scheduled_at и просыпается
+    при изменении рассылок в админке (через ленту изменений).
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Куча (timestamp, mailing_id); устаревшие записи удаляются лениво
+        self._heap: list[tuple[float, int]] = []
+        # Актуальное время отправки для каждой запланированной рассылки
+        self._scheduled: dict[int, float] = {}
+        # Рассылки, которые отправляются прямо сейчас
+        self._running: dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Запустить цикл планировщика"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить планировщик"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def resync(self) -> None:
+        """Полностью перечитать расписание неотправленных рассылок"""
+        async for session in get_session():
+            mailings = await get_unsent_mailings(session)
+
+        self._scheduled.clear()
+        self._heap.clear()
+        for mailing_id, scheduled_at in mailings:
+            self._schedule(mailing_id, scheduled_at)
+
+        logger.info(f"Расписание рассылок загружено: {len(self._scheduled)} шт.")
+        self._wakeup.set()
+
+    async def on_mailing_changed(self, event: dict) -> None:
+        """Обработать изменение рассылки из ленты изменений"""
+        mailing_id = event["id"]
+        mailing = None
+
+        if event.get("op") != "delete":
+            async for session in get_session():
+                mailing = await get_mailing(session, mailing_id)
+
+        if mailing and not mailing.is_sent:
+            self._schedule(mailing.id, mailing.scheduled_at)
+        else:
+            self._scheduled.pop(mailing_id, None)
+
+        self._wakeup.set()
+
+    def _schedule(self, mailing_id: int, scheduled_at: datetime) -> None:
+        timestamp = to_timestamp(scheduled_at)
+        self._scheduled[mailing_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, mailing_id))
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+
+            # Отбрасываем записи, которые были перепланированы или отменены
+            while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            timestamp, mailing_id = self._heap[0]
+            delay = timestamp - time.time()
+
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                del self._scheduled[mailing_id]
+                self._launch(mailing_id)
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self, mailing_id: int) -> None:
+        """Запустить отправку, не допуская параллельных запусков одной рассылки"""
+        if mailing_id in self._running:
+            return
+
+        task = asyncio.create_task(self._send(mailing_id))
+        self._running[mailing_id] = task
+
+    async def _send(self, mailing_id: int) -> None:
+        try:
+            await send_mailing(self.bot, mailing_id)
+        except Exception as e:
+            logger.exception(f"Ошибка отправки рассылки #{mailing_id}: {e}")
+        finally:
+            self._running.pop(mailing_id, None)
+
+        try:
+            await self._resume_later(mailing_id)
+        except Exception as e:
+            logger.exception(f"Ошибка планирования рассылки #{mailing_id}: {e}")
+
+    async def _resume_later(self, mailing_id: int) -> None:
+        """
+        Незавершенную рассылку (отправка прервалась ошибкой или ее держит
+        другой процесс) запланировать на окончание аренды отправки
+        """
+        async for session in get_session():
+            mailing = await get_mailing(session, mailing_id)
+
+        if mailing and not mailing.is_sent and mailing.sending_until:
+            self._schedule(mailing.id, mailing.sending_until)
+            self._wakeup.set()
+
+
+async def remind_abandoned_carts(bot) -> None:
+    """Напомнить пользователям о брошенных корзинах (один раз после изменения)"""
+    async for session in get_session():
+        while True:
+            users = await get_carts_to_remind(session, CART_REMINDER_HOURS, CART_COMPACTION_BATCH)
+            if not users:
+                break
+
+            inactive = []
+            for user_pk, chat_id in users:
+                status, error = await deliver(
+                    lambda: bot.send_message(chat_id, CART_REMINDER_TEXT, reply_markup=get_cart_reminder_keyboard())
+                )
+                if status in INACTIVE_STATUSES:
+                    inactive.append(user_pk)
+                elif error:
+                    logger.error(f"Ошибка отправки напоминания пользователю {chat_id}: {error}")
+
+            await deactivate_users(session, inactive)
+            await mark_carts_reminded(session, [user_pk for user_pk, _ in users])
+            logger.info(f"Отправлено напоминаний о корзине: {len(users) - len(inactive)}")
+
+
+async def compact_carts(bot) -> None:
+    """Напомнить о брошенных корзинах и удалить устаревшие"""
+    try:
+        if CART_REMINDER_HOURS:
+            await remind_abandoned_carts(bot)
 
-def setup_scheduler(bot) -> AsyncIOScheduler:
+        async for session in get_session():
+            deleted = await expire_cart_items(session, CART_TTL_DAYS, CART_COMPACTION_BATCH)
+        if deleted:
+            logger.info(f"Удалено устаревших элементов корзин: {deleted}")
+    except Exception as e:
+        logger.exception(f"Ошибка очистки корзин: {e}")
+
+
+async def release_expired_reservations() -> None:
+    """Снять резервы товаров с заказов, которые так и не были оплачены"""
+    try:
+        async for session in get_session():
+            await expire_reservations(session)
+    except Exception as e:
+        logger.exception(f"Ошибка снятия истекших резервов: {e}")
+
+
+async def purge_processed_outbox() -> None:
+    """Удалить давно выполненные действия из очереди исходящих действий"""
+    try:
+        async for session in get_session():
+            deleted = await purge_outbox(session, OUTBOX_RETENTION_DAYS)
+        if deleted:
+            logger.info(f"Удалено выполненных действий из очереди: {deleted}")
+    except Exception as e:
+        logger.exception(f"Ошибка очистки очереди действий: {e}")
+
+
+async def upload_product_photos(bot) -> None:
+    """
+    Загрузить новые изображения товаров в служебный чат и сохранить их file_id,
+    чтобы inline-выдача показывала фото без загрузки файлов во время запроса
+    """
+    if not SERVICE_CHAT_ID:
+        return
+
+    try:
+        async for session in get_session():
+            uploaded = 0
+            for product in await get_products_without_file_id(session):
+                image_path = Path(MEDIA_ROOT) / product.photo
+                if not image_path.exists():
+                    continue
+
+                message = await bot.send_photo(chat_id=SERVICE_CHAT_ID, photo=FSInputFile(image_path))
+                await save_product_file_id(session, product, message.photo[-1].file_id)
+
+                uploaded += 1
+                if uploaded >= PRODUCT_PHOTO_UPLOAD_BATCH:
+                    break
+
+        if uploaded:
+            logger.info(f"Загружено изображений товаров: {uploaded}")
+    except Exception as e:
+        logger.exception(f"Ошибка загрузки изображений товаров: {e}")
+
+
+def log_api_stats() -> None:
+    """Записать в лог счетчики вызовов Bot API и состояние лимитера"""
+    if api_call_stats:
+        logger.info(f"Вызовы Bot API: {dict(api_call_stats)}; лимитер: {api_rate_limiter.snapshot()}")
+
+
+def setup_scheduler(mailing_scheduler: MailingScheduler) -> AsyncIOScheduler:
     """Настройка планировщика задач"""
     scheduler = AsyncIOScheduler()
 
+    # Страховочная пересинхронизация на случай изменений в обход админки
+    scheduler.add_job(
+        mailing_scheduler.resync,
+        'interval',
+        hours=1,
+        max_instances=1,
+        coalesce=True
+    )
+
     scheduler.add_job(
-        process_mailings,
+        compact_carts,
         'interval',
-        seconds=20,
-        args=[bot]
+        hours=1,
+        args=[mailing_scheduler.bot],
+        max_instances=1,
+        coalesce=True
     )
-    
+
+    scheduler.add_job(
+        purge_processed_outbox,
+        'interval',
+        hours=1,
+        max_instances=1,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        upload_product_photos,
+        'interval',
+        minutes=10,
+        args=[mailing_scheduler.bot],
+        max_instances=1,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        log_api_stats,
+        'interval',
+        minutes=5,
+        max_instances=1,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        release_expired_reservations,
+        'interval',
+        minutes=1,
+        max_instances=1,
+        coalesce=True
+    )
+
     return scheduler
@@ -4,11 +4,11 @@ from .product_service import (
     get_products_by_category, get_product_by_id
 )
 from .cart_service import (
-    get_cart_items, add_to_cart, update_cart_item,
+    get_cart_snapshot, add_to_cart, update_cart_item,
     remove_from_cart, clear_cart
 )
 from .order_service import (
-    create_order_from_cart, get_user_orders,
+    get_user_orders,
     get_order_by_id, get_order_items, update_order_status
 )
 from .payment_service import (
@@ -25,11 +25,11 @@ __all__ = [
     "get_products_by_category", "get_product_by_id",
     
     # Cart service
-    "get_cart_items", "add_to_cart", "update_cart_item",
+    "get_cart_snapshot", "add_to_cart", "update_cart_item",
     "remove_from_cart", "clear_cart",
     
     # Order service
-    "create_order_from_cart", "get_user_orders",
+    "get_user_orders",
     "get_order_by_id", "get_order_items", "update_order_status",
     
     # Payment service
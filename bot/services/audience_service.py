@@ -0,0 +1,145 @@
+from datetime import timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import select, update, delete, insert, exists, or_, literal, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import MAILING_CHUNK_SIZE, SEGMENT_SNAPSHOT_TTL_MINUTES
+from models import User, CartItem, Order, OrderItem, Product, Category, Segment, SegmentMember, MailingDelivery
+from utils.logger import logger
+
+
+def get_segment_conditions(segment: Segment) -> list:
+    """Условия SQL для отбора пользователей сегмента"""
+    conditions = []
+
+    if segment.has_ordered is not None:
+        has_paid_order = exists().where(
+            Order.user_id == User.user_id,
+            Order.payment_status == "succeeded"
+        )
+        conditions.append(has_paid_order if segment.has_ordered else ~has_paid_order)
+
+    if segment.active_within_days:
+        since = func.now() - timedelta(days=segment.active_within_days)
+        conditions.append(or_(
+            User.updated_at >= since,
+            exists().where(CartItem.user_id == User.id, CartItem.updated_at >= since),
+            exists().where(Order.user_id == User.user_id, Order.created_at >= since)
+        ))
+
+    if segment.category_id:
+        # Интерес к категории учитывает и ее подкатегории
+        category_ids = select(Category.id).where(
+            or_(Category.id == segment.category_id, Category.parent_id == segment.category_id)
+        )
+        product_ids = select(Product.id).where(Product.category_id.in_(category_ids))
+        conditions.append(or_(
+            exists().where(CartItem.user_id == User.id, CartItem.product_id.in_(product_ids)),
+            exists().where(
+                Order.user_id == User.user_id,
+                OrderItem.order_id == Order.id,
+                OrderItem.product_id.in_(product_ids)
+            )
+        ))
+
+    if segment.registered_from:
+        conditions.append(User.created_at >= segment.registered_from)
+    if segment.registered_to:
+        conditions.append(User.created_at <= segment.registered_to)
+
+    return conditions
+
+
+async def refresh_segment_snapshot(session: AsyncSession, segment: Segment) -> int:
+    """Пересчитать снимок состава сегмента целиком на стороне базы"""
+    # Одновременные пересчеты одного сегмента выполняются по очереди,
+    # иначе вставки двух пересчетов нарушили бы уникальность участников
+    await session.execute(
+        select(Segment.id).where(Segment.id == segment.id).with_for_update()
+    )
+    await session.execute(
+        delete(SegmentMember).where(SegmentMember.segment_id == segment.id)
+    )
+    result = await session.execute(
+        insert(SegmentMember).from_select(
+            ["segment_id", "user_id"],
+            select(literal(segment.id), User.id).where(
+                User.is_active == True,
+                *get_segment_conditions(segment)
+            )
+        )
+    )
+    size = result.rowcount
+    await session.execute(
+        update(Segment)
+        .where(Segment.id == segment.id)
+        .values(snapshot_size=size, snapshot_at=func.now())
+    )
+    await session.commit()
+
+    logger.info(f"Снимок сегмента #{segment.id} пересчитан: {size} пользователей")
+    return size
+
+
+async def get_fresh_segment(session: AsyncSession, segment_id: int) -> Segment | None:
+    """Получить сегмент, при необходимости пересчитав устаревший снимок"""
+    segment = await session.get(Segment, segment_id)
+    if not segment:
+        return None
+
+    is_fresh = await session.scalar(
+        select(Segment.id).where(
+            Segment.id == segment_id,
+            Segment.snapshot_at >= func.now() - timedelta(minutes=SEGMENT_SNAPSHOT_TTL_MINUTES)
+        )
+    )
+    if not is_fresh:
+        await refresh_segment_snapshot(session, segment)
+
+    return segment
+
+
+async def iter_audience(
+    session: AsyncSession,
+    segment_id: int | None = None,
+    chunk_size: int = MAILING_CHUNK_SIZE,
+    skip_mailing_id: int | None = None
+) -> AsyncIterator[list[tuple[int, int]]]:
+    """
+    Постранично выдать аудиторию рассылки порциями (id, telegram id).
+    Использует keyset-пагинацию по shop_user.id, поэтому память не зависит
+    от размера аудитории. Транзакция закрывается после каждой порции.
+    Неактивные пользователи (заблокировавшие бота) пропускаются, как и
+    получатели, у которых уже есть результат доставки рассылки skip_mailing_id.
+    """
+    query = select(User.id, User.user_id).where(User.is_active == True)
+
+    if skip_mailing_id is not None:
+        query = query.where(~exists().where(
+            MailingDelivery.mailing_id == skip_mailing_id,
+            MailingDelivery.user_id == User.id
+        ))
+
+    if segment_id is not None:
+        segment = await get_fresh_segment(session, segment_id)
+        if not segment:
+            logger.error(f"Сегмент #{segment_id} не найден")
+            return
+        query = query.join(SegmentMember, SegmentMember.user_id == User.id).where(
+            SegmentMember.segment_id == segment_id
+        )
+
+    last_id = 0
+    while True:
+        result = await session.execute(
+            query.where(User.id > last_id).order_by(User.id).limit(chunk_size)
+        )
+        chunk = [tuple(row) for row in result.all()]
+        await session.commit()
+
+        if not chunk:
+            return
+
+        yield chunk
+        last_id = chunk[-1][0]
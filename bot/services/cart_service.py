@@ -1,41 +1,188 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
-from sqlalchemy.sql import text
-from datetime import datetime
+from sqlalchemy import update, delete, values, column, func, or_, Integer
+from datetime import datetime, timedelta
 
+from config import CART_CACHE_SIZE
 from models import CartItem, Product, User
+from services.change_feed import publish_change
 from services.user_service import get_or_create_user
+from utils.cache import LRUCache
 
 
-async def get_cart_items(session: AsyncSession, user_id: int):
-    """Получение всех товаров в корзине пользователя"""
-    user_result = await session.execute(
-        select(User).where(User.user_id == user_id)
-    )
-    user = user_result.scalars().first()
-    
-    if not user:
-        return []
+@dataclass
+class CartLine:
+    """Позиция корзины: товар, цена за единицу и количество"""
+    id: int
+    product_id: int
+    name: str
+    price: Decimal
+    quantity: int
+
+    @property
+    def total(self) -> Decimal:
+        return self.price * self.quantity
+
+
+@dataclass
+class CartSnapshot:
+    """Снимок корзины пользователя с рассчитанными суммами"""
+    lines: list[CartLine]
+
+    @property
+    def total(self) -> Decimal:
+        return sum((line.total for line in self.lines), Decimal(0))
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.lines
+
+    def find(self, cart_item_id: int) -> CartLine | None:
+        return next((line for line in self.lines if line.id == cart_item_id), None)
+
+    def find_product(self, product_id: int) -> CartLine | None:
+        return next((line for line in self.lines if line.product_id == product_id), None)
+
+    def discard(self, cart_item_id: int) -> None:
+        self.lines = [line for line in self.lines if line.id != cart_item_id]
+
+
+# Снимки корзин по Telegram ID пользователя; обновляются при каждом изменении корзины
+_cart_cache = LRUCache(CART_CACHE_SIZE)
+
+# Наибольшее число пользователей в одном уведомлении об изменении корзин:
+# полезная нагрузка pg_notify ограничена 8000 байт
+CART_CHANGE_USERS_PER_EVENT = 400
+
+# Еще не записанные в базу количества: Telegram ID → {ID элемента корзины: количество}
+_pending_quantities: dict[int, dict[int, int]] = {}
+
+
+def invalidate_cart_cache(event: dict = None) -> None:
+    """Сбросить снимки корзин (например, после изменения цен в админке)"""
+    # Изменение остатков не затрагивает цены и названия в корзинах
+    if event and event.get("op") == "stock":
+        return
+    # Бот сообщает об изменении корзин конкретных пользователей
+    if event and event.get("user_id") is not None:
+        _cart_cache.pop(event["user_id"])
+        return
+    if event and event.get("user_ids") is not None:
+        for user_id in event["user_ids"]:
+            _cart_cache.pop(user_id)
+        return
+    _cart_cache.clear()
+
+
+async def publish_cart_change(session: AsyncSession, user_id: int) -> None:
+    """
+    Сообщить всем процессам бота об изменении корзины пользователя (без коммита).
+    Корзину кеширует процесс, обрабатывающий обновления пользователя,
+    а менять ее могут и фоновые задачи другого процесса.
+    """
+    await publish_change(session, "shop_cartitem", "delete", user_id=user_id)
+
+
+async def publish_carts_change(session: AsyncSession, user_ids: list[int]) -> None:
+    """Сообщить всем процессам бота об изменении корзин нескольких пользователей (без коммита)"""
+    for start in range(0, len(user_ids), CART_CHANGE_USERS_PER_EVENT):
+        await publish_change(
+            session, "shop_cartitem", "delete",
+            user_ids=user_ids[start:start + CART_CHANGE_USERS_PER_EVENT]
+        )
+
+
+def owned_by(user_id: int):
+    """Условие принадлежности элемента корзины пользователю с данным Telegram ID"""
+    return CartItem.user_id == select(User.id).where(User.user_id == user_id).scalar_subquery()
+
+
+async def get_cart_snapshot(session: AsyncSession, user_id: int) -> CartSnapshot:
+    """Получение снимка корзины пользователя (из кеша или одним запросом)"""
+    snapshot = _cart_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
 
     result = await session.execute(
-        select(CartItem, Product)
+        select(CartItem.id, CartItem.product_id, Product.name, Product.price, CartItem.quantity)
         .join(Product, CartItem.product_id == Product.id)
-        .where(CartItem.user_id == user.id)
+        .join(User, CartItem.user_id == User.id)
+        .where(User.user_id == user_id)
+        .order_by(CartItem.id)
     )
-    return result.all()
+    snapshot = CartSnapshot([CartLine(*row) for row in result.all()])
 
+    # Отложенные изменения новее данных в базе
+    pending = _pending_quantities.get(user_id, {})
+    for line in snapshot.lines:
+        line.quantity = pending.get(line.id, line.quantity)
+
+    _cart_cache.set(user_id, snapshot)
+    return snapshot
+
+
+async def get_cart_line(session: AsyncSession, user_id: int, cart_item_id: int) -> CartLine | None:
+    """Получение позиции корзины пользователя по ID элемента корзины"""
+    snapshot = await get_cart_snapshot(session, user_id)
+    return snapshot.find(cart_item_id)
+
+
+def stage_cart_item_quantity(user_id: int, line: CartLine, quantity: int) -> None:
+    """
+    Сразу применить новое количество к снимку корзины, отложив запись в базу.
+    Накопленные изменения записываются одним запросом в flush_cart_updates.
+    """
+    line.quantity = quantity
+    _pending_quantities.setdefault(user_id, {})[line.id] = quantity
+
+
+async def flush_cart_updates(session: AsyncSession, user_id: int) -> None:
+    """Записать отложенные изменения количества одним UPDATE"""
+    pending = dict(_pending_quantities.get(user_id, {}))
+    if not pending:
+        return
+
+    rows = values(
+        column("id", Integer), column("quantity", Integer), name="pending"
+    ).data(list(pending.items()))
+
+    await session.execute(
+        update(CartItem)
+        .where(CartItem.id == rows.c.id, owned_by(user_id))
+        .values(quantity=rows.c.quantity, updated_at=datetime.now())
+    )
+    await session.commit()
+
+    # Убираем только записанное: за время запроса могли прийти новые нажатия
+    staged = _pending_quantities.get(user_id, {})
+    for cart_item_id, quantity in pending.items():
+        if staged.get(cart_item_id) == quantity:
+            del staged[cart_item_id]
+    if not staged:
+        _pending_quantities.pop(user_id, None)
+
+
+def has_pending_quantity(user_id: int, cart_item_id: int) -> bool:
+    """Есть ли у позиции еще не записанное в базу количество"""
+    return cart_item_id in _pending_quantities.get(user_id, {})
 
-async def get_cart_item(session: AsyncSession, user_id: int, product_id: int):
-    """Получение элемента корзины по ID пользователя и ID товара"""
-    # Получаем или создаем пользователя
-    user = await get_or_create_user(session, user_id)
-    if not user:
-        return None
 
+def drop_pending_quantity(user_id: int, cart_item_id: int | None = None) -> None:
+    """Отбросить отложенные изменения для позиции или всей корзины"""
+    if cart_item_id is None:
+        _pending_quantities.pop(user_id, None)
+    else:
+        _pending_quantities.get(user_id, {}).pop(cart_item_id, None)
+
+
+async def get_cart_item(session: AsyncSession, user_pk: int, product_id: int):
+    """Получение элемента корзины по ID пользователя в базе и ID товара"""
     result = await session.execute(
         select(CartItem)
-        .where(CartItem.user_id == user.id, CartItem.product_id == product_id)
+        .where(CartItem.user_id == user_pk, CartItem.product_id == product_id)
     )
     return result.scalars().first()
 
@@ -47,9 +194,11 @@ async def add_to_cart(session: AsyncSession, user_id: int, product_id: int, quan
     if not user:
         return None
 
+    await flush_cart_updates(session, user_id)
+
     # Проверяем, есть ли уже такой товар в корзине
-    cart_item = await get_cart_item(session, user_id, product_id)
-    
+    cart_item = await get_cart_item(session, user.id, product_id)
+
     if cart_item:
         # Если товар уже есть, добавляем к текущему количеству
         cart_item.quantity += quantity
@@ -64,50 +213,152 @@ async def add_to_cart(session: AsyncSession, user_id: int, product_id: int, quan
             updated_at=datetime.now()
         )
         session.add(cart_item)
-    
+
     await session.commit()
+
+    # Обновляем снимок корзины; новую позицию проще перечитать при следующем показе
+    snapshot = _cart_cache.get(user_id)
+    line = snapshot.find_product(product_id) if snapshot else None
+    if line:
+        line.quantity = cart_item.quantity
+    else:
+        _cart_cache.pop(user_id)
+
     return cart_item
 
 
-async def update_cart_item(session: AsyncSession, cart_item_id: int, quantity: int):
+async def update_cart_item(session: AsyncSession, user_id: int, cart_item_id: int, quantity: int):
     """Обновление количества товара в корзине по ID элемента корзины"""
+    if quantity <= 0:
+        # Если количество <= 0, удаляем товар из корзины
+        return await remove_from_cart(session, user_id, cart_item_id)
+
+    drop_pending_quantity(user_id, cart_item_id)
     result = await session.execute(
-        select(CartItem).where(CartItem.id == cart_item_id)
+        update(CartItem)
+        .where(CartItem.id == cart_item_id, owned_by(user_id))
+        .values(quantity=quantity, updated_at=datetime.now())
+        .returning(CartItem.id)
     )
-    cart_item = result.scalars().first()
-
-    if cart_item:
-        if quantity <= 0:
-            # Если количество <= 0, удаляем товар из корзины
-            await session.execute(
-                delete(CartItem).where(CartItem.id == cart_item_id)
-            )
-        else:
-            # Иначе обновляем количество
-            cart_item.quantity = quantity
-            cart_item.updated_at = datetime.now()
+    updated = result.scalar() is not None
+    await session.commit()
 
-        await session.commit()
-        return True
+    snapshot = _cart_cache.get(user_id)
+    line = snapshot.find(cart_item_id) if snapshot else None
+    if line:
+        line.quantity = quantity
 
-    return False
+    return updated
 
 
-async def remove_from_cart(session: AsyncSession, cart_item_id: int):
+async def remove_from_cart(session: AsyncSession, user_id: int, cart_item_id: int):
     """Удаление товара из корзины по ID элемента корзины"""
+    drop_pending_quantity(user_id, cart_item_id)
     await session.execute(
         delete(CartItem)
-        .where(CartItem.id == cart_item_id)
+        .where(CartItem.id == cart_item_id, owned_by(user_id))
     )
     await session.commit()
+
+    snapshot = _cart_cache.get(user_id)
+    if snapshot:
+        snapshot.discard(cart_item_id)
+
     return True
 
 
-async def clear_cart(session: AsyncSession, user_id: int):
-    """Очистка корзины пользователя"""
+async def delete_cart_items(session: AsyncSession, user_id: int) -> None:
+    """Удалить элементы корзины пользователя в текущей транзакции (без коммита)"""
     await session.execute(
         delete(CartItem)
-        .where(CartItem.user_id == user_id)
+        .where(owned_by(user_id))
     )
+    await publish_cart_change(session, user_id)
+
+
+def forget_cart(user_id: int) -> None:
+    """Отметить корзину пустой после ее удаления из базы"""
+    drop_pending_quantity(user_id)
+    _cart_cache.set(user_id, CartSnapshot([]))
+
+
+async def clear_cart(session: AsyncSession, user_id: int):
+    """Очистка корзины пользователя по Telegram ID"""
+    drop_pending_quantity(user_id)
+    await delete_cart_items(session, user_id)
     await session.commit()
+
+    forget_cart(user_id)
     return True
+
+
+async def get_carts_to_remind(session: AsyncSession, idle_hours: int, limit: int) -> list[tuple[int, int]]:
+    """
+    Пользователи (id, telegram id), чья корзина не менялась idle_hours часов
+    и о которой еще не напоминали после последнего изменения
+    """
+    last_update = func.max(CartItem.updated_at)
+    last_reminder = func.max(CartItem.reminded_at)
+
+    result = await session.execute(
+        select(User.id, User.user_id)
+        .join(CartItem, CartItem.user_id == User.id)
+        .where(User.is_active == True)
+        .group_by(User.id, User.user_id)
+        .having(
+            last_update < func.now() - timedelta(hours=idle_hours),
+            or_(last_reminder.is_(None), last_reminder < last_update)
+        )
+        .limit(limit)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def mark_carts_reminded(session: AsyncSession, user_pks: list[int]) -> None:
+    """Отметить отправку напоминания, не сдвигая дату изменения корзины"""
+    await session.execute(
+        update(CartItem)
+        .where(CartItem.user_id.in_(user_pks))
+        .values(reminded_at=func.now(), updated_at=CartItem.updated_at)
+    )
+    await session.commit()
+
+
+async def expire_cart_items(session: AsyncSession, ttl_days: int, batch_size: int) -> int:
+    """
+    Удалить элементы корзин, не менявшиеся ttl_days дней.
+    Удаление идет пачками по batch_size строк с коммитом после каждой,
+    чтобы не держать долгих блокировок на таблице корзин.
+    """
+    expired_ids = (
+        select(CartItem.id)
+        .where(CartItem.updated_at < func.now() - timedelta(days=ttl_days))
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+
+    total = 0
+    while True:
+        deleted = (
+            delete(CartItem)
+            .where(CartItem.id.in_(expired_ids))
+            .returning(CartItem.user_id)
+            .cte("deleted")
+        )
+        # Telegram ID владельцев удаленных элементов, по одному на элемент
+        result = await session.execute(
+            select(User.user_id).join(deleted, User.id == deleted.c.user_id)
+        )
+        user_ids = result.scalars().all()
+        # Одно уведомление на пачку, а не на каждого пользователя
+        owners = sorted(set(user_ids))
+        await publish_carts_change(session, owners)
+        await session.commit()
+
+        invalidate_cart_cache({"op": "delete", "user_ids": owners})
+        total += len(user_ids)
+
+        if len(user_ids) < batch_size:
+            break
+
+    return total
@@ -0,0 +1,135 @@
+"""
+Лента изменений из админки на основе Postgres LISTEN/NOTIFY.
+
+Админка публикует в канал CHANGE_FEED_CHANNEL JSON вида
+{"table": "shop_product", "op": "save" | "delete", "id": 42},
+а бот раскладывает эти события по подписчикам (сброс кешей, планировщики).
+Сам бот публикует туда же изменения остатков ("op": "stock"), чтобы
+все его процессы видели резервы, сделанные соседями.
+"""
+
+import asyncio
+import inspect
+import json
+from collections import defaultdict
+from typing import Any, Callable
+
+import asyncpg
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import DATABASE_DSN, CHANGE_FEED_CHANNEL
+from utils.logger import logger
+
+# Подписка на все таблицы сразу
+ALL_TABLES = "*"
+
+
+class ChangeFeed:
+    """Слушатель канала изменений с автоматическим переподключением"""
+
+    def __init__(self, dsn: str, channel: str, reconnect_delay: float = 5):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._handlers: dict[str, list[Callable]] = defaultdict(list)
+        self._reconnect_handlers: list[Callable] = []
+        self._pending: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def subscribe(self, table: str, handler: Callable[[dict], Any]) -> None:
+        """Подписать обработчик на изменения таблицы (или ALL_TABLES)"""
+        self._handlers[table].append(handler)
+
+    def on_reconnect(self, handler: Callable[[], Any]) -> None:
+        """
+        Подписать обработчик на (пере)подключение к каналу.
+        Пока соединения не было, уведомления терялись, поэтому
+        подписчики должны сбросить кеши или пересинхронизироваться.
+        """
+        self._reconnect_handlers.append(handler)
+
+    def start(self) -> None:
+        """Запустить прослушивание канала в фоне"""
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить прослушивание канала"""
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                logger.info(f"✅ Подписка на канал изменений {self.channel} установлена")
+
+                for handler in self._reconnect_handlers:
+                    self._spawn(handler)
+
+                await lost.wait()
+                logger.warning(f"Соединение с каналом изменений {self.channel} потеряно")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Любая ошибка ведет к переподключению: без слушателя кеши перестанут сбрасываться
+                logger.exception(f"Ошибка канала изменений {self.channel}: {e}")
+            finally:
+                if connection and not connection.is_closed():
+                    try:
+                        await connection.close()
+                    except Exception:
+                        connection.terminate()
+
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.error(f"Некорректное уведомление в канале {channel}: {payload}")
+            return
+
+        logger.debug(f"Изменение из админки: {event}")
+        handlers = self._handlers.get(event.get("table"), []) + self._handlers.get(ALL_TABLES, [])
+        for handler in handlers:
+            self._spawn(handler, event)
+
+    def _spawn(self, handler: Callable, *args) -> None:
+        task = asyncio.create_task(self._call(handler, *args))
+        # Храним ссылку, чтобы задачу не собрал сборщик мусора
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @staticmethod
+    async def _call(handler: Callable, *args) -> None:
+        try:
+            result = handler(*args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.exception(f"Ошибка в обработчике изменений {handler.__name__}: {e}")
+
+
+async def publish_change(session: AsyncSession, table: str, op: str, **data: Any) -> None:
+    """
+    Опубликовать изменение в канал в текущей транзакции сессии.
+    Уведомление уйдет только после коммита и не уйдет при откате.
+    """
+    payload = json.dumps({"table": table, "op": op, **data})
+    await session.execute(select(func.pg_notify(CHANGE_FEED_CHANNEL, payload)))
+
+
+change_feed = ChangeFeed(DATABASE_DSN, CHANGE_FEED_CHANNEL)
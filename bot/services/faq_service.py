@@ -3,11 +3,23 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from models import FAQ
 from utils.logger import logger
 
+# Кеш списка FAQ; сбрасывается по ленте изменений из админки
+_faqs_cache: list[FAQ] | None = None
+
+
+def invalidate_faq_cache(event: dict = None) -> None:
+    """Сбросить кеш списка FAQ"""
+    global _faqs_cache
+    _faqs_cache = None
+
 
 async def get_all_faqs(session: AsyncSession):
     """Получить все FAQ из базы данных"""
-    result = await session.execute(select(FAQ))
-    return result.scalars().all()
+    global _faqs_cache
+    if _faqs_cache is None:
+        result = await session.execute(select(FAQ))
+        _faqs_cache = list(result.scalars().all())
+    return _faqs_cache
 
 
 async def get_faq_by_id(session: AsyncSession, faq_id: int):
@@ -36,6 +48,7 @@ async def create_faq(session: AsyncSession, question: str, answer: str, keywords
     faq = FAQ(question=question, answer=answer, keywords=keywords)
     session.add(faq)
     await session.commit()
+    invalidate_faq_cache()
     logger.info(f"Создан новый FAQ: {question}")
     return faq
 
@@ -54,6 +67,7 @@ async def update_faq(session: AsyncSession, faq_id: int, question: str = None, a
         faq.keywords = keywords
     
     await session.commit()
+    invalidate_faq_cache()
     logger.info(f"Обновлен FAQ с ID {faq_id}")
     return faq
 
@@ -66,5 +80,6 @@ async def delete_faq(session: AsyncSession, faq_id: int):
     
     await session.delete(faq)
     await session.commit()
+    invalidate_faq_cache()
     logger.info(f"Удален FAQ с ID {faq_id}")
     return True
@@ -1,52 +1,231 @@
-from datetime import datetime
-from sqlalchemy import select
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import FSInputFile, InputMediaPhoto
+from sqlalchemy import select, update, or_, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import Mailing
-from services.user_service import get_all_users
+from config import MEDIA_ROOT, SERVICE_CHAT_ID, MAILING_LEASE_SECONDS
+from models import Mailing, MailingMedia, MailingDelivery, User
+from services.audience_service import iter_audience
+from utils.logger import logger
+from utils.messages import CAPTION_LIMIT
+
+# Статусы доставки сообщения получателю
+DELIVERY_SENT = "sent"
+DELIVERY_BLOCKED = "blocked"
+DELIVERY_NOT_FOUND = "not_found"
+DELIVERY_RETRY_AFTER = "retry_after"
+DELIVERY_FAILED = "failed"
+
+# После этих статусов писать пользователю бесполезно, он помечается неактивным
+INACTIVE_STATUSES = {DELIVERY_BLOCKED, DELIVERY_NOT_FOUND}
 
 
-async def get_pending_mailings(session: AsyncSession) -> list[Mailing]:
-    """Получить все неотправленные рассылки, время которых уже наступило"""
-    query = select(Mailing).where(
-        Mailing.is_sent == False,
-        Mailing.scheduled_at <= datetime.now()
+async def get_unsent_mailings(session: AsyncSession) -> list[tuple[int, object]]:
+    """Получить (id, scheduled_at) всех неотправленных рассылок"""
+    result = await session.execute(
+        select(Mailing.id, Mailing.scheduled_at).where(Mailing.is_sent == False)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def get_mailing(session: AsyncSession, mailing_id: int) -> Mailing | None:
+    """Получить рассылку по ID"""
+    return await session.get(Mailing, mailing_id)
+
+
+async def get_mailing_media(session: AsyncSession, mailing_id: int) -> list[MailingMedia]:
+    """Получить изображения рассылки в порядке отображения"""
+    result = await session.execute(
+        select(MailingMedia)
+        .where(MailingMedia.mailing_id == mailing_id)
+        .order_by(MailingMedia.position, MailingMedia.id)
     )
-    result = await session.execute(query)
     return list(result.scalars().all())
 
 
-async def mark_mailing_as_sent(session: AsyncSession, mailing_id: int) -> None:
-    """Отметить рассылку как отправленную"""
-    mailing = await session.get(Mailing, mailing_id)
-    if mailing:
-        mailing.is_sent = True
-        await session.commit()
+def lease_expiry():
+    """Окончание аренды отправки, отсчитанное от текущего времени базы"""
+    return func.now() + timedelta(seconds=MAILING_LEASE_SECONDS)
+
+
+async def claim_mailing(session: AsyncSession, mailing_id: int) -> bool:
+    """
+    Атомарно захватить рассылку для отправки.
+    Захват — аренда на MAILING_LEASE_SECONDS, поэтому даже при нескольких
+    процессах бота рассылку отправляет только один, а рассылку, которую
+    не закончил упавший процесс, можно захватить снова после истечения аренды.
+    """
+    result = await session.execute(
+        update(Mailing)
+        .where(
+            Mailing.id == mailing_id,
+            Mailing.is_sent == False,
+            or_(Mailing.sending_until.is_(None), Mailing.sending_until < func.now())
+        )
+        .values(sending_until=lease_expiry())
+        .returning(Mailing.id)
+    )
+    claimed = result.scalar() is not None
+    await session.commit()
+    return claimed
+
+
+async def renew_mailing_lease(session: AsyncSession, mailing_id: int) -> None:
+    """Продлить аренду отправки (без коммита)"""
+    await session.execute(
+        update(Mailing).where(Mailing.id == mailing_id).values(sending_until=lease_expiry())
+    )
+
+
+async def finish_mailing(session: AsyncSession, mailing_id: int) -> None:
+    """Отметить рассылку отправленной после последней порции"""
+    await session.execute(
+        update(Mailing).where(Mailing.id == mailing_id).values(is_sent=True, sending_until=None)
+    )
+    await session.commit()
+
+
+def get_photo(media: MailingMedia):
+    """Уже загруженный file_id или файл с диска для первой загрузки"""
+    return media.file_id or FSInputFile(Path(MEDIA_ROOT) / media.image)
+
+
+async def send_mailing_content(bot, chat_id: int | str, text: str | None, media: list[MailingMedia]) -> None:
+    """
+    Отправить содержимое рассылки в чат.
+    Изображения без file_id загружаются с диска, а полученный file_id
+    сохраняется в объекте, чтобы следующие отправки его переиспользовали.
+    """
+    if not media:
+        await bot.send_message(chat_id=chat_id, text=text)
+        return
+
+    caption = text if text and len(text) <= CAPTION_LIMIT else None
 
+    if len(media) == 1:
+        messages = [await bot.send_photo(chat_id=chat_id, photo=get_photo(media[0]), caption=caption)]
+    else:
+        messages = await bot.send_media_group(
+            chat_id=chat_id,
+            media=[
+                InputMediaPhoto(media=get_photo(item), caption=caption if i == 0 else None)
+                for i, item in enumerate(media)
+            ]
+        )
 
-async def process_mailings(bot) -> None:
-    """Обработать все ожидающие рассылки"""
+    for item, message in zip(media, messages):
+        if not item.file_id and message.photo:
+            item.file_id = message.photo[-1].file_id
+
+    # Длинный текст не помещается в подпись и уходит отдельным сообщением
+    if text and caption is None:
+        await bot.send_message(chat_id=chat_id, text=text)
+
+
+async def deliver(send: Callable[[], Awaitable]) -> tuple[str, str | None]:
+    """
+    Выполнить отправку одному получателю и вернуть (статус, ошибка).
+    Ответ 429 уже обработан лимитером сессии бота (пауза и один повтор
+    того запроса, который его получил), поэтому отправка здесь не повторяется:
+    повтор send() заново отправил бы уже доставленные части (например, альбом).
+    """
+    try:
+        await send()
+        return DELIVERY_SENT, None
+    except TelegramRetryAfter as e:
+        return DELIVERY_RETRY_AFTER, e.message
+    except TelegramForbiddenError as e:
+        return DELIVERY_BLOCKED, e.message
+    except TelegramBadRequest as e:
+        if "chat not found" in e.message.lower():
+            return DELIVERY_NOT_FOUND, e.message
+        return DELIVERY_FAILED, e.message
+    except Exception as e:
+        return DELIVERY_FAILED, str(e)
+
+
+async def save_deliveries(session: AsyncSession, mailing_id: int, results: list[tuple[int, str, str | None]]) -> None:
+    """
+    Сохранить результаты доставки порции и отключить недоступных пользователей.
+    Аренда отправки продлевается в той же транзакции.
+    """
+    now = datetime.now()
+    await session.execute(
+        insert(MailingDelivery)
+        .values([
+            {"mailing_id": mailing_id, "user_id": user_pk, "status": status, "error": error, "created_at": now}
+            for user_pk, status, error in results
+        ])
+        .on_conflict_do_nothing()
+    )
+
+    await deactivate_users(session, [user_pk for user_pk, status, _ in results if status in INACTIVE_STATUSES])
+    await renew_mailing_lease(session, mailing_id)
+    await session.commit()
+
+
+async def deactivate_users(session: AsyncSession, user_pks: list[int]) -> None:
+    """Пометить неактивными пользователей, которым больше нельзя писать"""
+    if not user_pks:
+        return
+
+    await session.execute(
+        update(User).where(User.id.in_(user_pks)).values(is_active=False)
+    )
+    logger.info(f"Помечено неактивными пользователей: {len(user_pks)}")
+
+
+async def upload_mailing_media(bot, session: AsyncSession, media: list[MailingMedia]) -> None:
+    """Один раз загрузить новые изображения в служебный чат и сохранить их file_id"""
+    if all(item.file_id for item in media):
+        return
+
+    if not SERVICE_CHAT_ID:
+        # Без служебного чата загрузкой станет отправка первому получателю
+        logger.warning("SERVICE_CHAT_ID не задан, изображения загрузятся при первой отправке")
+        return
+
+    await send_mailing_content(bot, SERVICE_CHAT_ID, None, media)
+    await session.commit()
+
+
+async def send_mailing(bot, mailing_id: int) -> None:
+    """
+    Разослать рассылку аудитории ее сегмента (или всем пользователям).
+    Получатели, для которых уже есть результат доставки, пропускаются,
+    поэтому прерванная рассылка продолжается с того же места.
+    """
     from database import get_session
-    
+
     async for session in get_session():
-        # Получаем все неотправленные рассылки
-        mailings = await get_pending_mailings(session)
-        
-        if not mailings:
+        if not await claim_mailing(session, mailing_id):
+            logger.info(f"Рассылка #{mailing_id} уже отправлена или отправляется")
             return
 
-        users = await get_all_users(session)
-        
-        # Отправляем каждую рассылку
-        for mailing in mailings:
-            for user in users:
-                try:
-                    await bot.send_message(
-                        chat_id=user.user_id,
-                        text=mailing.text
-                    )
-                except Exception as e:
-                    print(f"Ошибка отправки сообщения пользователю {user.user_id}: {e}")
-            
-            # Отмечаем рассылку как отправленную
-            await mark_mailing_as_sent(session, mailing.id)
+        mailing = await get_mailing(session, mailing_id)
+        media = await get_mailing_media(session, mailing_id)
+        await upload_mailing_media(bot, session, media)
+
+        logger.info(f"Начата отправка рассылки #{mailing_id}")
+        totals = Counter()
+        async for chunk in iter_audience(session, mailing.segment_id, skip_mailing_id=mailing_id):
+            results = []
+            for user_pk, chat_id in chunk:
+                status, error = await deliver(
+                    lambda: send_mailing_content(bot, chat_id, mailing.text, media)
+                )
+                if error:
+                    logger.error(f"Ошибка отправки сообщения пользователю {chat_id}: {error}")
+                results.append((user_pk, status, error))
+
+            await save_deliveries(session, mailing_id, results)
+            totals.update(status for _, status, _ in results)
+
+        await finish_mailing(session, mailing_id)
+        logger.info(f"Рассылка #{mailing_id} отправлена: {dict(totals)}")
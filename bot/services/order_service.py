@@ -1,70 +1,87 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update
-from datetime import datetime
+from sqlalchemy.orm import joinedload
+from sqlalchemy import update, insert, delete, values, column, func, or_, case, Integer
+from datetime import datetime, timedelta
+
+from config import RESERVATION_TTL_MINUTES, ORDERS_PER_PAGE, ORDERS_CACHE_SIZE
+from models import Order, OrderItem, Product, StockReservation
+from services.cart_service import CartSnapshot
+from services.change_feed import publish_change
+from utils.cache import LRUCache
+
+
+@dataclass
+class OrderSummary:
+    """Строка истории заказов"""
+    id: int
+    status: str
+    total_price: Decimal
+    created_at: datetime
+
+
+# Первая страница истории заказов по Telegram ID пользователя
+_recent_orders = LRUCache(ORDERS_CACHE_SIZE)
+
+
+def invalidate_user_orders(user_id: int) -> None:
+    """Сбросить кеш истории заказов пользователя"""
+    _recent_orders.pop(user_id)
+
+
+def clear_orders_cache() -> None:
+    """Сбросить кеш истории заказов всех пользователей"""
+    _recent_orders.clear()
+
 
-from models import Order, OrderItem, Product
-from services.cart_service import get_cart_items, clear_cart
-from services.user_service import get_user
+def on_order_changed(event: dict) -> None:
+    """Обработать изменение заказа из ленты изменений"""
+    if event.get("user_id") is not None:
+        invalidate_user_orders(event["user_id"])
 
 
-async def create_order_from_cart(session: AsyncSession, user_id: int, clear_cart_flag: bool = True):
-    """Создание заказа из корзины пользователя
+class InsufficientStockError(Exception):
+    """Товаров на складе меньше, чем в корзине"""
+
+    def __init__(self, products: list[str]):
+        self.products = products
+        super().__init__(", ".join(products))
+
+
+async def get_user_orders(session: AsyncSession, user_id: int, before_id: int = None, limit: int = ORDERS_PER_PAGE):
+    """
+    Получение страницы заказов пользователя, от новых к старым
     
-    Args:
-        session: Сессия базы данных
-        user_id: ID пользователя
-        clear_cart_flag: Флаг очистки корзины после создания заказа
+    Используется keyset-пагинация по ID заказа: следующая страница
+    начинается с заказов старше before_id. Первая страница кешируется.
     
     Returns:
-        Order: Созданный заказ или None, если корзина пуста
+        tuple[list[OrderSummary], bool]: Заказы страницы и признак наличия более старых
     """
-    # Получаем товары из корзины
-    cart_items = await get_cart_items(session, user_id)
-    
-    if not cart_items:
-        return None
-    
-    # Получаем информацию о пользователе
-    user = await get_user(session, user_id)
-    
-    # Создаем новый заказ
-    order = Order(
-        user_id=user_id,
-        full_name=user.full_name if user else None,
-        phone=user.phone if user else None,
-        address=user.address if user else None,
-        created_at=datetime.now(),
-        updated_at=datetime.now()
+    if before_id is None:
+        cached = _recent_orders.get(user_id)
+        if cached is not None:
+            return cached
+
+    query = (
+        select(Order.id, Order.status, Order.total_price, Order.created_at)
+        .where(Order.user_id == user_id)
+        .order_by(Order.id.desc())
+        .limit(limit + 1)
     )
-    session.add(order)
-    await session.flush()  # Получаем ID заказа
-    
-    # Добавляем товары из корзины в заказ
-    for cart_item, product in cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=product.id,
-            quantity=cart_item.quantity,
-            price=product.price
-        )
-        session.add(order_item)
-    
-    # Очищаем корзину только если указан флаг
-    if clear_cart_flag:
-        await clear_cart(session, user_id)
-    
-    await session.commit()
-    await session.refresh(order)
-    return order
+    if before_id is not None:
+        query = query.where(Order.id < before_id)
 
+    result = await session.execute(query)
+    orders = [OrderSummary(*row) for row in result.all()]
+    page = (orders[:limit], len(orders) > limit)
 
-async def get_user_orders(session: AsyncSession, user_id: int):
-    """Получение всех заказов пользователя"""
-    result = await session.execute(
-        select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc())
-    )
-    return result.scalars().all()
+    if before_id is None:
+        _recent_orders.set(user_id, page)
+    return page
 
 
 async def get_order_by_id(session: AsyncSession, order_id: int):
@@ -73,6 +90,16 @@ async def get_order_by_id(session: AsyncSession, order_id: int):
     return result.scalars().first()
 
 
+async def get_user_order_with_items(session: AsyncSession, user_id: int, order_id: int) -> Order | None:
+    """Получение заказа пользователя вместе с позициями и товарами одним запросом"""
+    result = await session.execute(
+        select(Order)
+        .options(joinedload(Order.items).joinedload(OrderItem.product))
+        .where(Order.id == order_id, Order.user_id == user_id)
+    )
+    return result.unique().scalars().first()
+
+
 async def get_order_items(session: AsyncSession, order_id: int):
     """Получение всех товаров в заказе"""
     result = await session.execute(
@@ -85,9 +112,176 @@ async def get_order_items(session: AsyncSession, order_id: int):
 
 async def update_order_status(session: AsyncSession, order_id: int, status: str):
     """Обновление статуса заказа"""
-    await session.execute(
+    user_id = await session.scalar(
         update(Order)
         .where(Order.id == order_id)
         .values(status=status)
+        .returning(Order.user_id)
+    )
+    if user_id is not None:
+        await publish_order_change(session, order_id, user_id)
+    await session.commit()
+
+    if user_id is not None:
+        invalidate_user_orders(user_id)
+
+
+async def publish_order_change(session: AsyncSession, order_id: int, user_id: int, op: str = "save") -> None:
+    """
+    Сообщить всем процессам бота об изменении заказа (без коммита).
+    Историю заказов кеширует процесс, обрабатывающий обновления пользователя,
+    а заказы меняют и фоновые задачи другого процесса.
+    """
+    await publish_change(session, "shop_order", op, id=order_id, user_id=user_id)
+
+
+async def publish_stock(session: AsyncSession, rows) -> None:
+    """Сообщить всем процессам бота новые остатки товаров (id, stock, reserved)"""
+    stock = {str(product_id): [product_stock, reserved] for product_id, product_stock, reserved in rows}
+    if stock:
+        await publish_change(session, "shop_product", "stock", stock=stock)
+
+
+async def reserve_order(session: AsyncSession, user_id: int, cart: CartSnapshot, delivery_info: dict) -> int:
+    """
+    Создать заказ из снимка корзины и зарезервировать товары в одной транзакции.
+    Количество запросов не зависит от размера корзины: заказ, его позиции,
+    счетчики резерва и записи резерва с TTL вставляются по одному запросу.
+    Резерв увеличивается атомарно и только при достаточном свободном остатке;
+    если хотя бы одного товара не хватает, транзакция откатывается.
+
+    Returns:
+        int: ID созданного заказа
+    """
+    order_id = await session.scalar(
+        insert(Order)
+        .values(
+            user_id=user_id,
+            status="pending",
+            username=delivery_info['username'],
+            full_name=delivery_info['full_name'],
+            phone=delivery_info['phone'],
+            address=delivery_info['address'],
+            payment_status="pending",
+            total_price=cart.total,
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        )
+        .returning(Order.id)
     )
+
+    await session.execute(
+        insert(OrderItem).values([
+            {"order_id": order_id, "product_id": line.product_id, "quantity": line.quantity, "price": line.price}
+            for line in cart.lines
+        ])
+    )
+
+    lines = values(
+        column("product_id", Integer), column("quantity", Integer), name="lines"
+    ).data([(line.product_id, line.quantity) for line in cart.lines])
+
+    result = await session.execute(
+        update(Product)
+        .where(
+            Product.id == lines.c.product_id,
+            Product.available == True,
+            or_(Product.stock.is_(None), Product.stock - Product.reserved >= lines.c.quantity)
+        )
+        .values(reserved=Product.reserved + lines.c.quantity, updated_at=Product.updated_at)
+        .returning(Product.id, Product.stock, Product.reserved)
+    )
+    rows = result.all()
+    reserved_ids = {row[0] for row in rows}
+
+    missing = [line.name for line in cart.lines if line.product_id not in reserved_ids]
+    if missing:
+        await session.rollback()
+        raise InsufficientStockError(missing)
+
+    expires_at = datetime.now() + timedelta(minutes=RESERVATION_TTL_MINUTES)
+    await session.execute(
+        insert(StockReservation).values([
+            {"order_id": order_id, "product_id": line.product_id, "quantity": line.quantity,
+             "expires_at": expires_at, "created_at": datetime.now()}
+            for line in cart.lines
+        ])
+    )
+    await publish_stock(session, rows)
+    await publish_order_change(session, order_id, user_id)
+
     await session.commit()
+    invalidate_user_orders(user_id)
+    return order_id
+
+
+async def settle_reservations(session: AsyncSession, order_id: int, sold: bool):
+    """
+    Закрыть резервы заказа одним запросом (без коммита).
+    Записи резерва удаляются, а счетчики товаров уменьшаются на их количество;
+    при продаже (sold=True) товары также списываются со склада.
+    Повторный вызов ничего не меняет: записей резерва уже нет.
+    """
+    settled = (
+        delete(StockReservation)
+        .where(StockReservation.order_id == order_id)
+        .returning(StockReservation.product_id, StockReservation.quantity)
+        .cte("settled")
+    )
+
+    changes = {
+        "reserved": func.greatest(Product.reserved - settled.c.quantity, 0),
+        "updated_at": Product.updated_at,
+    }
+    if sold:
+        # Для товаров без учета остатка stock остается NULL
+        changes["stock"] = case(
+            (Product.stock.is_(None), None),
+            else_=func.greatest(Product.stock - settled.c.quantity, 0)
+        )
+
+    result = await session.execute(
+        update(Product)
+        .where(Product.id == settled.c.product_id)
+        .values(**changes)
+        .returning(Product.id, Product.stock, Product.reserved)
+        # Синхронизация сессии (fetch) теряет RETURNING у UPDATE ... FROM с CTE,
+        # а загруженных в сессию товаров здесь нет
+        .execution_options(synchronize_session=False)
+    )
+    await publish_stock(session, result.all())
+
+
+async def release_order_stock(session: AsyncSession, order_id: int):
+    """Вернуть в свободный остаток товары, зарезервированные заказом (без коммита)"""
+    await settle_reservations(session, order_id, sold=False)
+
+
+async def commit_order_stock(session: AsyncSession, order_id: int):
+    """Списать оплаченные товары со склада и снять с них резерв (без коммита)"""
+    await settle_reservations(session, order_id, sold=True)
+
+
+async def cancel_order(session: AsyncSession, order_id: int):
+    """Снять резерв и удалить неоплаченный заказ вместе с позициями"""
+    await release_order_stock(session, order_id)
+    await session.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+    user_id = await session.scalar(delete(Order).where(Order.id == order_id).returning(Order.user_id))
+    if user_id is not None:
+        await publish_order_change(session, order_id, user_id, "delete")
+    await session.commit()
+
+    if user_id is not None:
+        invalidate_user_orders(user_id)
+
+
+async def get_expired_reservations(session: AsyncSession, limit: int = 100) -> list[tuple[int, str | None]]:
+    """Неоплаченные заказы (id, payment_id), резерв которых истек"""
+    result = await session.execute(
+        select(Order.id, Order.payment_id)
+        .join(StockReservation, StockReservation.order_id == Order.id)
+        .where(StockReservation.expires_at < datetime.now())
+        .group_by(Order.id, Order.payment_id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in result.all()]
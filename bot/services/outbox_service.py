@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Outbox
+from services.change_feed import publish_change
+
+# Типы исходящих действий
+OUTBOX_ORDER_STATUS = "order_status"
+OUTBOX_PAYMENT_RESULT = "payment_result"
+
+# Сколько выполненных действий удалять за один запрос при очистке
+PURGE_BATCH_SIZE = 1000
+
+
+async def enqueue(
+    session: AsyncSession,
+    kind: str,
+    payload: dict,
+    idempotency_key: str | None = None
+) -> None:
+    """
+    Записать действие в очередь в текущей транзакции (без коммита).
+    Действие выполнится, только если транзакция будет зафиксирована;
+    повторная запись с тем же ключом идемпотентности игнорируется.
+    """
+    await session.execute(
+        insert(Outbox)
+        .values(
+            kind=kind, payload=payload, idempotency_key=idempotency_key, attempts=0,
+            available_at=func.now(), created_at=func.now()
+        )
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+    # Будим обработчики очереди после коммита
+    await publish_change(session, "shop_outbox", "save")
+
+
+async def claim_outbox_batch(session: AsyncSession, limit: int, lease_seconds: int) -> list[Outbox]:
+    """
+    Захватить пачку действий, срок которых наступил.
+    Захват сдвигает available_at на время аренды и сразу фиксируется,
+    поэтому блокировки не держатся во время отправки, а действия,
+    оставшиеся от упавшего процесса, снова станут доступны после аренды.
+    """
+    due_ids = (
+        select(Outbox.id)
+        .where(Outbox.processed_at.is_(None), Outbox.available_at <= func.now())
+        .order_by(Outbox.available_at, Outbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(Outbox)
+        .where(Outbox.id.in_(due_ids))
+        .values(attempts=Outbox.attempts + 1, available_at=func.now() + timedelta(seconds=lease_seconds))
+        .returning(Outbox)
+    )
+    batch = sorted(result.scalars().all(), key=lambda message: message.id)
+    await session.commit()
+    return batch
+
+
+async def complete_outbox(session: AsyncSession, outbox_ids: list[int], error: str | None = None) -> None:
+    """Отметить действия выполненными (или окончательно неудачными)"""
+    if not outbox_ids:
+        return
+
+    await session.execute(
+        update(Outbox).where(Outbox.id.in_(outbox_ids)).values(processed_at=func.now(), error=error)
+    )
+    await session.commit()
+
+
+async def retry_outbox(session: AsyncSession, outbox_id: int, error: str, delay: float) -> None:
+    """Отложить повтор действия на delay секунд"""
+    await session.execute(
+        update(Outbox)
+        .where(Outbox.id == outbox_id)
+        .values(available_at=func.now() + timedelta(seconds=delay), error=error)
+    )
+    await session.commit()
+
+
+async def purge_outbox(session: AsyncSession, retention_days: int, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """
+    Удалить действия, обработанные больше retention_days дней назад.
+    Удаление идет пачками по batch_size строк с коммитом после каждой.
+    Вместе со строкой пропадает и ключ идемпотентности, поэтому срок
+    хранения должен быть больше окна, в котором возможны повторные записи.
+    """
+    processed_ids = (
+        select(Outbox.id)
+        .where(Outbox.processed_at < func.now() - timedelta(days=retention_days))
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+
+    total = 0
+    while True:
+        result = await session.execute(
+            delete(Outbox).where(Outbox.id.in_(processed_ids))
+        )
+        await session.commit()
+        total += result.rowcount
+
+        if result.rowcount < batch_size:
+            break
+
+    return total
@@ -1,15 +1,15 @@
-import json
-import uuid
-import base64
-from datetime import datetime, timedelta
-import aiohttp
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
+from sqlalchemy import update
 
-from config import YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL
-from models import Order, OrderItem
-from services.cart_service import get_cart_items
+from models import Order
+from services.cart_service import get_cart_snapshot, flush_cart_updates, delete_cart_items, forget_cart
+from services.order_service import (
+    reserve_order, cancel_order, commit_order_stock,
+    get_expired_reservations, invalidate_user_orders, publish_order_change
+)
+from services.outbox_service import enqueue, OUTBOX_PAYMENT_RESULT
+from services.yookassa_client import yookassa, YooKassaError
 from utils.logger import logger
 
 
@@ -17,198 +17,182 @@ async def init_payment(session: AsyncSession, user_id: int, delivery_info: dict)
     """
     Инициализация платежа в системе ЮKassa
     
+    Сначала в одной транзакции создается заказ и резервируются товары,
+    затем создается платеж. Если платеж создать не удалось, заказ отменяется
+    и резерв снимается.
+    
     Args:
         session: Сессия базы данных
         user_id: ID пользователя
         delivery_info: Информация о доставке
+    
+    Raises:
+        InsufficientStockError: Товаров на складе меньше, чем в корзине
     """
-    try:
-        # Проверяем, что настройки ЮKassa загружены
-        if not YOOKASSA_SHOP_ID or not YOOKASSA_SECRET_KEY:
-            logger.error(f"Ошибка: Не заданы настройки ЮKassa. SHOP_ID: {YOOKASSA_SHOP_ID}, SECRET_KEY: {YOOKASSA_SECRET_KEY}")
-            return None
-        else:
-            shop_id = YOOKASSA_SHOP_ID
-            secret_key = YOOKASSA_SECRET_KEY
-            
-        # Получаем товары из корзины
-        cart_items = await get_cart_items(session, user_id)
-        if not cart_items:
-            return None
-        
-        # Рассчитываем общую сумму заказа
-        total_amount = sum(item[0].quantity * item[1].price for item in cart_items)
-        idempotence_key = str(uuid.uuid4())
-        
-        # Формируем данные для запроса
-        data = {
-            "amount": {
-                "value": f"{total_amount:.2f}",
-                "currency": "RUB"
-            },
-            "capture": True,
-            "confirmation": {
-                "type": "redirect",
-                "return_url": "https://t.me/bot_username"
-            },
-            "description": f"Заказ №{idempotence_key[:8]}",
-            "metadata": {
-                "user_id": str(user_id)
-            }
-        }
+    # Проверяем, что настройки ЮKassa загружены
+    if not yookassa.is_configured:
+        logger.error("Ошибка: Не заданы настройки ЮKassa (YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)")
+        return None
 
-        auth_string = f"{shop_id}:{secret_key}"
-        encoded_auth = base64.b64encode(auth_string.encode()).decode()
-        
-        headers = {
-            "Authorization": f"Basic {encoded_auth}",
-            "Idempotence-Key": idempotence_key,
-            "Content-Type": "application/json"
+    # Снимок корзины с учетом еще не записанных изменений количества
+    await flush_cart_updates(session, user_id)
+    cart = await get_cart_snapshot(session, user_id)
+    if cart.is_empty:
+        return None
+
+    total_amount = cart.total
+    order_id = await reserve_order(session, user_id, cart, delivery_info)
+
+    # Формируем данные для запроса
+    data = {
+        "amount": {
+            "value": f"{total_amount:.2f}",
+            "currency": "RUB"
+        },
+        "capture": True,
+        "confirmation": {
+            "type": "redirect",
+            "return_url": "https://t.me/bot_username"
+        },
+        "description": f"Заказ №{order_id}",
+        "metadata": {
+            "user_id": str(user_id),
+            "order_id": str(order_id)
         }
-        
-        # Логируем данные запроса и заголовки авторизации для отладки
-        logger.info(f"Отправка запроса к API ЮKassa: {YOOKASSA_API_URL}/payments")
-        logger.info(f"Данные запроса: {data}")
-        
-        # Отправляем запрос к API ЮKassa
-        async with aiohttp.ClientSession() as http_session:
-            async with http_session.post(
-                f"{YOOKASSA_API_URL}/payments", 
-                json=data, 
-                headers=headers,
-                ssl=True
-            ) as response:
-                logger.info(f"Статус ответа: {response.status}")
-                logger.info(f"Заголовки ответа: {response.headers}")
-                
-                # Если ответ не в формате JSON, логируем текст ответа
-                if 'application/json' not in response.headers.get('Content-Type', ''):
-                    text = await response.text()
-                    logger.error(f"Ответ не в формате JSON: {text[:500]}")
-                    return None
-                
-                result = await response.json()
-                logger.info(f"Тело ответа: {result}")
-                
-                if result.get("id"):
-                    new_order = Order(
-                        user_id=user_id,
-                        status="pending",
-                        username=delivery_info['username'],
-                        full_name=delivery_info['full_name'],
-                        phone=delivery_info['phone'],
-                        address=delivery_info['address'],
-                        payment_id=result.get("id"),
-                        payment_status=result.get("status"),
-                        total_price=total_amount,
-                        created_at=datetime.now(),
-                        updated_at=datetime.now()
-                    )
-                    
-                    session.add(new_order)
-                    await session.flush()  # Получаем ID заказа
+    }
 
-                    for cart_item, product in cart_items:
-                        order_item = OrderItem(
-                            order_id=new_order.id,
-                            product_id=product.id,
-                            quantity=cart_item.quantity,
-                            price=product.price
-                        )
-                        session.add(order_item)
-                    
-                    await session.commit()
-                    
-                    # Возвращаем информацию о платеже
-                    return {
-                        "order_id": new_order.id,
-                        "payment_id": result.get("id"),
-                        "payment_url": result.get("confirmation", {}).get("confirmation_url"),
-                        "status": result.get("status"),
-                        "amount": total_amount
-                    }
-                else:
-                    logger.error(f"Ошибка при инициализации платежа: {result}")
-                    return None
-    except Exception as e:
-        logger.error(f"Ошибка при инициализации платежа: {e}")
+    result = None
+    try:
+        # Ключ привязан к заказу: повтор запроса не создаст второй платеж
+        result = await yookassa.create_payment(data, idempotence_key=f"order-{order_id}")
+    except YooKassaError as e:
+        logger.error(f"Ошибка при инициализации платежа заказа #{order_id}: {e}")
+
+    if not result or not result.get("id"):
+        if result:
+            logger.error(f"Ошибка при инициализации платежа: {result}")
+        await cancel_order(session, order_id)
         return None
 
+    await session.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(payment_id=result.get("id"), payment_status=result.get("status"))
+    )
+    await session.commit()
+    logger.info(f"Создан платеж {result.get('id')} для заказа #{order_id}")
+    
+    # Возвращаем информацию о платеже
+    return {
+        "order_id": order_id,
+        "payment_id": result.get("id"),
+        "payment_url": result.get("confirmation", {}).get("confirmation_url"),
+        "status": result.get("status"),
+        "amount": total_amount
+    }
+
 
 async def check_payment_status(payment_id: str):
     """
     Проверка статуса платежа в системе ЮKassa
+    
+    Возвращает None, если статус узнать не удалось (в том числе
+    когда API недоступно и предохранитель клиента разомкнут).
     """
     try:
-        # Проверяем, что настройки ЮKassa загружены
-        if not YOOKASSA_SHOP_ID or not YOOKASSA_SECRET_KEY:
-            logger.error(f"Ошибка: Не заданы настройки ЮKassa. SHOP_ID: {YOOKASSA_SHOP_ID}, SECRET_KEY: {YOOKASSA_SECRET_KEY}")
-            return None
-        else:
-            shop_id = YOOKASSA_SHOP_ID
-            secret_key = YOOKASSA_SECRET_KEY
-            
-        # Создаем заголовки для авторизации
-        auth_string = f"{shop_id}:{secret_key}"
-        auth_base64 = base64.b64encode(auth_string.encode()).decode()
-        headers = {
-            "Authorization": f"Basic {auth_base64}",
-            "Content-Type": "application/json"
-        }
-        
-        # Отправляем запрос к API ЮKassa
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{YOOKASSA_API_URL}/payments/{payment_id}", 
-                headers=headers,
-                ssl=True
-            ) as response:
-                result = await response.json()
-                
-                if result.get("id"):
-                    return {
-                        "status": result.get("status"),
-                        "payment_id": result.get("id"),
-                        "paid": result.get("paid", False),
-                        "amount": float(result.get("amount", {}).get("value", 0))
-                    }
-                else:
-                    logger.error(f"Ошибка при проверке статуса платежа: {result}")
-                    return None
-    except Exception as e:
-        logger.error(f"Ошибка при проверке статуса платежа: {e}")
+        result = await yookassa.get_payment(payment_id)
+    except YooKassaError as e:
+        logger.error(f"Ошибка при проверке статуса платежа {payment_id}: {e}")
+        return None
+
+    if not result.get("id"):
+        logger.error(f"Ошибка при проверке статуса платежа: {result}")
         return None
 
+    return {
+        "status": result.get("status"),
+        "payment_id": result.get("id"),
+        "paid": result.get("paid", False),
+        "amount": float(result.get("amount", {}).get("value", 0))
+    }
+
 
-async def update_order_payment_status(session: AsyncSession, payment_id: str, status: str):
+async def enqueue_payment_result(
+    session: AsyncSession,
+    payment_id: str,
+    status: str,
+    order_id: int,
+    amount,
+    payment_message: dict | None
+):
+    """
+    Записать в очередь сообщение покупателю о результате оплаты.
+    Ключ идемпотентности не дает отправить одно и то же сообщение
+    дважды, даже если статус платежа обработали несколько процессов.
+    """
+    payload = {"order_id": order_id, "status": status, "amount": float(amount or 0), **(payment_message or {})}
+    await enqueue(session, OUTBOX_PAYMENT_RESULT, payload, idempotency_key=f"payment:{payment_id}:{status}")
+
+
+async def update_order_payment_status(
+    session: AsyncSession,
+    payment_id: str,
+    status: str,
+    payment_message: dict | None = None
+):
     """
     Обновление статуса платежа заказа в базе данных
     
+    При первом переходе в статус succeeded оплаченные товары
+    списываются со склада, а корзина покупателя очищается в той же
+    транзакции. Сообщение о результате оплаты записывается в очередь
+    действий тоже в этой транзакции и отправляется после коммита.
+    
     Args:
         session: Сессия базы данных
         payment_id: ID платежа в системе ЮKassa
         status: Новый статус платежа
+        payment_message: Чат и сообщение с кнопкой оплаты ({"chat_id", "message_id"}),
+            которое нужно заменить результатом; без него покупатель не уведомляется
     """
     try:
-        # Находим заказ по ID платежа
-        query = select(Order).where(Order.payment_id == payment_id)
-        result = await session.execute(query)
-        order = result.scalars().first()
+        values = {"payment_status": status}
         
-        if order:
-            # Обновляем статус платежа
-            order.payment_status = status
-            
-            # Если платеж успешен, обновляем статус заказа
-            if status == "succeeded":
-                order.status = "paid"
-            
-            await session.commit()
-            logger.info(f"Статус платежа заказа #{order.id} обновлен на {status}")
-            return True
-        else:
-            logger.error(f"Заказ с ID платежа {payment_id} не найден")
+        # Если платеж успешен, обновляем статус заказа
+        if status == "succeeded":
+            values["status"] = "paid"
+        
+        # Обновляем только при смене статуса, чтобы не списать товары дважды
+        result = await session.execute(
+            update(Order)
+            .where(Order.payment_id == payment_id, Order.payment_status != status)
+            .values(**values)
+            .returning(Order.id, Order.user_id, Order.total_price)
+        )
+        order = result.first()
+        
+        if not order:
+            await session.rollback()
+            logger.warning(f"Заказ с ID платежа {payment_id} не найден или уже в статусе {status}")
             return False
+        
+        order_id, user_id, total_price = order
+        if status == "succeeded":
+            await commit_order_stock(session, order_id)
+            await delete_cart_items(session, user_id)
+            # Об успешной оплате сообщаем всегда, даже если сообщение с оплатой неизвестно
+            payment_message = payment_message or {"chat_id": user_id}
+        
+        if payment_message:
+            await enqueue_payment_result(session, payment_id, status, order_id, total_price, payment_message)
+        
+        await publish_order_change(session, order_id, user_id)
+        await session.commit()
+        invalidate_user_orders(user_id)
+        if status == "succeeded":
+            forget_cart(user_id)
+        logger.info(f"Статус платежа заказа #{order_id} обновлен на {status}")
+        return True
     except Exception as e:
         logger.error(f"Ошибка при обновлении статуса платежа заказа: {e}")
         await session.rollback()
@@ -235,34 +219,66 @@ async def get_order_by_payment_id(session: AsyncSession, payment_id: str):
         return None
 
 
-async def delete_unpaid_order(session: AsyncSession, payment_id: str):
+async def delete_unpaid_order(session: AsyncSession, payment_id: str, payment_message: dict | None = None):
     """
-    Удаление неоплаченного заказа
+    Удаление неоплаченного заказа со снятием резерва товаров
     
     Args:
         session: Сессия базы данных
         payment_id: ID платежа в системе ЮKassa
+        payment_message: Чат и сообщение с кнопкой оплаты, в котором
+            нужно сообщить об отмене заказа по истечении времени
     """
     try:
-        # Находим заказ по ID платежа
-        order = await get_order_by_payment_id(session, payment_id)
+        # Блокируем заказ, чтобы резерв не был снят дважды
+        order = (await session.execute(
+            select(Order.id, Order.total_price)
+            .where(Order.payment_id == payment_id, Order.payment_status != "succeeded")
+            .with_for_update()
+        )).first()
         
         if not order:
-            logger.error(f"Заказ с ID платежа {payment_id} не найден")
+            await session.rollback()
+            logger.error(f"Неоплаченный заказ с ID платежа {payment_id} не найден")
             return False
         
-        # Удаляем связанные элементы заказа
-        delete_items = delete(OrderItem).where(OrderItem.order_id == order.id)
-        await session.execute(delete_items)
-        
-        # Удаляем сам заказ
-        delete_order = delete(Order).where(Order.id == order.id)
-        await session.execute(delete_order)
+        order_id, total_price = order
+        if payment_message:
+            await enqueue_payment_result(session, payment_id, "expired", order_id, total_price, payment_message)
         
-        await session.commit()
-        logger.info(f"Неоплаченный заказ #{order.id} удален")
+        # Сообщение об отмене фиксируется вместе с удалением заказа
+        await cancel_order(session, order_id)
+        logger.info(f"Неоплаченный заказ #{order_id} удален")
         return True
     except Exception as e:
         logger.error(f"Ошибка при удалении неоплаченного заказа: {e}")
         await session.rollback()
         return False
+
+
+async def expire_reservations(session: AsyncSession):
+    """
+    Обработать заказы с истекшим резервом товаров
+    
+    Резерв переживает перезапуск бота, поэтому заказы, за которыми
+    уже никто не следит, не держат товар бесконечно. Перед отменой
+    статус платежа сверяется с ЮKassa, чтобы не отменить оплаченный заказ.
+    
+    Args:
+        session: Сессия базы данных
+    """
+    for order_id, payment_id in await get_expired_reservations(session):
+        if not payment_id:
+            await cancel_order(session, order_id)
+            logger.info(f"Заказ #{order_id} без платежа отменен по истечении резерва")
+            continue
+        
+        payment_status = await check_payment_status(payment_id)
+        if not payment_status:
+            # ЮKassa недоступна: повторим при следующем запуске
+            continue
+        
+        if payment_status['status'] == "succeeded":
+            await update_order_payment_status(session, payment_id, "succeeded")
+        else:
+            await delete_unpaid_order(session, payment_id)
@@ -1,10 +1,125 @@
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
+from sqlalchemy import func, update
 
 from models import Category, Product
 
 
+@dataclass
+class ProductCard:
+    """Товар в кеше каталога вместе с остатком"""
+    id: int
+    category_id: int
+    name: str
+    description: str | None
+    price: Decimal
+    image: str | None
+    image_telegram: str | None
+    file_id: str | None
+    available: bool
+    stock: int | None
+    reserved: int
+
+    @property
+    def free_stock(self) -> int | None:
+        """Свободный остаток (None — без ограничения)"""
+        if self.stock is None:
+            return None
+        return max(self.stock - self.reserved, 0)
+
+    @property
+    def photo(self) -> str | None:
+        """Путь к фото для отправки: подготовленный для Telegram вариант или оригинал"""
+        return self.image_telegram or self.image
+
+    @property
+    def in_stock(self) -> bool:
+        """Товар можно купить прямо сейчас"""
+        return bool(self.available) and (self.stock is None or self.free_stock > 0)
+
+
+PRODUCT_CARD_COLUMNS = (
+    Product.id, Product.category_id, Product.name, Product.description, Product.price,
+    Product.image, Product.image_telegram, Product.file_id, Product.available, Product.stock, Product.reserved
+)
+
+# Кеш каталога: карточки товаров и упорядоченные ID товаров каждой категории
+_product_cache: dict[int, ProductCard] = {}
+_category_products: dict[int, list[int]] = {}
+
+# Версия каталога растет при каждом изменении, от которого зависит выдача товаров
+_catalog_version = 0
+_catalog_changed_at = time.monotonic()
+
+
+def get_catalog_version() -> int:
+    """Текущая версия каталога (для кешей, построенных по каталогу)"""
+    return _catalog_version
+
+
+def get_catalog_age() -> float:
+    """Сколько секунд каталог не менялся"""
+    return time.monotonic() - _catalog_changed_at
+
+
+def bump_catalog_version() -> None:
+    global _catalog_version, _catalog_changed_at
+    _catalog_version += 1
+    _catalog_changed_at = time.monotonic()
+
+
+def invalidate_catalog_cache(event: dict = None) -> None:
+    """
+    Обработать изменение товаров из ленты изменений.
+    Изменения остатков применяются к карточкам на месте, остальные
+    изменения (правки в админке) сбрасывают кеш каталога целиком.
+    """
+    if event and event.get("op") == "stock":
+        apply_stock_changes(event["stock"])
+        return
+
+    _product_cache.clear()
+    _category_products.clear()
+    bump_catalog_version()
+
+
+def apply_stock_changes(stock: dict) -> None:
+    """Обновить остатки закешированных товаров: {id: [stock, reserved]}"""
+    changed = False
+    for product_id, (product_stock, reserved) in stock.items():
+        card = _product_cache.get(int(product_id))
+        if card:
+            in_stock = card.in_stock
+            card.stock, card.reserved = product_stock, reserved
+            # Выдача меняется, только если товар закончился или появился
+            changed = changed or card.in_stock != in_stock
+
+    if changed:
+        bump_catalog_version()
+
+
+async def get_category_cards(session: AsyncSession, category_id: int) -> list[ProductCard]:
+    """Все товары категории из кеша каталога (загружаются одним запросом при промахе)"""
+    product_ids = _category_products.get(category_id)
+
+    if product_ids is None:
+        result = await session.execute(
+            select(*PRODUCT_CARD_COLUMNS)
+            .where(Product.category_id == category_id)
+            .order_by(Product.name, Product.id)
+        )
+        cards = [ProductCard(*row) for row in result.all()]
+        for card in cards:
+            _product_cache[card.id] = card
+        product_ids = _category_products[category_id] = [card.id for card in cards]
+
+    return [_product_cache[product_id] for product_id in product_ids if product_id in _product_cache]
+
+
 async def get_main_categories(session: AsyncSession, page: int = 1, items_per_page: int = 10):
     """Получение всех основных категорий (без родительской категории) с пагинацией"""
     # Вычисляем смещение для пагинации
@@ -66,31 +181,59 @@ async def get_category_by_id(session: AsyncSession, category_id: int):
 
 
 async def get_products_by_category(session: AsyncSession, category_id: int, page: int = 1, items_per_page: int = 10):
-    """Получение товаров в категории с пагинацией"""
+    """Получение товаров в наличии в категории с пагинацией"""
     # Вычисляем смещение для пагинации
     offset = (page - 1) * items_per_page
     
-    # Получаем товары с учетом пагинации
-    result = await session.execute(
-        select(Product)
-        .where(Product.category_id == category_id, Product.available == True)
-        .offset(offset)
-        .limit(items_per_page)
-    )
-    return result.scalars().all()
+    products = [card for card in await get_category_cards(session, category_id) if card.in_stock]
+    return products[offset:offset + items_per_page]
 
 
 async def count_products_in_category(session: AsyncSession, category_id: int):
-    """Подсчет общего количества товаров в категории"""
-    result = await session.execute(
-        select(func.count())
-        .select_from(Product)
-        .where(Product.category_id == category_id, Product.available == True)
-    )
-    return result.scalar()
+    """Подсчет общего количества товаров в наличии в категории"""
+    return sum(card.in_stock for card in await get_category_cards(session, category_id))
 
 
-async def get_product_by_id(session: AsyncSession, product_id: int):
+async def get_product_by_id(session: AsyncSession, product_id: int) -> ProductCard | None:
     """Получение товара по ID"""
-    result = await session.execute(select(Product).where(Product.id == product_id))
-    return result.scalars().first()
+    card = _product_cache.get(product_id)
+    if card is None:
+        result = await session.execute(select(*PRODUCT_CARD_COLUMNS).where(Product.id == product_id))
+        row = result.first()
+        if row:
+            card = _product_cache[product_id] = ProductCard(*row)
+    return card
+
+
+async def get_product_cards(session: AsyncSession, product_ids: list[int]) -> list[ProductCard]:
+    """Карточки товаров в порядке product_ids (недостающие в кеше загружаются одним запросом)"""
+    missing = [product_id for product_id in product_ids if product_id not in _product_cache]
+    if missing:
+        result = await session.execute(select(*PRODUCT_CARD_COLUMNS).where(Product.id.in_(missing)))
+        for row in result.all():
+            _product_cache[row.id] = ProductCard(*row)
+
+    return [_product_cache[product_id] for product_id in product_ids if product_id in _product_cache]
+
+
+async def save_product_file_id(session: AsyncSession, product: ProductCard, file_id: str) -> None:
+    """Сохранить file_id загруженного в Telegram изображения товара"""
+    # Если изображение успели заменить или подготовить заново, file_id относится к другому файлу
+    await session.execute(
+        update(Product)
+        .where(Product.id == product.id, Product.image == product.image,
+               Product.image_telegram.is_not_distinct_from(product.image_telegram))
+        .values(file_id=file_id)
+    )
+    await session.commit()
+    product.file_id = file_id
+
+
+async def get_products_without_file_id(session: AsyncSession) -> list[ProductCard]:
+    """Товары с изображением, которое еще не загружено в Telegram"""
+    result = await session.execute(
+        select(Product.id)
+        .where(Product.image.is_not(None), Product.image != "", Product.file_id.is_(None))
+        .order_by(Product.id)
+    )
+    return await get_product_cards(session, list(result.scalars().all()))
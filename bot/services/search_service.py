@@ -0,0 +1,234 @@
+import re
+from collections import Counter
+
+from sqlalchemy import func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import SEARCH_BACKEND, SEARCH_RESULTS_LIMIT, INLINE_CACHE_SIZE
+from models import Product
+from services.product_service import ProductCard, get_product_cards, get_catalog_version
+from utils.cache import LRUCache
+from utils.logger import logger
+
+# Минимальная доля триграмм запроса, найденных в названии или описании товара
+MIN_SIMILARITY = 0.5
+
+# Вес совпадения в названии относительно совпадения в описании
+NAME_WEIGHT = 2
+
+
+def normalize(text: str | None) -> list[str]:
+    """Слова текста в нижнем регистре без знаков препинания"""
+    if not text:
+        return []
+    return re.findall(r"\w+", text.lower().replace("ё", "е"))
+
+
+def get_trigrams(words: list[str], prefix_last: bool = False) -> set[str]:
+    """
+    Триграммы слов (как в pg_trgm: два пробела в начале слова и один в конце).
+    Для последнего слова запроса конец не добавляется, чтобы недописанное
+    слово находило товары по началу слова.
+    """
+    trigrams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if prefix_last and i == len(words) - 1 else f"  {word} "
+        trigrams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return trigrams
+
+
+class ProductIndex:
+    """
+    Индекс триграмм названий и описаний товаров в памяти.
+    Загружается одним запросом при первом поиске и обновляется
+    по одному товару из ленты изменений.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._name_index: dict[str, set[int]] = {}
+        self._description_index: dict[str, set[int]] = {}
+        # Триграммы каждого товара, чтобы убрать их из индекса при изменении
+        self._documents: dict[int, tuple[set[str], set[str]]] = {}
+        # Названия товаров для выдачи всего каталога по пустому запросу
+        self._names: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def clear(self) -> None:
+        self.loaded = False
+        self._name_index.clear()
+        self._description_index.clear()
+        self._documents.clear()
+        self._names.clear()
+
+    def add(self, product_id: int, name: str, description: str | None) -> None:
+        self.remove(product_id)
+        name_trigrams = get_trigrams(normalize(name))
+        description_trigrams = get_trigrams(normalize(description))
+        for trigram in name_trigrams:
+            self._name_index.setdefault(trigram, set()).add(product_id)
+        for trigram in description_trigrams:
+            self._description_index.setdefault(trigram, set()).add(product_id)
+        self._documents[product_id] = (name_trigrams, description_trigrams)
+        self._names[product_id] = " ".join(normalize(name))
+
+    def remove(self, product_id: int) -> None:
+        self._names.pop(product_id, None)
+        document = self._documents.pop(product_id, None)
+        if not document:
+            return
+        for index, trigrams in zip((self._name_index, self._description_index), document):
+            for trigram in trigrams:
+                ids = index.get(trigram)
+                if ids:
+                    ids.discard(product_id)
+                    if not ids:
+                        del index[trigram]
+
+    async def load(self, session: AsyncSession) -> None:
+        """Построить индекс по всем товарам"""
+        result = await session.execute(select(Product.id, Product.name, Product.description))
+        self.clear()
+        for product_id, name, description in result.all():
+            self.add(product_id, name, description)
+        self.loaded = True
+        logger.info(f"Индекс поиска товаров построен: {len(self)} товаров")
+
+    def browse(self) -> list[int]:
+        """ID всех товаров по названию"""
+        return sorted(self._names, key=lambda product_id: (self._names[product_id], product_id))
+
+    def search(self, query: str) -> list[int]:
+        """ID товаров, похожих на запрос, от лучших совпадений к худшим (пустой запрос — все товары)"""
+        trigrams = get_trigrams(normalize(query), prefix_last=True)
+        if not trigrams:
+            return self.browse()
+
+        name_hits = Counter()
+        description_hits = Counter()
+        for trigram in trigrams:
+            name_hits.update(self._name_index.get(trigram, ()))
+            description_hits.update(self._description_index.get(trigram, ()))
+
+        required = len(trigrams) * MIN_SIMILARITY
+        ranked = []
+        for product_id in name_hits.keys() | description_hits.keys():
+            name_score, description_score = name_hits[product_id], description_hits[product_id]
+            if max(name_score, description_score) >= required:
+                ranked.append((-(name_score * NAME_WEIGHT + description_score), product_id))
+
+        ranked.sort()
+        return [product_id for _, product_id in ranked]
+
+
+# Общий индекс товаров процесса бота
+product_index = ProductIndex()
+
+# Страницы выдачи: (запрос, смещение, размер) → (версия каталога, товары, следующее смещение)
+_page_cache = LRUCache(INLINE_CACHE_SIZE)
+
+
+async def on_product_changed(event: dict) -> None:
+    """Обновить индекс по изменению товара из ленты изменений"""
+    # Остатки не влияют на поиск, а до первого поиска индекс не нужен
+    if event.get("op") == "stock" or not product_index.loaded:
+        return
+
+    product_id = event["id"]
+    if event.get("op") == "delete":
+        product_index.remove(product_id)
+        return
+
+    from database import get_session
+
+    async for session in get_session():
+        result = await session.execute(
+            select(Product.name, Product.description).where(Product.id == product_id)
+        )
+        row = result.first()
+
+    if row:
+        product_index.add(product_id, *row)
+    else:
+        product_index.remove(product_id)
+
+
+def reset_product_index(event: dict = None) -> None:
+    """Перестроить индекс при следующем поиске (после переподключения к ленте)"""
+    product_index.clear()
+
+
+async def search_product_ids_pg(session: AsyncSession, query: str, limit: int) -> list[int]:
+    """Поиск по индексам GIN pg_trgm в базе (пустой запрос — все товары по названию)"""
+    if not query.strip():
+        result = await session.execute(
+            select(Product.id)
+            .where(Product.available == True)
+            .order_by(Product.name, Product.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    name_similarity = func.word_similarity(query, Product.name)
+    description_similarity = func.word_similarity(query, func.coalesce(Product.description, ""))
+
+    result = await session.execute(
+        select(Product.id)
+        .where(
+            Product.available == True,
+            or_(Product.name.op("%>")(query), Product.description.op("%>")(query))
+        )
+        .order_by((name_similarity * NAME_WEIGHT + description_similarity).desc(), Product.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def search_products(
+    session: AsyncSession, query: str, limit: int = SEARCH_RESULTS_LIMIT, offset: int = 0
+) -> list[ProductCard]:
+    """Товары в наличии, найденные по запросу, от лучших совпадений к худшим"""
+    wanted = offset + limit
+    if SEARCH_BACKEND == "pg_trgm":
+        # Запас на товары, закончившиеся на складе
+        product_ids = await search_product_ids_pg(session, query, wanted * 2)
+    else:
+        if not product_index.loaded:
+            await product_index.load(session)
+        product_ids = product_index.search(query)
+
+    found = []
+    # Карточки загружаются порциями, пока не наберется нужное число товаров в наличии
+    for start in range(0, len(product_ids), wanted):
+        cards = await get_product_cards(session, product_ids[start:start + wanted])
+        found.extend(card for card in cards if card.in_stock)
+        if len(found) >= wanted:
+            break
+
+    return found[offset:wanted]
+
+
+async def search_page(
+    session: AsyncSession, query: str, offset: int, limit: int
+) -> tuple[list[ProductCard], int | None]:
+    """
+    Страница выдачи и смещение следующей (None, если страниц больше нет).
+    Страницы кешируются до изменения каталога, поэтому повторные и
+    листаемые запросы не обращаются к базе.
+    """
+    key = (" ".join(normalize(query)), offset, limit)
+    version = get_catalog_version()
+    cached = _page_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    # Лишний товар показывает, есть ли следующая страница
+    products = await search_products(session, query, limit + 1, offset)
+    next_offset = offset + limit if len(products) > limit else None
+    page = products[:limit]
+
+    _page_cache.set(key, (version, page, next_offset))
+    return page, next_offset
@@ -12,12 +12,6 @@ async def get_user(session: AsyncSession, user_id: int):
     return result.scalars().first()
 
 
-async def get_all_users(session: AsyncSession) -> list[User]:
-    """Получение всех пользователей"""
-    result = await session.execute(select(User))
-    return list(result.scalars().all())
-
-
 async def create_user(session: AsyncSession, user_id: int, username: str = None):
     """Создание нового пользователя"""
     now = datetime.now()
@@ -38,6 +32,10 @@ async def get_or_create_user(session: AsyncSession, user_id: int, username: str
     user = await get_user(session, user_id)
     if not user:
         user = await create_user(session, user_id, username)
+    elif not user.is_active:
+        # Пользователь снова пишет боту, значит, разблокировал его
+        user.is_active = True
+        await session.commit()
     return user
 
 
@@ -0,0 +1,201 @@
+"""
+Клиент API ЮKassa с общим пулом соединений
+"""
+
+import asyncio
+import base64
+import random
+import time
+import uuid
+
+import aiohttp
+
+from config import (
+    YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL, YOOKASSA_TIMEOUT,
+    YOOKASSA_MAX_RETRIES, YOOKASSA_POOL_SIZE, YOOKASSA_BREAKER_THRESHOLD, YOOKASSA_BREAKER_RESET
+)
+from utils.logger import logger
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Базовая пауза перед повтором (сек.), удваивается с каждой попыткой
+RETRY_BASE_DELAY = 0.5
+
+
+class YooKassaError(Exception):
+    """Ошибка обращения к API ЮKassa"""
+
+
+class YooKassaUnavailable(YooKassaError):
+    """API ЮKassa недоступно: предохранитель разомкнут или исчерпаны повторы"""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после threshold ошибок подряд запросы не отправляются
+    reset_timeout секунд, затем пропускается один пробный запрос.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        if self._opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self) -> None:
+        """Пробный запрос не завершился (отменен): пропустить следующий"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("API ЮKassa снова доступно")
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self._opened_at is not None or self._failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning(f"API ЮKassa недоступно, запросы приостановлены на {self.reset_timeout} с")
+            self._opened_at = time.monotonic()
+
+
+class YooKassaClient:
+    """
+    Долгоживущий клиент ЮKassa.
+    Соединения (keep-alive) и DNS-ответы переиспользуются между запросами,
+    заголовок авторизации вычисляется один раз. Неудачные запросы
+    повторяются с экспоненциальной паузой; создание платежа повторяется
+    с тем же Idempotence-Key, поэтому дубль платежа не создается.
+    """
+
+    def __init__(
+        self,
+        shop_id: str | None = YOOKASSA_SHOP_ID,
+        secret_key: str | None = YOOKASSA_SECRET_KEY,
+        api_url: str = YOOKASSA_API_URL,
+        timeout: float = YOOKASSA_TIMEOUT,
+        max_retries: int = YOOKASSA_MAX_RETRIES,
+        pool_size: int = YOOKASSA_POOL_SIZE
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(YOOKASSA_BREAKER_THRESHOLD, YOOKASSA_BREAKER_RESET)
+        self._auth_header = None
+        if shop_id and secret_key:
+            self._auth_header = "Basic " + base64.b64encode(f"{shop_id}:{secret_key}".encode()).decode()
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def is_configured(self) -> bool:
+        return self._auth_header is not None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия создается при первом запросе, внутри работающего цикла событий
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=min(self.timeout, 5)),
+                headers={"Authorization": self._auth_header}
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Закрыть пул соединений"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, path: str, json: dict | None = None, idempotence_key: str | None = None) -> dict:
+        """
+        Выполнить запрос к API и вернуть тело ответа.
+
+        Raises:
+            YooKassaUnavailable: API не отвечает или предохранитель разомкнут
+            YooKassaError: API отклонило запрос
+        """
+        if not self.is_configured:
+            raise YooKassaError("Не заданы настройки ЮKassa (YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)")
+
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else None
+        url = f"{self.api_url}{path}"
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+            if not self.breaker.allow():
+                raise YooKassaUnavailable("API ЮKassa временно недоступно")
+            # Запрос при разомкнутом предохранителе — пробный
+            probe = self.breaker.is_open
+
+            started = time.monotonic()
+            try:
+                async with self._get_session().request(method, url, json=json, headers=headers) as response:
+                    body = await response.json(content_type=None)
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.breaker.record_failure()
+                error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Ошибка запроса {method} {path} к ЮKassa (попытка {attempt + 1}): {error}")
+                continue
+            except asyncio.CancelledError:
+                # Отмена (например, задачи проверки платежа) ничего не говорит
+                # о доступности API: только освобождаем свой пробный запрос
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            except BaseException:
+                # Прерванный неожиданной ошибкой запрос считается неудачным,
+                # иначе пробный запрос не завершится и предохранитель не закроется
+                self.breaker.record_failure()
+                raise
+
+            logger.debug(f"ЮKassa {method} {path}: {status} за {time.monotonic() - started:.3f} с, ответ: {body}")
+
+            if status in RETRY_STATUSES:
+                self.breaker.record_failure()
+                error = f"HTTP {status}: {body}"
+                logger.warning(f"ЮKassa ответила {status} на {method} {path} (попытка {attempt + 1})")
+                continue
+
+            # Отказ в запросе (4xx) говорит о доступности API
+            self.breaker.record_success()
+            if status >= 400:
+                raise YooKassaError(f"HTTP {status}: {body}")
+            return body
+
+        raise YooKassaUnavailable(error)
+
+    async def create_payment(self, data: dict, idempotence_key: str | None = None) -> dict:
+        """Создать платеж; ключ идемпотентности общий для всех повторов"""
+        return await self.request("POST", "/payments", json=data, idempotence_key=idempotence_key or str(uuid.uuid4()))
+
+    async def get_payment(self, payment_id: str) -> dict:
+        """Получить платеж по ID"""
+        return await self.request("GET", f"/payments/{payment_id}")
+
+
+# Общий клиент процесса бота
+yookassa = YooKassaClient()
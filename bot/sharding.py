@@ -0,0 +1,342 @@
+"""
+Шардированный режим: прием вебхуков и несколько процессов-обработчиков
+
+Один процесс asyncio упирается в одно ядро (разбор обновлений pydantic,
+сборка клавиатур, форматирование), поэтому в режиме BOT_MODE=sharded:
+- главный процесс принимает вебхук Telegram, читает из обновления только
+  ID пользователя и передает обновление как есть одному из SHARD_COUNT
+  процессов-обработчиков через Unix-сокет (кадр — длина и JSON);
+- обработчик выбирается консистентным хешированием по ID пользователя:
+  все обновления пользователя попадают в один процесс, и его кеши (корзина,
+  история заказов, FSM) остаются рабочими, а при изменении числа процессов
+  переезжает лишь около 1/N пользователей;
+- в каждом соединении обновления идут по порядку, а обработчик выполняет
+  обновления одного пользователя строго последовательно, разных — параллельно;
+- каждый обработчик сам слушает ленту изменений и сбрасывает свои кеши;
+  планировщики и очередь исходящих действий работают только в обработчике #0;
+- главный процесс перезапускает упавшие обработчики.
+
+Обновление, уже принятое от Telegram, но не обработанное к моменту падения
+обработчика, теряется (как и при падении процесса в режиме polling).
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN, SHARD_COUNT, SHARD_SOCKET_DIR, WEBHOOK_URL, WEBHOOK_SECRET,
+    WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT
+)
+from app import (
+    ALLOWED_UPDATES, BackgroundServices, create_bot, create_dispatcher,
+    setup_change_feed, set_bot_commands
+)
+from middlewares import api_rate_limiter
+from services.change_feed import change_feed
+from services.yookassa_client import yookassa
+from utils.logger import logger
+
+# Кадр между приемом и обработчиком: длина тела (4 байта) и JSON обновления
+FRAME_HEADER = struct.Struct(">I")
+
+# Сколько обновлений может ждать отправки в один обработчик. Сверх этого
+# вебхук отвечает ошибкой, и Telegram доставит обновление повторно
+MAX_PENDING_UPDATES = 10000
+
+# Пауза перед переподключением к обработчику и перезапуском упавшего процесса (сек.)
+RECONNECT_DELAY = 1
+RESTART_DELAY = 5
+
+# Сколько секунд обработчик при остановке дожидается начатых обновлений
+DRAIN_TIMEOUT = 10
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Кольцо консистентного хеширования с виртуальными узлами"""
+
+    def __init__(self, nodes: Iterable[int], replicas: int = 100):
+        points = sorted((_hash(f"{node}:{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get_node(self, key: Any) -> int:
+        """Узел, отвечающий за ключ: первая точка кольца после хеша ключа"""
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._nodes[index]
+
+
+def get_update_key(update: dict) -> int:
+    """
+    Ключ шардирования обновления: ID пользователя, а если его нет — ID чата.
+    Разбирается только JSON, без построения моделей aiogram.
+    """
+    for field, event in update.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return update.get("update_id", 0)
+
+
+def socket_path(shard: int) -> str:
+    return os.path.join(SHARD_SOCKET_DIR, f"shard-{shard}.sock")
+
+
+class UserQueues:
+    """Очереди обновлений по пользователям: у каждого пользователя одна активная задача"""
+
+    def __init__(self, handle: Callable[[dict], Awaitable[Any]]):
+        self._handle = handle
+        self._queues: dict[int, deque] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, key: int, update: dict) -> None:
+        queue = self._queues.get(key)
+        if queue is not None:
+            # Задача пользователя еще работает и возьмет обновление следующим
+            queue.append(update)
+            return
+
+        self._queues[key] = deque([update])
+        task = asyncio.create_task(self._run(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: int) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                update = queue.popleft()
+                try:
+                    await self._handle(update)
+                except Exception as e:
+                    logger.exception(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+        finally:
+            del self._queues[key]
+
+    async def wait(self, timeout: float) -> None:
+        """Дождаться начатых обработок"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+def _stop_event() -> asyncio.Event:
+    """Событие остановки процесса по SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def _read_updates(queues: UserQueues, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Чтение кадров из соединения с приемом в порядке отправки"""
+    try:
+        while True:
+            (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            update = json.loads(await reader.readexactly(length))
+            queues.submit(get_update_key(update), update)
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_worker(shard: int) -> None:
+    """Процесс-обработчик: принимает обновления своего шарда и обрабатывает их"""
+    # Лимит Telegram общий на весь бот: ответы ограничены лимитами чатов,
+    # а фоновым отправкам обработчика #0 остается темп сверх резерва для ответов
+    api_rate_limiter.set_sharded()
+
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    # Планировщики и очередь исходящих действий нужны в одном экземпляре
+    background = BackgroundServices(bot) if shard == 0 else None
+    if background:
+        await background.start()
+
+    setup_change_feed(background)
+    change_feed.start()
+
+    queues = UserQueues(lambda update: dp.feed_raw_update(bot, update))
+    path = socket_path(shard)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _read_updates(queues, reader, writer), path=path
+    )
+    logger.info(f"✅ Обработчик #{shard} запущен (PID {os.getpid()})")
+
+    try:
+        await _stop_event().wait()
+    finally:
+        server.close()
+        await queues.wait(DRAIN_TIMEOUT)
+        await change_feed.stop()
+        if background:
+            await background.stop()
+        await yookassa.close()
+        await bot.session.close()
+        logger.info(f"⛔️ Обработчик #{shard} остановлен")
+
+
+def worker_process(shard: int) -> None:
+    """Точка входа процесса-обработчика"""
+    try:
+        asyncio.run(run_worker(shard))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.exception(f"❌ Критическая ошибка обработчика #{shard}: {e}")
+        sys.exit(1)
+
+
+class Ingress:
+    """Прием вебхука и распределение обновлений по процессам-обработчикам"""
+
+    def __init__(self, shard_count: int):
+        self.ring = HashRing(range(shard_count))
+        self._queues = [asyncio.Queue(MAX_PENDING_UPDATES) for _ in range(shard_count)]
+        # spawn: обработчик не наследует event loop и соединения главного процесса
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: list[multiprocessing.Process | None] = [None] * shard_count
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        for shard in range(len(self._queues)):
+            self._start_worker(shard)
+            self._tasks.append(asyncio.create_task(self._forward(shard)))
+
+    def _start_worker(self, shard: int) -> None:
+        process = self._context.Process(target=worker_process, args=(shard,), name=f"shard-{shard}")
+        process.start()
+        self._processes[shard] = process
+
+    async def supervise(self, stop: asyncio.Event) -> None:
+        """Перезапускать упавшие обработчики до остановки"""
+        while not stop.is_set():
+            for shard, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error(f"Обработчик #{shard} завершился с кодом {process.exitcode}, перезапуск")
+                    self._start_worker(shard)
+            try:
+                await asyncio.wait_for(stop.wait(), RESTART_DELAY)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        # Принятые обновления сначала передаются обработчикам
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while any(not queue.empty() for queue in self._queues) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            await asyncio.to_thread(process.join, DRAIN_TIMEOUT + 5)
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Обработчик вебхука: определить шард и поставить обновление в его очередь"""
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+
+        body = await request.read()
+        try:
+            key = get_update_key(json.loads(body))
+        except (ValueError, AttributeError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        try:
+            self._queues[self.ring.get_node(key)].put_nowait(body)
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _forward(self, shard: int) -> None:
+        """Передача обновлений шарда в обработчик по одному соединению (порядок сохраняется)"""
+        queue = self._queues[shard]
+        body = None
+
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(socket_path(shard))
+            except OSError:
+                # Обработчик еще запускается или перезапускается
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            try:
+                while True:
+                    if body is None:
+                        body = await queue.get()
+                    writer.write(FRAME_HEADER.pack(len(body)) + body)
+                    await writer.drain()
+                    body = None
+            except OSError as e:
+                # Неотправленное обновление уйдет первым после переподключения
+                logger.warning(f"Соединение с обработчиком #{shard} потеряно: {e}")
+            finally:
+                writer.close()
+
+
+async def run_sharded() -> None:
+    """Запуск приема вебхука и SHARD_COUNT процессов-обработчиков"""
+    if not WEBHOOK_URL:
+        logger.error("Ошибка: для режима sharded нужен WEBHOOK_URL")
+        sys.exit(1)
+
+    os.makedirs(SHARD_SOCKET_DIR, exist_ok=True)
+    stop = _stop_event()
+
+    ingress = Ingress(SHARD_COUNT)
+    ingress.start()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, ingress.handle_update)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    bot = Bot(token=BOT_TOKEN)
+    try:
+        await set_bot_commands(bot)
+        # Пропуск накопившихся обновлений, как skip_updates в режиме polling
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=True
+        )
+        logger.info(f"✅ Бот запущен: вебхук {WEBHOOK_URL}, обработчиков {SHARD_COUNT}")
+
+        await ingress.supervise(stop)
+    finally:
+        await runner.cleanup()
+        await ingress.stop()
+        await bot.session.close()
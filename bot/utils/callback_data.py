@@ -0,0 +1,260 @@
+"""
+Компактный формат callback_data для кнопок с параметрами
+
+Данные кнопки — это «~» и base64url без выравнивания от байтов
+[версия][код действия][аргументы...]. Целые числа кодируются varint,
+идентификаторы платежей — 16 байтами UUID. Кнопка товара занимает
+7 символов вместо «product_12345», а отмена платежа — 25 вместо 51
+(лимит Telegram — 64 байта).
+
+Кнопки в старом формате («product_12345», «faq:7») могут еще оставаться
+в чатах, поэтому они тоже разбираются и ведут в те же обработчики.
+
+Обработчики регистрируются в таблице по коду действия (или по точному
+значению для кнопок без параметров), и каждое нажатие разбирается один раз
+и находит обработчик одним обращением к словарю вместо перебора цепочки
+фильтров F.data == ... и F.data.startswith(...) во всех роутерах.
+"""
+
+import base64
+import binascii
+import uuid
+from enum import IntEnum
+from typing import Callable, NamedTuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+# Признак нового формата: в старом формате данные с «~» не начинаются
+PREFIX = "~"
+
+# Версия формата; при несовместимых изменениях увеличивается
+VERSION = 1
+
+
+class Action(IntEnum):
+    """Коды действий кнопок (не меняются: по ним разбираются кнопки в чатах)"""
+    MAIN_CATEGORIES = 1
+    MAIN_CATEGORY = 2
+    SUBCATEGORIES = 3
+    CATEGORY = 4
+    PRODUCT = 5
+    CHANGE_QUANTITY = 6
+    CONFIRM_ADD_TO_CART = 7
+    ADD_TO_CART = 8
+    BACK_TO_CATEGORY = 9
+    BACK_TO_PARENT_CATEGORY = 10
+    CART_ITEM = 11
+    CART_INCREASE = 12
+    CART_DECREASE = 13
+    CART_REMOVE = 14
+    FAQ = 15
+    CANCEL_PAYMENT = 16
+    MY_ORDERS = 17
+    ORDER_DETAILS = 18
+
+
+# Типы аргументов каждого действия
+ACTION_ARGS: dict[Action, tuple[type, ...]] = {
+    Action.MAIN_CATEGORIES: (int,),                 # страница
+    Action.MAIN_CATEGORY: (int,),                   # ID категории
+    Action.SUBCATEGORIES: (int, int),               # ID родительской категории, страница
+    Action.CATEGORY: (int, int),                    # ID категории, страница
+    Action.PRODUCT: (int,),                         # ID товара
+    Action.CHANGE_QUANTITY: (int, int),             # ID товара, количество
+    Action.CONFIRM_ADD_TO_CART: (int, int),         # ID товара, количество
+    Action.ADD_TO_CART: (int, int),                 # ID товара, количество
+    Action.BACK_TO_CATEGORY: (int,),                # ID категории
+    Action.BACK_TO_PARENT_CATEGORY: (int,),         # ID категории
+    Action.CART_ITEM: (int,),                       # ID элемента корзины
+    Action.CART_INCREASE: (int,),                   # ID элемента корзины
+    Action.CART_DECREASE: (int,),                   # ID элемента корзины
+    Action.CART_REMOVE: (int,),                     # ID элемента корзины
+    Action.FAQ: (int,),                             # ID вопроса
+    Action.CANCEL_PAYMENT: (uuid.UUID,),            # ID платежа в ЮKassa
+    Action.MY_ORDERS: (int,),                       # ID заказа, старше которого показывать
+    Action.ORDER_DETAILS: (int,),                   # ID заказа
+}
+
+# Значения последних аргументов, которые можно не указывать
+ACTION_DEFAULTS: dict[Action, tuple] = {
+    Action.CATEGORY: (1,),
+    Action.CONFIRM_ADD_TO_CART: (1,),
+    Action.ADD_TO_CART: (1,),
+}
+
+# Старый формат: префикс → (действие, разделитель аргументов)
+LEGACY_PREFIXES: dict[str, tuple[Action, str]] = {
+    "main_categories_": (Action.MAIN_CATEGORIES, "_"),
+    "main_category_": (Action.MAIN_CATEGORY, "_"),
+    "subcategories_": (Action.SUBCATEGORIES, "_"),
+    "category_": (Action.CATEGORY, "_"),
+    "product_": (Action.PRODUCT, "_"),
+    "change_quantity_": (Action.CHANGE_QUANTITY, "_"),
+    "confirm_add_to_cart_": (Action.CONFIRM_ADD_TO_CART, "_"),
+    "add_to_cart_": (Action.ADD_TO_CART, "_"),
+    "back_to_category_": (Action.BACK_TO_CATEGORY, "_"),
+    "back_to_parent_category_": (Action.BACK_TO_PARENT_CATEGORY, "_"),
+    "cart_item_": (Action.CART_ITEM, "_"),
+    "cart_increase_": (Action.CART_INCREASE, "_"),
+    "cart_decrease_": (Action.CART_DECREASE, "_"),
+    "cart_remove_": (Action.CART_REMOVE, "_"),
+    "faq:": (Action.FAQ, ":"),
+    "cancel_payment_": (Action.CANCEL_PAYMENT, "_"),
+    "my_orders_": (Action.MY_ORDERS, "_"),
+    "order_details_": (Action.ORDER_DETAILS, "_"),
+}
+
+# Префиксы от длинных к коротким, чтобы «main_categories_» не принять за «main_category_»
+_LEGACY_ORDER = sorted(LEGACY_PREFIXES, key=len, reverse=True)
+
+
+class CallbackData(NamedTuple):
+    """Разобранные данные кнопки: действие и его аргументы"""
+    action: Action
+    args: tuple
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    if value < 0:
+        raise ValueError(f"Отрицательное значение в callback_data: {value}")
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(raw: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _with_defaults(action: Action, args: tuple) -> tuple:
+    """Дополнить пропущенные последние аргументы значениями по умолчанию"""
+    types = ACTION_ARGS[action]
+    if len(args) == len(types):
+        return args
+    defaults = ACTION_DEFAULTS.get(action, ())
+    missing = len(types) - len(args)
+    if missing < 0 or missing > len(defaults):
+        raise ValueError(f"Неверное число аргументов для {action.name}: {len(args)}")
+    return args + defaults[len(defaults) - missing:]
+
+
+def pack(action: Action, *args) -> str:
+    """Упаковать действие и аргументы в callback_data"""
+    args = _with_defaults(action, args)
+    buffer = bytearray((VERSION, action))
+    for kind, value in zip(ACTION_ARGS[action], args):
+        if kind is int:
+            _write_varint(buffer, int(value))
+        else:
+            buffer += uuid.UUID(str(value)).bytes
+    return PREFIX + base64.urlsafe_b64encode(buffer).rstrip(b"=").decode()
+
+
+def _unpack_compact(data: str) -> CallbackData | None:
+    encoded = data[len(PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        if len(raw) < 2 or raw[0] != VERSION:
+            return None
+        action = Action(raw[1])
+        args = []
+        pos = 2
+        for kind in ACTION_ARGS[action]:
+            if kind is int:
+                value, pos = _read_varint(raw, pos)
+            else:
+                value, pos = str(uuid.UUID(bytes=raw[pos:pos + 16])), pos + 16
+            args.append(value)
+        if pos != len(raw):
+            return None
+    except (binascii.Error, ValueError, IndexError):
+        return None
+    return CallbackData(action, tuple(args))
+
+
+def _unpack_legacy(data: str) -> CallbackData | None:
+    for prefix in _LEGACY_ORDER:
+        if not data.startswith(prefix):
+            continue
+        action, separator = LEGACY_PREFIXES[prefix]
+        parts = data[len(prefix):].split(separator)
+        try:
+            args = _with_defaults(action, tuple(
+                kind(part) if kind is int else str(kind(part))
+                for kind, part in zip(ACTION_ARGS[action], parts)
+            ))
+        except ValueError:
+            return None
+        return CallbackData(action, args)
+    return None
+
+
+def unpack(data: str | None) -> CallbackData | None:
+    """Разобрать callback_data в новом или старом формате (None, если формат неизвестен)"""
+    if not data:
+        return None
+    if data.startswith(PREFIX):
+        return _unpack_compact(data)
+    return _unpack_legacy(data)
+
+
+class CallbackTable:
+    """
+    Таблица обработчиков кнопок: по точному значению callback_data
+    и по коду действия кнопок с параметрами.
+    Обработчик находится одним обращением к словарю; кнопки с параметрами
+    получают разобранные данные в аргументе callback_data. Как и обычный
+    обработчик aiogram, обработчик получает только те аргументы из контекста
+    (state, bot и т.д.), которые объявлены в его сигнатуре.
+    """
+
+    def __init__(self, name: str = "callbacks"):
+        self._exact: dict[str, CallableObject] = {}
+        self._handlers: dict[Action, CallableObject] = {}
+        self.router = Router(name=name)
+        self.router.callback_query.register(self._dispatch, self._match)
+
+    def exact(self, data: str) -> Callable:
+        """Декоратор регистрации обработчика кнопки с постоянными данными"""
+        def decorator(callback: Callable) -> Callable:
+            if data in self._exact:
+                raise ValueError(f"Обработчик кнопки {data!r} уже зарегистрирован")
+            self._exact[data] = CallableObject(callback=callback)
+            return callback
+        return decorator
+
+    def handler(self, action: Action) -> Callable:
+        """Декоратор регистрации обработчика действия"""
+        def decorator(callback: Callable) -> Callable:
+            if action in self._handlers:
+                raise ValueError(f"Обработчик действия {action.name} уже зарегистрирован")
+            self._handlers[action] = CallableObject(callback=callback)
+            return callback
+        return decorator
+
+    def _match(self, callback: CallbackQuery) -> dict | bool:
+        handler = self._exact.get(callback.data)
+        if handler is not None:
+            return {"callback_handler": handler}
+
+        callback_data = unpack(callback.data)
+        if callback_data is None or callback_data.action not in self._handlers:
+            return False
+        return {"callback_handler": self._handlers[callback_data.action], "callback_data": callback_data}
+
+    async def _dispatch(self, callback: CallbackQuery, callback_handler: CallableObject, **kwargs):
+        return await callback_handler.call(callback, **kwargs)
+
+
+# Общая таблица обработчиков кнопок бота
+callback_table = CallbackTable()
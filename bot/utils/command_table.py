@@ -0,0 +1,58 @@
+"""
+Таблица обработчиков команд (/start, /help)
+"""
+
+from typing import Callable
+
+from aiogram import Bot, Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import CommandObject
+from aiogram.types import Message
+
+
+class CommandTable:
+    """
+    Обработчики команд по имени команды.
+    Команда находится одним обращением к словарю до перебора фильтров
+    остальных роутеров; обработчик, как и с фильтром Command, получает
+    разобранную команду в аргументе command.
+    """
+
+    def __init__(self, name: str = "commands"):
+        self._handlers: dict[str, CallableObject] = {}
+        self.router = Router(name=name)
+        self.router.message.register(self._dispatch, self._match)
+
+    def command(self, name: str) -> Callable:
+        """Декоратор регистрации обработчика команды"""
+        def decorator(callback: Callable) -> Callable:
+            if name in self._handlers:
+                raise ValueError(f"Обработчик команды /{name} уже зарегистрирован")
+            self._handlers[name.lower()] = CallableObject(callback=callback)
+            return callback
+        return decorator
+
+    async def _match(self, message: Message, bot: Bot) -> dict | bool:
+        text = message.text
+        if not text or text[0] != "/":
+            return False
+
+        name, _, args = text[1:].partition(" ")
+        name, _, mention = name.partition("@")
+        handler = self._handlers.get(name.lower())
+        if handler is None:
+            return False
+
+        # Команда, адресованная другому боту в группе
+        if mention and mention.lower() != (await bot.me()).username.lower():
+            return False
+
+        command = CommandObject(prefix="/", command=name, mention=mention or None, args=args.strip() or None)
+        return {"command_handler": handler, "command": command}
+
+    async def _dispatch(self, message: Message, command_handler: CallableObject, **kwargs):
+        return await command_handler.call(message, **kwargs)
+
+
+# Общая таблица команд бота
+command_table = CommandTable()
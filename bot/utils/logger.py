@@ -9,8 +9,8 @@ def setup_logger():
     Настройка логирования.
     Логи сохраняются в файлы по дням и выводятся в консоль.
     """
-    # Используем абсолютный путь к директории логов
-    logs_dir = "/app/logs"
+    # Директория логов (в контейнере — /app/logs, в тестах — временная)
+    logs_dir = os.getenv("LOGS_DIR", "/app/logs")
     os.makedirs(logs_dir, exist_ok=True)
 
     # Формат логов
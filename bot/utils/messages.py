@@ -0,0 +1,34 @@
+"""
+Смена экранов бота в одном сообщении
+
+Карточка товара — это фото с подписью, а остальные экраны — текст.
+Telegram не превращает одно в другое при редактировании, поэтому экран
+того же типа редактируется на месте, а при смене типа сообщение пересоздается.
+"""
+
+import asyncio
+
+from aiogram.types import Message, InlineKeyboardMarkup
+
+# Максимальная длина подписи к фото в Telegram
+CAPTION_LIMIT = 1024
+
+
+async def edit_screen(message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Изменить текст экрана, не меняя тип сообщения (подпись у фото, текст у текста)"""
+    if message.photo:
+        await message.edit_caption(caption=text, reply_markup=reply_markup)
+    else:
+        await message.edit_text(text=text, reply_markup=reply_markup)
+
+
+async def show_text_screen(message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+    """Показать текстовый экран на месте сообщения (фото-сообщение заменяется новым)"""
+    if message.photo:
+        # Удаление и отправка независимы и идут параллельно
+        await asyncio.gather(
+            message.delete(),
+            message.answer(text=text, reply_markup=reply_markup)
+        )
+    else:
+        await message.edit_text(text=text, reply_markup=reply_markup)
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Окружение задается до импорта модулей бота: config читает его при импорте
+os.environ.setdefault("LOGS_DIR", tempfile.mkdtemp(prefix="shopbot-logs-"))
+os.environ.setdefault("YOOKASSA_SHOP_ID", "test-shop")
+os.environ.setdefault("YOOKASSA_SECRET_KEY", "test-secret")
+
+# Тесты с базой работают только с отдельной тестовой базой (TEST_DB_*),
+# настройки DB_* из окружения и .env не используются: таблицы очищаются
+TEST_DB = {
+    "DB_HOST": os.getenv("TEST_DB_HOST", "127.0.0.1"),
+    "DB_PORT": os.getenv("TEST_DB_PORT", "5432"),
+    "DB_NAME": os.getenv("TEST_DB_NAME", "shopbot_test"),
+    "DB_USER": os.getenv("TEST_DB_USER", "postgres"),
+    "DB_PASSWORD": os.getenv("TEST_DB_PASSWORD", "postgres"),
+}
+os.environ.update(TEST_DB)
+
+
+async def _create_tables() -> None:
+    from database import engine
+    from models import Base
+    try:
+        # Схема пересоздается по моделям бота, чтобы не остались столбцы
+        # и значения по умолчанию, которых нет в таблицах из миграций админки
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+    finally:
+        await engine.dispose()
+
+
+async def _truncate_tables() -> None:
+    from sqlalchemy import text
+    from database import engine
+    from models import Base
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def database_schema():
+    """Таблицы бота в тестовой базе; без доступной базы тест пропускается"""
+    try:
+        asyncio.run(_create_tables())
+    except Exception as e:
+        pytest.skip(f"Тестовая база {TEST_DB['DB_HOST']}:{TEST_DB['DB_PORT']}/{TEST_DB['DB_NAME']} недоступна: {e}")
+
+
+@pytest.fixture
+def database(database_schema):
+    """Пустая тестовая база и пустые кеши бота"""
+    from services.cart_service import invalidate_cart_cache
+    from services.order_service import clear_orders_cache
+
+    asyncio.run(_truncate_tables())
+    invalidate_cart_cache()
+    clear_orders_cache()
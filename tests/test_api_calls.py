@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+from aiogram.methods import EditMessageText
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from middlewares.api_calls import ApiRequestMiddleware, UpdateApiCallsMiddleware
+
+CHAT_ID = 42
+MESSAGE_ID = 7
+USER = User(id=CHAT_ID, is_bot=False, first_name="Test")
+
+
+def make_message(text: str, edit_date: int | None) -> Message:
+    return Message(
+        message_id=MESSAGE_ID,
+        date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        chat=Chat(id=CHAT_ID, type="private"),
+        text=text,
+        edit_date=edit_date,
+    )
+
+
+def make_callback_update(message: Message) -> Update:
+    return Update(
+        update_id=1,
+        callback_query=CallbackQuery(id="1", from_user=USER, chat_instance="1", data="x", message=message),
+    )
+
+
+class Telegram:
+    """Бот API, запоминающий отправленные редактирования"""
+
+    def __init__(self):
+        self.edits = []
+        self.edit_date = 1767225660
+
+    async def __call__(self, bot, method):
+        self.edits.append(method.text)
+        return make_message(method.text, self.edit_date)
+
+
+def edit(text: str) -> EditMessageText:
+    return EditMessageText(chat_id=CHAT_ID, message_id=MESSAGE_ID, text=text)
+
+
+async def edit_in_update(middleware, telegram, message: Message, text: str) -> None:
+    async def handler(event, data):
+        await middleware(telegram, None, edit(text))
+
+    await UpdateApiCallsMiddleware()(handler, make_callback_update(message), {})
+
+
+def test_repeated_edit_is_skipped():
+    async def scenario():
+        middleware, telegram = ApiRequestMiddleware(), Telegram()
+        await edit_in_update(middleware, telegram, make_message("old", None), "new")
+        current = make_message("new", telegram.edit_date)
+        await edit_in_update(middleware, telegram, current, "new")
+        assert telegram.edits == ["new"]
+
+    asyncio.run(scenario())
+
+
+def test_message_edited_elsewhere_is_edited_again():
+    async def scenario():
+        middleware, telegram = ApiRequestMiddleware(), Telegram()
+        await edit_in_update(middleware, telegram, make_message("old", None), "new")
+
+        # Другой процесс заменил текст: в нажатой кнопке другая дата редактирования
+        edited = make_message("payment result", telegram.edit_date + 240)
+        await edit_in_update(middleware, telegram, edited, "new")
+        assert telegram.edits == ["new", "new"]
+
+    asyncio.run(scenario())
+
+
+def test_background_edits_are_always_sent():
+    async def scenario():
+        middleware, telegram = ApiRequestMiddleware(), Telegram()
+        await middleware(telegram, None, edit("result"))
+        await middleware(telegram, None, edit("result"))
+        assert telegram.edits == ["result", "result"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import cart
+from services import cart_service
+from services.cart_service import CartLine, stage_cart_item_quantity
+
+USER_ID = 42
+CART_ITEM_ID = 1
+
+
+class CardMessage:
+    """Сообщение карточки товара; во время редактирования может прийти нажатие"""
+
+    def __init__(self, on_edit=None):
+        self.chat = SimpleNamespace(id=USER_ID)
+        self.message_id = 7
+        self.texts = []
+        self._on_edit = on_edit
+
+    async def edit_text(self, text, reply_markup=None):
+        self.texts.append(text)
+        await asyncio.sleep(0)
+        if self._on_edit:
+            on_edit, self._on_edit = self._on_edit, None
+            on_edit()
+
+
+@pytest.fixture
+def line(monkeypatch):
+    """Позиция корзины и запись в базу без базы: записанные количества в written"""
+    line = CartLine(id=CART_ITEM_ID, product_id=1, name="Товар", price=Decimal(100), quantity=1)
+    written = []
+
+    async def get_session():
+        yield None
+
+    async def flush_cart_updates(session, user_id):
+        pending = dict(cart_service._pending_quantities.get(user_id, {}))
+        await asyncio.sleep(0)
+        if pending:
+            written.append(pending[CART_ITEM_ID])
+            cart_service.drop_pending_quantity(user_id)
+
+    async def get_cart_line(session, user_id, cart_item_id):
+        return line
+
+    monkeypatch.setattr(cart, "CART_COALESCE_DELAY", 0)
+    monkeypatch.setattr(cart, "get_session", get_session)
+    monkeypatch.setattr(cart, "flush_cart_updates", flush_cart_updates)
+    monkeypatch.setattr(cart, "get_cart_line", get_cart_line)
+    line.written = written
+    yield line
+    cart_service.drop_pending_quantity(USER_ID)
+
+
+def tap(callback, line, quantity):
+    """Нажатие ➕/➖: количество сразу в снимке, запись и редактирование отложены"""
+    stage_cart_item_quantity(USER_ID, line, quantity)
+    cart.schedule_item_refresh(callback, line.id)
+
+
+def make_callback(message: CardMessage):
+    return SimpleNamespace(from_user=SimpleNamespace(id=USER_ID), message=message)
+
+
+def test_taps_in_window_give_one_write_and_edit(line):
+    callback = make_callback(CardMessage())
+
+    async def scenario():
+        tap(callback, line, 2)
+        tap(callback, line, 3)
+        await asyncio.gather(*cart.item_refresh_tasks.values())
+
+    asyncio.run(scenario())
+
+    assert line.written == [3]
+    assert len(callback.message.texts) == 1
+    assert "Количество: 3 шт." in callback.message.texts[0]
+
+
+def test_tap_during_edit_is_written_and_shown(line):
+    message = CardMessage()
+    callback = make_callback(message)
+    # Нажатие приходит, пока задача редактирует карточку
+    message._on_edit = lambda: tap(callback, line, 3)
+
+    async def scenario():
+        tap(callback, line, 2)
+        task = cart.item_refresh_tasks[(USER_ID, message.message_id)]
+        await task
+
+    asyncio.run(scenario())
+
+    assert line.written == [2, 3]
+    assert "Количество: 3 шт." in message.texts[-1]
+    assert not cart.item_refresh_tasks
+    assert not cart_service.has_pending_quantity(USER_ID, CART_ITEM_ID)
+
+
+def test_cancelled_refresh_is_not_swallowed(line):
+    callback = make_callback(CardMessage())
+
+    async def scenario():
+        tap(callback, line, 2)
+        task = cart.item_refresh_tasks[(USER_ID, callback.message.message_id)]
+        # Задача уже ждет окна объединения нажатий
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    task = asyncio.run(scenario())
+
+    assert task.cancelled()
+    assert not cart.item_refresh_tasks
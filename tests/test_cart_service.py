@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from database import async_session, engine
+from models import User, Category, Product, CartItem
+from services import cart_service
+from services.cart_service import expire_cart_items, invalidate_cart_cache
+
+USER_IDS = [201, 202, 203]
+CART_TTL_DAYS = 30
+
+
+def run(scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def seed() -> None:
+    """По две давно не менявшиеся позиции в корзине каждого пользователя"""
+    async with async_session() as session:
+        category = Category(name="Категория", slug="category")
+        products = [
+            Product(category=category, name=f"Товар {i}", slug=f"product-{i}", price=100, stock=5, reserved=0)
+            for i in range(2)
+        ]
+        users = [User(user_id=user_id) for user_id in USER_IDS]
+        session.add_all([category, *products, *users])
+        await session.flush()
+        updated_at = datetime.now() - timedelta(days=CART_TTL_DAYS + 1)
+        session.add_all([
+            CartItem(user_id=user.id, product_id=product.id, quantity=1, updated_at=updated_at)
+            for user in users for product in products
+        ])
+        await session.commit()
+
+
+def test_expired_carts_are_published_once_per_batch(database, monkeypatch):
+    events = []
+
+    async def publish_change(session, table, op, **data):
+        events.append((table, op, data))
+
+    monkeypatch.setattr(cart_service, "publish_change", publish_change)
+    for user_id in USER_IDS:
+        cart_service._cart_cache.set(user_id, object())
+
+    async def scenario():
+        await seed()
+        async with async_session() as session:
+            deleted = await expire_cart_items(session, CART_TTL_DAYS, batch_size=100)
+            left = await session.scalar(select(func.count()).select_from(CartItem))
+        return deleted, left
+
+    deleted, left = run(scenario)
+
+    assert (deleted, left) == (6, 0)
+    assert events == [("shop_cartitem", "delete", {"user_ids": USER_IDS})]
+    assert not any(user_id in cart_service._cart_cache for user_id in USER_IDS)
+
+
+def test_large_batch_is_split_across_events(database, monkeypatch):
+    events = []
+
+    async def publish_change(session, table, op, **data):
+        events.append(data["user_ids"])
+
+    monkeypatch.setattr(cart_service, "publish_change", publish_change)
+    monkeypatch.setattr(cart_service, "CART_CHANGE_USERS_PER_EVENT", 2)
+
+    async def scenario():
+        await seed()
+        async with async_session() as session:
+            return await expire_cart_items(session, CART_TTL_DAYS, batch_size=100)
+
+    assert run(scenario) == 6
+    assert events == [USER_IDS[:2], USER_IDS[2:]]
+
+
+def test_cart_event_drops_listed_users_only():
+    for user_id in [*USER_IDS, 204]:
+        cart_service._cart_cache.set(user_id, object())
+
+    invalidate_cart_cache({"table": "shop_cartitem", "op": "delete", "user_ids": USER_IDS})
+
+    assert not any(user_id in cart_service._cart_cache for user_id in USER_IDS)
+    assert 204 in cart_service._cart_cache
+    invalidate_cart_cache()
@@ -0,0 +1,72 @@
+import asyncio
+
+import asyncpg
+
+from services.change_feed import ChangeFeed
+
+
+class FakeConnection:
+    """Соединение asyncpg, которое закрывается по команде теста"""
+
+    def __init__(self):
+        self._termination_listeners = []
+
+    def add_termination_listener(self, listener):
+        self._termination_listeners.append(listener)
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    def is_closed(self):
+        return False
+
+    async def close(self):
+        pass
+
+    def drop(self):
+        for listener in self._termination_listeners:
+            listener(self)
+
+
+def test_reconnects_after_any_error(monkeypatch):
+    errors = [
+        asyncpg.InterfaceError("cannot perform operation: another operation is in progress"),
+        asyncpg.exceptions.ConnectionDoesNotExistError("connection was closed"),
+        RuntimeError("unexpected"),
+    ]
+    connections = []
+
+    async def connect(dsn):
+        if errors:
+            raise errors.pop(0)
+        connection = FakeConnection()
+        connections.append(connection)
+        return connection
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    async def scenario():
+        feed = ChangeFeed("postgresql://test", "changes", reconnect_delay=0)
+        reconnects = []
+        feed.on_reconnect(lambda: reconnects.append(True))
+        feed.start()
+
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if connections:
+                break
+        assert not errors
+        assert connections
+
+        # Потеря соединения тоже ведет к переподключению и сбросу кешей
+        connections[0].drop()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if len(reconnects) == 2:
+                break
+        assert len(connections) == 2
+        assert len(reconnects) == 2
+
+        await feed.stop()
+
+    asyncio.run(scenario())
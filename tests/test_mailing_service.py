@@ -0,0 +1,139 @@
+import asyncio
+import functools
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlalchemy import select, update, func
+
+from database import async_session, engine
+from models import User, Mailing, MailingDelivery, Segment
+from services import audience_service, mailing_service
+from services.mailing_service import claim_mailing, send_mailing, deliver, DELIVERY_RETRY_AFTER
+
+CHAT_IDS = [101, 102, 103]
+
+
+class Crash(BaseException):
+    """Остановка процесса посреди рассылки"""
+
+
+class Bot:
+    """Бот, запоминающий получателей; может упасть на заданном получателе"""
+
+    def __init__(self, crash_on: int | None = None):
+        self.chats = []
+        self.crash_on = crash_on
+
+    async def send_message(self, chat_id, text):
+        if chat_id == self.crash_on:
+            raise Crash()
+        self.chats.append(chat_id)
+
+
+def run(scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def seed() -> int:
+    async with async_session() as session:
+        session.add_all([User(user_id=chat_id) for chat_id in CHAT_IDS])
+        mailing = Mailing(text="Новинки", scheduled_at=datetime.now(), is_sent=False)
+        session.add(mailing)
+        await session.commit()
+        return mailing.id
+
+
+async def load_mailing(mailing_id: int) -> tuple:
+    async with async_session() as session:
+        mailing = await session.get(Mailing, mailing_id)
+        deliveries = await session.scalar(select(func.count()).select_from(MailingDelivery))
+        return mailing.is_sent, mailing.sending_until, deliveries
+
+
+def test_interrupted_mailing_resumes_after_lease(database, monkeypatch):
+    # Результат доставки сохраняется после каждой порции из двух получателей
+    monkeypatch.setattr(mailing_service, "iter_audience", functools.partial(audience_service.iter_audience, chunk_size=2))
+
+    async def scenario():
+        mailing_id = await seed()
+
+        first = Bot(crash_on=CHAT_IDS[2])
+        try:
+            await send_mailing(first, mailing_id)
+        except Crash:
+            pass
+        interrupted = await load_mailing(mailing_id)
+
+        # Пока аренда действует, рассылку не захватит другой процесс
+        async with async_session() as session:
+            claimed_while_leased = await claim_mailing(session, mailing_id)
+            await session.execute(
+                update(Mailing).values(sending_until=datetime.now() - timedelta(seconds=1))
+            )
+            await session.commit()
+
+        second = Bot()
+        await send_mailing(second, mailing_id)
+        return first.chats, second.chats, interrupted, claimed_while_leased, await load_mailing(mailing_id)
+
+    first, second, interrupted, claimed_while_leased, finished = run(scenario)
+
+    is_sent, sending_until, deliveries = interrupted
+    assert first == CHAT_IDS[:2]
+    assert not is_sent
+    assert sending_until is not None
+    assert deliveries == 2
+    assert not claimed_while_leased
+
+    # Продолжение только для тех, кому рассылка еще не доставлялась
+    assert second == CHAT_IDS[2:]
+    assert finished == (True, None, 3)
+
+
+def test_sent_mailing_is_not_claimed_again(database):
+    async def scenario():
+        mailing_id = await seed()
+        await send_mailing(Bot(), mailing_id)
+        async with async_session() as session:
+            return await claim_mailing(session, mailing_id)
+
+    assert not run(scenario)
+
+
+def test_rate_limited_delivery_is_not_resent():
+    calls = []
+
+    async def send():
+        # Альбом ушел, а текст после него получил 429 и после повтора в сессии
+        calls.append("album")
+        raise TelegramRetryAfter(SendMessage(chat_id=CHAT_IDS[0], text="Новинки"), "Too Many Requests", 5)
+
+    status, _ = asyncio.run(deliver(send))
+
+    assert status == DELIVERY_RETRY_AFTER
+    assert calls == ["album"]
+
+
+def test_concurrent_snapshot_refreshes_do_not_conflict(database):
+    async def refresh(segment_id: int) -> int:
+        async with async_session() as session:
+            segment = await session.get(Segment, segment_id)
+            return await audience_service.refresh_segment_snapshot(session, segment)
+
+    async def scenario():
+        async with async_session() as session:
+            session.add_all([User(user_id=chat_id) for chat_id in CHAT_IDS])
+            segment = Segment(name="Все")
+            session.add(segment)
+            await session.commit()
+            segment_id = segment.id
+        return await asyncio.gather(*[refresh(segment_id) for _ in range(4)])
+
+    assert run(scenario) == [len(CHAT_IDS)] * 4
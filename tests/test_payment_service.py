@@ -0,0 +1,231 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update, func
+
+from config import YOOKASSA_BREAKER_THRESHOLD, YOOKASSA_BREAKER_RESET
+from database import async_session, engine
+from dev.yookassa_stub import YooKassaStub
+from handlers import payment as payment_handlers
+from models import User, Category, Product, CartItem, Order, StockReservation, Outbox
+from services import yookassa_client
+from services.payment_service import init_payment, update_order_payment_status, expire_reservations
+from services.yookassa_client import yookassa, CircuitBreaker
+
+USER_ID = 100
+DELIVERY_INFO = {"username": "buyer", "full_name": "Покупатель", "phone": "+70000000000", "address": "Адрес"}
+PAYMENT_MESSAGE = {"chat_id": USER_ID, "message_id": 7}
+
+
+@pytest.fixture(autouse=True)
+def payments(database, monkeypatch):
+    """Клиент ЮKassa без пауз между повторами и с новым предохранителем"""
+    monkeypatch.setattr(yookassa_client, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(yookassa, "breaker", CircuitBreaker(YOOKASSA_BREAKER_THRESHOLD, YOOKASSA_BREAKER_RESET))
+    monkeypatch.setattr(payment_handlers, "PAYMENT_CHECK_INTERVAL", 0)
+
+
+def run(scenario, **stub_options):
+    """Выполнить сценарий с заглушкой ЮKassa в собственном цикле событий"""
+    async def main():
+        async with YooKassaStub(pay_after=None, **stub_options) as stub:
+            yookassa.api_url = stub.url
+            try:
+                await seed()
+                return await scenario(stub)
+            finally:
+                await yookassa.close()
+                # Пул соединений привязан к циклу событий теста
+                await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def seed():
+    """Покупатель с двумя единицами товара (остаток 5) в корзине"""
+    async with async_session() as session:
+        user = User(user_id=USER_ID, username="buyer")
+        category = Category(name="Категория", slug="category")
+        product = Product(category=category, name="Товар", slug="product", price=100, stock=5, reserved=0)
+        session.add_all([user, category, product])
+        await session.flush()
+        session.add(CartItem(user_id=user.id, product_id=product.id, quantity=2))
+        await session.commit()
+
+
+async def start_payment() -> dict:
+    async with async_session() as session:
+        return await init_payment(session, USER_ID, DELIVERY_INFO)
+
+
+async def check_payment(payment_id: str) -> None:
+    await payment_handlers.check_payment_status_task(USER_ID, payment_id, USER_ID, PAYMENT_MESSAGE["message_id"])
+
+
+async def expire_all_reservations() -> None:
+    async with async_session() as session:
+        await session.execute(update(StockReservation).values(expires_at=datetime.now() - timedelta(minutes=1)))
+        await session.commit()
+
+
+async def load_state() -> dict:
+    """Заказы, остаток товара, корзина и очередь сообщений после сценария"""
+    async with async_session() as session:
+        orders = (await session.execute(select(Order.payment_id, Order.status, Order.payment_status))).all()
+        product = (await session.execute(select(Product.stock, Product.reserved))).one()
+        return {
+            "orders": [tuple(order) for order in orders],
+            "stock": tuple(product),
+            "reservations": await session.scalar(select(func.count()).select_from(StockReservation)),
+            "cart": await session.scalar(select(func.count()).select_from(CartItem)),
+            "messages": (await session.scalars(select(Outbox.payload))).all(),
+        }
+
+
+def test_init_payment_reserves_stock():
+    async def scenario(stub):
+        payment = await start_payment()
+        return payment, stub.payments[payment["payment_id"]], await load_state()
+
+    payment, stub_payment, state = run(scenario)
+
+    assert payment["status"] == "pending"
+    assert payment["payment_url"] == stub_payment["confirmation"]["confirmation_url"]
+    assert stub_payment["amount"] == {"value": "200.00", "currency": "RUB"}
+    assert stub_payment["metadata"] == {"user_id": str(USER_ID), "order_id": str(payment["order_id"])}
+    assert state["orders"] == [(payment["payment_id"], "pending", "pending")]
+    assert state["stock"] == (5, 2)
+    assert state["reservations"] == 1
+
+
+def test_succeeded_payment_commits_stock_and_clears_cart():
+    async def scenario(stub):
+        payment = await start_payment()
+        stub.set_status(payment["payment_id"], "succeeded")
+        await check_payment(payment["payment_id"])
+        return payment, await load_state()
+
+    payment, state = run(scenario)
+
+    assert state["orders"] == [(payment["payment_id"], "paid", "succeeded")]
+    assert state["stock"] == (3, 0)
+    assert state["reservations"] == 0
+    assert state["cart"] == 0
+    assert state["messages"] == [{"order_id": payment["order_id"], "status": "succeeded", "amount": 200.0, **PAYMENT_MESSAGE}]
+
+
+def test_repeated_succeeded_status_is_applied_once():
+    async def scenario(stub):
+        payment = await start_payment()
+        stub.set_status(payment["payment_id"], "succeeded")
+        async with async_session() as session:
+            first = await update_order_payment_status(session, payment["payment_id"], "succeeded")
+            second = await update_order_payment_status(session, payment["payment_id"], "succeeded")
+        return first, second, await load_state()
+
+    first, second, state = run(scenario)
+
+    assert (first, second) == (True, False)
+    assert state["stock"] == (3, 0)
+    assert len(state["messages"]) == 1
+
+
+def test_canceled_payment_releases_reservation(monkeypatch):
+    monkeypatch.setattr(payment_handlers, "PAYMENT_CHECK_ATTEMPTS", 3)
+
+    async def scenario(stub):
+        payment = await start_payment()
+        stub.set_status(payment["payment_id"], "canceled")
+        await check_payment(payment["payment_id"])
+        return payment, await load_state(), stub.stats["requests"]
+
+    payment, state, requests = run(scenario)
+
+    # Создание платежа и проверки статуса: по одной на попытку и последняя
+    assert requests == 1 + 3 + 1
+    assert state["orders"] == []
+    assert state["stock"] == (5, 0)
+    assert state["reservations"] == 0
+    assert state["cart"] == 1
+    assert state["messages"] == [{"order_id": payment["order_id"], "status": "expired", "amount": 200.0, **PAYMENT_MESSAGE}]
+
+
+def test_expired_reservation_of_unpaid_order_is_cancelled():
+    async def scenario(stub):
+        await start_payment()
+        await expire_all_reservations()
+        async with async_session() as session:
+            await expire_reservations(session)
+        return await load_state()
+
+    state = run(scenario)
+
+    assert state["orders"] == []
+    assert state["stock"] == (5, 0)
+    assert state["reservations"] == 0
+    assert state["cart"] == 1
+
+
+def test_expired_reservation_of_paid_order_is_sold():
+    async def scenario(stub):
+        payment = await start_payment()
+        # Оплата прошла, но бот не успел узнать о ней до истечения резерва
+        stub.set_status(payment["payment_id"], "succeeded")
+        await expire_all_reservations()
+        async with async_session() as session:
+            await expire_reservations(session)
+        return payment, await load_state()
+
+    payment, state = run(scenario)
+
+    assert state["orders"] == [(payment["payment_id"], "paid", "succeeded")]
+    assert state["stock"] == (3, 0)
+    assert state["cart"] == 0
+
+
+def test_expired_reservation_is_kept_while_api_is_unavailable():
+    async def scenario(stub):
+        await start_payment()
+        await expire_all_reservations()
+        stub.fail_next(yookassa.max_retries + 1)
+        async with async_session() as session:
+            await expire_reservations(session)
+        return await load_state()
+
+    state = run(scenario)
+
+    # Статус платежа неизвестен: заказ остается до следующего запуска
+    assert len(state["orders"]) == 1
+    assert state["stock"] == (5, 2)
+
+
+def test_create_payment_is_retried_after_5xx():
+    async def scenario(stub):
+        stub.fail_next(yookassa.max_retries)
+        payment = await start_payment()
+        return payment, stub.stats, await load_state()
+
+    payment, stats, state = run(scenario)
+
+    assert payment is not None
+    assert stats["errors"] == yookassa.max_retries
+    assert stats["created"] == 1
+    assert state["orders"] == [(payment["payment_id"], "pending", "pending")]
+    assert state["stock"] == (5, 2)
+
+
+def test_order_is_cancelled_when_retries_are_exhausted():
+    async def scenario(stub):
+        stub.fail_next(yookassa.max_retries + 1)
+        payment = await start_payment()
+        return payment, stub.stats, await load_state()
+
+    payment, stats, state = run(scenario)
+
+    assert payment is None
+    assert stats["created"] == 0
+    assert state["orders"] == []
+    assert state["stock"] == (5, 0)
+    assert state["reservations"] == 0
+    assert state["cart"] == 1
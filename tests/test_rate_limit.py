@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from middlewares.rate_limit import ApiRateLimiter, INTERACTIVE, BACKGROUND
+
+
+def make_limiter() -> ApiRateLimiter:
+    return ApiRateLimiter(global_rate=30, interactive_reserve=10)
+
+
+def test_sharded_background_keeps_reserve_for_replies():
+    limiter = make_limiter()
+    limiter.set_sharded()
+
+    # Фоновые отправки не видят ответов других процессов: резерв вычитается из темпа
+    assert limiter.global_bucket.rate == pytest.approx(20)
+    assert limiter.interactive_reserve == 0
+
+
+def test_sharded_replies_skip_global_bucket():
+    limiter = make_limiter()
+    limiter.set_sharded()
+    limiter.global_bucket.tokens = 0
+
+    asyncio.run(limiter.acquire(100, INTERACTIVE))
+
+    assert limiter.metrics["interactive_delayed"] == 0
+    # Ответ расходует только bucket своего чата
+    assert limiter.global_bucket.tokens < 1
+    assert limiter._chats.get(100).tokens == pytest.approx(limiter.chat_burst - 1)
+
+
+def test_sharded_background_waits_for_global_bucket():
+    limiter = make_limiter()
+    limiter.set_sharded()
+    limiter.global_bucket.tokens = 0
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(100, BACKGROUND), 0.01)
+
+    asyncio.run(scenario())
+
+
+def test_single_process_replies_use_global_bucket():
+    limiter = make_limiter()
+    limiter.global_bucket.tokens = 0
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(100, INTERACTIVE), 0.01)
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from services.yookassa_client import CircuitBreaker, YooKassaClient, YooKassaUnavailable
+
+
+class FakeSession:
+    """Сессия aiohttp, каждый запрос которой выполняет request_hook"""
+
+    closed = False
+
+    def __init__(self, request_hook):
+        self.request_hook = request_hook
+
+    @asynccontextmanager
+    async def request(self, *args, **kwargs):
+        await self.request_hook()
+        yield
+
+
+def make_client(request_hook) -> YooKassaClient:
+    client = YooKassaClient("shop", "secret", api_url="http://yookassa.test/v3", max_retries=0)
+    client._get_session = lambda: FakeSession(request_hook)
+    return client
+
+
+def open_breaker(client: YooKassaClient) -> None:
+    """Разомкнуть предохранитель так, чтобы следующий запрос стал пробным"""
+    client.breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    client.breaker.record_failure()
+    assert client.breaker.is_open
+
+
+def test_breaker_allows_single_probe():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_cancelled_probe_releases_breaker():
+    async def scenario():
+        client = make_client(lambda: asyncio.sleep(3600))
+        open_breaker(client)
+
+        task = asyncio.create_task(client.get_payment("payment"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert client.breaker.is_open
+        assert client.breaker.allow()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_requests_are_not_failures():
+    async def scenario():
+        client = make_client(lambda: asyncio.sleep(3600))
+        client.breaker = CircuitBreaker(threshold=2, reset_timeout=3600)
+
+        for _ in range(5):
+            task = asyncio.create_task(client.get_payment("payment"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        assert not client.breaker.is_open
+        assert client.breaker.allow()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_keeps_open_time():
+    async def scenario():
+        client = make_client(lambda: asyncio.sleep(3600))
+        open_breaker(client)
+        opened_at = client.breaker._opened_at
+
+        task = asyncio.create_task(client.get_payment("payment"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert client.breaker._opened_at == opened_at
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_error_in_probe_releases_breaker():
+    async def fail():
+        raise RuntimeError("unexpected")
+
+    async def scenario():
+        client = make_client(fail)
+        open_breaker(client)
+
+        for _ in range(3):
+            # Без освобождения пробы здесь был бы YooKassaUnavailable
+            with pytest.raises(RuntimeError):
+                await client.get_payment("payment")
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_rejects_requests():
+    async def scenario():
+        client = make_client(lambda: asyncio.sleep(0))
+        client.breaker = CircuitBreaker(threshold=1, reset_timeout=3600)
+        client.breaker.record_failure()
+
+        with pytest.raises(YooKassaUnavailable):
+            await client.get_payment("payment")
+
+    asyncio.run(scenario())